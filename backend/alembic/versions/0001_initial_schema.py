@@ -0,0 +1,219 @@
+"""Esquema inicial: las tablas tal como las creaba Base.metadata.create_all
+antes de las migraciones (sin almacén de blobs, permisos por empresa o grupo,
+búsqueda ni tablas de caché y agregados, que añaden las revisiones siguientes)
+
+Bases de datos creadas antes de las migraciones: `python init_db.py` comprueba
+que tienen las columnas de BASELINE_COLUMNS, marca 0001 y actualiza. Las
+revisiones siguientes son idempotentes (absorben los antiguos scripts
+migrate_*.py), así que da igual cuáles de esos scripts se ejecutaron.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-19
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0001"
+down_revision: Union[str, Sequence[str], None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Columnas de cada tabla en este esquema (init_db.py las comprueba antes de marcar 0001)
+BASELINE_COLUMNS = {
+    "users": ("id", "email", "password_hash", "full_name", "role", "is_active", "created_at", "updated_at"),
+    "groups": ("id", "name", "description", "created_by", "is_active", "created_at", "updated_at"),
+    "companies": ("id", "name", "description", "group_id", "created_by", "is_active", "created_at", "updated_at"),
+    "accounts": (
+        "id", "company_id", "name", "iban", "account_type", "balance", "credit_limit", "currency",
+        "is_active", "created_at", "updated_at",
+    ),
+    "account_permissions": ("id", "user_id", "account_id", "can_view", "can_transfer", "granted_by", "created_at"),
+    "operations": (
+        "id", "name", "description", "notes", "status", "created_by", "created_at", "updated_at", "closed_at",
+    ),
+    "transactions": (
+        "id", "from_account_id", "to_account_id", "amount", "description", "transaction_type", "status",
+        "operation_id", "from_balance_after", "to_balance_after", "transaction_date", "created_by", "created_at",
+    ),
+    "attachments": (
+        "id", "transaction_id", "filename", "content_type", "file_data", "file_size", "uploaded_by", "created_at",
+    ),
+    "pending_entries": (
+        "id", "from_group_id", "to_group_id", "amount", "description", "operation_id",
+        "settled_in_operation_id", "status", "created_by", "created_at", "settled_at",
+    ),
+}
+
+
+def timestamps(*names: str, nullable: bool = True):
+    return [sa.Column(name, sa.DateTime(), server_default=sa.func.now(), nullable=nullable) for name in names]
+
+
+def upgrade() -> None:
+    op.create_table(
+        "users",
+        sa.Column("id", sa.UUID(), nullable=False),
+        sa.Column("email", sa.String(length=255), nullable=False),
+        sa.Column("password_hash", sa.String(length=255), nullable=False),
+        sa.Column("full_name", sa.String(length=255), nullable=False),
+        sa.Column("role", sa.String(length=20), nullable=True),
+        sa.Column("is_active", sa.Boolean(), nullable=True),
+        *timestamps("created_at", "updated_at"),
+        sa.CheckConstraint("role IN ('supervisor', 'user', 'demo')", name="valid_role"),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index("ix_users_email", "users", ["email"], unique=True)
+
+    op.create_table(
+        "groups",
+        sa.Column("id", sa.UUID(), nullable=False),
+        sa.Column("name", sa.String(length=255), nullable=False),
+        sa.Column("description", sa.String(), nullable=True),
+        sa.Column("created_by", sa.UUID(), nullable=True),
+        sa.Column("is_active", sa.Boolean(), nullable=True),
+        *timestamps("created_at", "updated_at"),
+        sa.ForeignKeyConstraint(["created_by"], ["users.id"]),
+        sa.PrimaryKeyConstraint("id"),
+    )
+
+    op.create_table(
+        "companies",
+        sa.Column("id", sa.UUID(), nullable=False),
+        sa.Column("name", sa.String(length=255), nullable=False),
+        sa.Column("description", sa.String(), nullable=True),
+        sa.Column("group_id", sa.UUID(), nullable=True),
+        sa.Column("created_by", sa.UUID(), nullable=True),
+        sa.Column("is_active", sa.Boolean(), nullable=True),
+        *timestamps("created_at", "updated_at"),
+        sa.ForeignKeyConstraint(["created_by"], ["users.id"]),
+        sa.ForeignKeyConstraint(["group_id"], ["groups.id"]),
+        sa.PrimaryKeyConstraint("id"),
+    )
+
+    op.create_table(
+        "accounts",
+        sa.Column("id", sa.UUID(), nullable=False),
+        sa.Column("company_id", sa.UUID(), nullable=True),
+        sa.Column("name", sa.String(length=255), nullable=False),
+        sa.Column("iban", sa.String(length=34), nullable=True),
+        sa.Column("account_type", sa.String(length=20), nullable=True),
+        sa.Column("balance", sa.Numeric(precision=15, scale=2), nullable=True),
+        sa.Column("credit_limit", sa.Numeric(precision=15, scale=2), nullable=True),
+        sa.Column("currency", sa.String(length=3), nullable=True),
+        sa.Column("is_active", sa.Boolean(), nullable=True),
+        *timestamps("created_at", "updated_at"),
+        sa.CheckConstraint("account_type IN ('corriente', 'credito', 'confirming')", name="valid_account_type"),
+        sa.ForeignKeyConstraint(["company_id"], ["companies.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("id"),
+    )
+
+    op.create_table(
+        "account_permissions",
+        sa.Column("id", sa.UUID(), nullable=False),
+        sa.Column("user_id", sa.UUID(), nullable=True),
+        sa.Column("account_id", sa.UUID(), nullable=True),
+        sa.Column("can_view", sa.Boolean(), nullable=True),
+        sa.Column("can_transfer", sa.Boolean(), nullable=True),
+        sa.Column("granted_by", sa.UUID(), nullable=True),
+        *timestamps("created_at"),
+        sa.ForeignKeyConstraint(["account_id"], ["accounts.id"], ondelete="CASCADE"),
+        sa.ForeignKeyConstraint(["granted_by"], ["users.id"]),
+        sa.ForeignKeyConstraint(["user_id"], ["users.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("id"),
+    )
+
+    op.create_table(
+        "operations",
+        sa.Column("id", sa.UUID(), nullable=False),
+        sa.Column("name", sa.String(length=255), nullable=False),
+        sa.Column("description", sa.String(), nullable=True),
+        sa.Column("notes", sa.String(), nullable=True),
+        sa.Column("status", sa.String(length=20), nullable=True),
+        sa.Column("created_by", sa.UUID(), nullable=True),
+        *timestamps("created_at", "updated_at"),
+        sa.Column("closed_at", sa.DateTime(), nullable=True),
+        sa.CheckConstraint("status IN ('open', 'completed', 'cancelled')", name="valid_operation_status"),
+        sa.ForeignKeyConstraint(["created_by"], ["users.id"]),
+        sa.PrimaryKeyConstraint("id"),
+    )
+
+    op.create_table(
+        "transactions",
+        sa.Column("id", sa.UUID(), nullable=False),
+        sa.Column("from_account_id", sa.UUID(), nullable=True),
+        sa.Column("to_account_id", sa.UUID(), nullable=True),
+        sa.Column("amount", sa.Numeric(precision=15, scale=2), nullable=False),
+        sa.Column("description", sa.String(), nullable=True),
+        sa.Column("transaction_type", sa.String(length=30), nullable=True),
+        sa.Column("status", sa.String(length=20), nullable=True),
+        sa.Column("operation_id", sa.UUID(), nullable=True),
+        sa.Column("from_balance_after", sa.Numeric(precision=15, scale=2), nullable=True),
+        sa.Column("to_balance_after", sa.Numeric(precision=15, scale=2), nullable=True),
+        *timestamps("transaction_date"),
+        sa.Column("created_by", sa.UUID(), nullable=True),
+        *timestamps("created_at"),
+        sa.CheckConstraint("amount > 0", name="positive_amount"),
+        sa.CheckConstraint(
+            "transaction_type IN ('transfer', 'deposit', 'withdrawal', 'confirming_settlement')",
+            name="valid_transaction_type"
+        ),
+        sa.CheckConstraint("status IN ('pending', 'completed', 'failed', 'cancelled')", name="valid_status"),
+        sa.ForeignKeyConstraint(["created_by"], ["users.id"]),
+        sa.ForeignKeyConstraint(["from_account_id"], ["accounts.id"]),
+        sa.ForeignKeyConstraint(["operation_id"], ["operations.id"]),
+        sa.ForeignKeyConstraint(["to_account_id"], ["accounts.id"]),
+        sa.PrimaryKeyConstraint("id"),
+    )
+
+    op.create_table(
+        "attachments",
+        sa.Column("id", sa.UUID(), nullable=False),
+        sa.Column("transaction_id", sa.UUID(), nullable=False),
+        sa.Column("filename", sa.String(length=255), nullable=False),
+        sa.Column("content_type", sa.String(length=100), nullable=False),
+        sa.Column("file_data", sa.LargeBinary(), nullable=False),
+        sa.Column("file_size", sa.Integer(), nullable=False),
+        sa.Column("uploaded_by", sa.UUID(), nullable=True),
+        *timestamps("created_at"),
+        sa.ForeignKeyConstraint(["transaction_id"], ["transactions.id"], ondelete="CASCADE"),
+        sa.ForeignKeyConstraint(["uploaded_by"], ["users.id"]),
+        sa.PrimaryKeyConstraint("id"),
+    )
+
+    op.create_table(
+        "pending_entries",
+        sa.Column("id", sa.UUID(), nullable=False),
+        sa.Column("from_group_id", sa.UUID(), nullable=False),
+        sa.Column("to_group_id", sa.UUID(), nullable=False),
+        sa.Column("amount", sa.Numeric(precision=15, scale=2), nullable=False),
+        sa.Column("description", sa.String(length=500), nullable=True),
+        sa.Column("operation_id", sa.UUID(), nullable=True),
+        sa.Column("settled_in_operation_id", sa.UUID(), nullable=True),
+        sa.Column("status", sa.String(length=20), nullable=True),
+        sa.Column("created_by", sa.UUID(), nullable=True),
+        *timestamps("created_at"),
+        sa.Column("settled_at", sa.DateTime(), nullable=True),
+        sa.CheckConstraint("amount > 0", name="positive_pending_amount"),
+        sa.CheckConstraint("status IN ('pending', 'settled')", name="valid_pending_status"),
+        sa.ForeignKeyConstraint(["created_by"], ["users.id"]),
+        sa.ForeignKeyConstraint(["from_group_id"], ["groups.id"]),
+        sa.ForeignKeyConstraint(["operation_id"], ["operations.id"]),
+        sa.ForeignKeyConstraint(["settled_in_operation_id"], ["operations.id"]),
+        sa.ForeignKeyConstraint(["to_group_id"], ["groups.id"]),
+        sa.PrimaryKeyConstraint("id"),
+    )
+
+
+def downgrade() -> None:
+    for table in (
+        "pending_entries", "attachments", "transactions", "operations", "account_permissions",
+        "accounts", "companies", "groups", "users",
+    ):
+        op.drop_table(table)
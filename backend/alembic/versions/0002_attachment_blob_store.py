@@ -0,0 +1,47 @@
+"""Adjuntos en el almacén de blobs: hash del contenido y file_data opcional
+
+El contenido de los adjuntos existentes se mueve después, fuera de la
+transacción de la migración: python migrate_attachments.py
+
+Idempotente (IF NOT EXISTS): la base de datos pudo prepararse con la versión
+anterior de migrate_attachments.py.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-19
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0002"
+down_revision: Union[str, Sequence[str], None] = "0001"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def is_postgresql() -> bool:
+    return op.get_context().dialect.name == "postgresql"
+
+
+def upgrade() -> None:
+    # Solo una base de datos PostgreSQL pudo pasar por los scripts antiguos
+    op.add_column(
+        "attachments", sa.Column("content_hash", sa.String(length=64), nullable=True),
+        if_not_exists=is_postgresql()
+    )
+    with op.batch_alter_table("attachments") as batch_op:
+        batch_op.alter_column("file_data", existing_type=sa.LargeBinary(), nullable=True)
+    op.create_index("ix_attachments_content_hash", "attachments", ["content_hash"], if_not_exists=True)
+
+
+def downgrade() -> None:
+    # Solo es posible si ningún adjunto está ya únicamente en el almacén de blobs
+    op.drop_index("ix_attachments_content_hash", table_name="attachments")
+    with op.batch_alter_table("attachments") as batch_op:
+        batch_op.alter_column("file_data", existing_type=sa.LargeBinary(), nullable=False)
+        batch_op.drop_column("content_hash")
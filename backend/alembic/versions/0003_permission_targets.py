@@ -0,0 +1,99 @@
+"""Permisos sobre una empresa o un grupo entero e índices únicos por destino
+
+- account_permissions.company_id y group_id, y la restricción de destino
+  único (exactamente uno de cuenta, empresa o grupo).
+- Índices únicos (usuario, destino), destino de los INSERT ... ON CONFLICT
+  de las altas masivas. Antes se eliminan los permisos duplicados y se
+  conserva el más reciente.
+
+Solo PostgreSQL. Idempotente: la base de datos pudo prepararse con la versión
+anterior de migrate_permissions.py. Los índices se crean CONCURRENTLY.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-19
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0003"
+down_revision: Union[str, Sequence[str], None] = "0002"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TARGETS = [
+    ("account_id", "ux_account_permissions_user_account"),
+    ("company_id", "ux_account_permissions_user_company"),
+    ("group_id", "ux_account_permissions_user_group"),
+]
+
+SINGLE_TARGET = (
+    "(CASE WHEN account_id IS NULL THEN 0 ELSE 1 END"
+    " + CASE WHEN company_id IS NULL THEN 0 ELSE 1 END"
+    " + CASE WHEN group_id IS NULL THEN 0 ELSE 1 END) = 1"
+)
+
+
+def is_postgresql() -> bool:
+    return op.get_context().dialect.name == "postgresql"
+
+
+def upgrade() -> None:
+    if not is_postgresql():
+        # Sin los scripts antiguos de por medio: cambio directo (batch en SQLite)
+        with op.batch_alter_table("account_permissions") as batch_op:
+            batch_op.add_column(sa.Column("company_id", sa.UUID(), nullable=True))
+            batch_op.add_column(sa.Column("group_id", sa.UUID(), nullable=True))
+            batch_op.create_foreign_key(
+                "account_permissions_company_id_fkey", "companies", ["company_id"], ["id"], ondelete="CASCADE"
+            )
+            batch_op.create_foreign_key(
+                "account_permissions_group_id_fkey", "groups", ["group_id"], ["id"], ondelete="CASCADE"
+            )
+            batch_op.create_check_constraint("single_permission_target", SINGLE_TARGET)
+        for column, name in TARGETS:
+            op.create_index(name, "account_permissions", ["user_id", column], unique=True)
+        return
+
+    op.execute(
+        "ALTER TABLE account_permissions "
+        "ADD COLUMN IF NOT EXISTS company_id UUID REFERENCES companies(id) ON DELETE CASCADE, "
+        "ADD COLUMN IF NOT EXISTS group_id UUID REFERENCES groups(id) ON DELETE CASCADE"
+    )
+    op.drop_constraint("single_permission_target", "account_permissions", type_="check", if_exists=True)
+    op.create_check_constraint("single_permission_target", "account_permissions", SINGLE_TARGET)
+    for column, _ in TARGETS:
+        op.execute(
+            "DELETE FROM account_permissions p USING account_permissions newer "
+            f"WHERE p.user_id = newer.user_id AND p.{column} = newer.{column} "
+            "AND (p.created_at, p.id) < (newer.created_at, newer.id)"
+        )
+
+    # CONCURRENTLY no puede ir dentro de una transacción
+    with op.get_context().autocommit_block():
+        for column, name in TARGETS:
+            # Un CONCURRENTLY interrumpido deja el índice inválido: se rehace
+            op.execute(
+                "DO $$ BEGIN IF EXISTS (SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+                f"WHERE c.relname = '{name}' AND NOT i.indisvalid) THEN DROP INDEX {name}; END IF; END $$"
+            )
+            op.create_index(
+                name, "account_permissions", ["user_id", column], unique=True,
+                if_not_exists=True, postgresql_concurrently=True
+            )
+
+
+def downgrade() -> None:
+    for _, name in reversed(TARGETS):
+        op.drop_index(name, table_name="account_permissions")
+    # Los permisos de empresa o grupo no caben en el esquema anterior
+    op.execute("DELETE FROM account_permissions WHERE account_id IS NULL")
+    with op.batch_alter_table("account_permissions") as batch_op:
+        batch_op.drop_constraint("single_permission_target", type_="check")
+        batch_op.drop_column("group_id")
+        batch_op.drop_column("company_id")
@@ -0,0 +1,93 @@
+"""Índices de búsqueda (pg_trgm y texto completo) y de paginación por cursor
+
+- Trigramas (GiST) para similitud, ILIKE y orden por distancia en usuarios,
+  empresas, cuentas (nombre e IBAN normalizado), operaciones y descripciones
+  de transacciones, y tsvector (GIN) para el texto completo. Solo PostgreSQL;
+  las expresiones son las de app/models.py.
+- (name, id) de grupos y empresas y (created_at, id) de operaciones para la
+  paginación por cursor (0006 hace parciales los dos primeros).
+
+Idempotente: la base de datos pudo prepararse con el antiguo
+migrate_search.py. En PostgreSQL se crean CONCURRENTLY, sin bloquear
+escrituras.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-19
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0004"
+down_revision: Union[str, Sequence[str], None] = "0003"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# (nombre, tabla, expresión), índices GiST de trigramas (mismos que models.trigram_index)
+TRIGRAM_INDEXES = [
+    ("ix_users_email_trgm", "users", "email"),
+    ("ix_users_full_name_trgm", "users", "full_name"),
+    ("ix_companies_name_trgm", "companies", "name"),
+    ("ix_accounts_name_trgm", "accounts", "name"),
+    ("ix_accounts_iban_trgm", "accounts", "upper(replace(iban, ' ', ''))"),
+    ("ix_operations_name_trgm", "operations", "name"),
+    ("ix_transactions_description_trgm", "transactions", "description"),
+]
+
+KEYSET_INDEXES = [
+    ("ix_groups_name_keyset", "groups", ["name", "id"]),
+    ("ix_companies_name_keyset", "companies", ["name", "id"]),
+    ("ix_operations_created_keyset", "operations", ["created_at", "id"]),
+]
+
+
+def is_postgresql() -> bool:
+    return op.get_context().dialect.name == "postgresql"
+
+
+def drop_if_invalid(name: str) -> None:
+    """Un CONCURRENTLY interrumpido deja el índice inválido: se rehace."""
+    op.execute(
+        "DO $$ BEGIN IF EXISTS (SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+        f"WHERE c.relname = '{name}' AND NOT i.indisvalid) THEN DROP INDEX {name}; END IF; END $$"
+    )
+
+
+def upgrade() -> None:
+    postgresql = is_postgresql()
+    if postgresql:
+        op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+
+    # CONCURRENTLY no puede ir dentro de una transacción
+    with op.get_context().autocommit_block():
+        for name, table, columns in KEYSET_INDEXES:
+            if postgresql:
+                drop_if_invalid(name)
+            op.create_index(name, table, columns, if_not_exists=True, postgresql_concurrently=postgresql)
+
+        if not postgresql:
+            return
+        for name, table, expression in TRIGRAM_INDEXES:
+            drop_if_invalid(name)
+            op.execute(
+                f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {table} "
+                f"USING gist (({expression}) gist_trgm_ops)"
+            )
+        drop_if_invalid("ix_transactions_description_tsv")
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_transactions_description_tsv ON transactions "
+            "USING gin (to_tsvector('spanish'::regconfig, coalesce(description, '')))"
+        )
+
+
+def downgrade() -> None:
+    if is_postgresql():
+        op.execute("DROP INDEX IF EXISTS ix_transactions_description_tsv")
+        for name, _, _ in reversed(TRIGRAM_INDEXES):
+            op.execute(f"DROP INDEX IF EXISTS {name}")
+    for name, table, _ in reversed(KEYSET_INDEXES):
+        op.drop_index(name, table_name=table)
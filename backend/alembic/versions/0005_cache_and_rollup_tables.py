@@ -0,0 +1,78 @@
+"""Tablas de versiones de caché, agregados de cashflow y alertas de flujos circulares
+
+- cache_versions: contador por colección o ámbito (ETags y caches por worker).
+- cashflow_rollups: entradas y salidas por cuenta y periodo. En una base de
+  datos con movimientos, después: python rebuild_cashflow.py
+- circular_flow_alerts: ciclos A→B→C→A detectados entre empresas o grupos.
+
+Idempotente (IF NOT EXISTS): las tablas pudieron crearse con create_all.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-19
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0005"
+down_revision: Union[str, Sequence[str], None] = "0004"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def timestamps(*names: str, nullable: bool = True):
+    return [sa.Column(name, sa.DateTime(), server_default=sa.func.now(), nullable=nullable) for name in names]
+
+
+def upgrade() -> None:
+    op.create_table(
+        "cache_versions",
+        sa.Column("key", sa.String(length=100), nullable=False),
+        sa.Column("version", sa.BigInteger(), nullable=False),
+        *timestamps("updated_at", nullable=False),
+        sa.PrimaryKeyConstraint("key"),
+        if_not_exists=True,
+    )
+
+    op.create_table(
+        "cashflow_rollups",
+        sa.Column("period", sa.String(length=10), nullable=False),
+        sa.Column("period_start", sa.Date(), nullable=False),
+        sa.Column("account_id", sa.UUID(), nullable=False),
+        sa.Column("inflow", sa.Numeric(precision=18, scale=2), nullable=False),
+        sa.Column("outflow", sa.Numeric(precision=18, scale=2), nullable=False),
+        sa.Column("transaction_count", sa.Integer(), nullable=False),
+        sa.CheckConstraint("period IN ('day', 'week', 'month')", name="valid_rollup_period"),
+        sa.ForeignKeyConstraint(["account_id"], ["accounts.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("period", "period_start", "account_id"),
+        if_not_exists=True,
+    )
+
+    op.create_table(
+        "circular_flow_alerts",
+        sa.Column("id", sa.UUID(), nullable=False),
+        sa.Column("level", sa.String(length=10), nullable=False),
+        sa.Column("cycle_key", sa.String(length=1000), nullable=False),
+        sa.Column("entity_ids", sa.JSON(), nullable=False),
+        sa.Column("length", sa.Integer(), nullable=False),
+        sa.Column("amount", sa.Numeric(precision=15, scale=2), nullable=False),
+        sa.Column("window_start", sa.DateTime(), nullable=False),
+        sa.Column("window_end", sa.DateTime(), nullable=False),
+        sa.Column("status", sa.String(length=20), nullable=True),
+        *timestamps("detected_at", "updated_at"),
+        sa.CheckConstraint("level IN ('company', 'group')", name="valid_alert_level"),
+        sa.CheckConstraint("status IN ('open', 'dismissed')", name="valid_alert_status"),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("level", "cycle_key", name="uq_circular_flow_cycle"),
+        if_not_exists=True,
+    )
+
+
+def downgrade() -> None:
+    for table in ("circular_flow_alerts", "cashflow_rollups", "cache_versions"):
+        op.drop_table(table)
@@ -0,0 +1,80 @@
+"""Índices para las consultas frecuentes
+
+- transactions: operation_id, transaction_date, created_at y (cuenta, created_at)
+  para el extracto de una cuenta (origen y destino, combinados con BitmapOr).
+- attachments.transaction_id: adjuntos de un movimiento y borrado en cascada.
+- pending_entries: (status, created_at) para los pendientes, (grupo, status)
+  para saldos y filtros por grupo, y las dos operaciones.
+- Parciales sobre is_active = true: cuentas de una empresa, empresas de un
+  grupo y los listados paginados de grupos y empresas.
+
+En PostgreSQL se crean con CREATE INDEX CONCURRENTLY, sin bloquear escrituras.
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-19
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0006"
+down_revision: Union[str, Sequence[str], None] = "0005"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+ACTIVE = sa.text("is_active = true")
+
+INDEXES = [
+    ("ix_transactions_operation_id", "transactions", ["operation_id"], None),
+    ("ix_transactions_transaction_date", "transactions", ["transaction_date"], None),
+    ("ix_transactions_created_at", "transactions", ["created_at"], None),
+    ("ix_transactions_from_account_created", "transactions", ["from_account_id", "created_at"], None),
+    ("ix_transactions_to_account_created", "transactions", ["to_account_id", "created_at"], None),
+    ("ix_attachments_transaction_id", "attachments", ["transaction_id"], None),
+    ("ix_pending_entries_status_created", "pending_entries", ["status", "created_at"], None),
+    ("ix_pending_entries_from_group_status", "pending_entries", ["from_group_id", "status"], None),
+    ("ix_pending_entries_to_group_status", "pending_entries", ["to_group_id", "status"], None),
+    ("ix_pending_entries_operation_id", "pending_entries", ["operation_id"], None),
+    ("ix_pending_entries_settled_in_operation_id", "pending_entries", ["settled_in_operation_id"], None),
+    ("ix_accounts_company_active", "accounts", ["company_id"], ACTIVE),
+    ("ix_companies_group_active", "companies", ["group_id"], ACTIVE),
+]
+
+# Índices de paginación de 0004 que pasan a ser parciales
+PARTIAL_KEYSET = [
+    ("ix_groups_name_keyset", "groups"),
+    ("ix_companies_name_keyset", "companies"),
+]
+
+
+def create_indexes(indexes) -> None:
+    postgresql = op.get_context().dialect.name == "postgresql"
+    for name, table, columns, where in indexes:
+        op.create_index(
+            name, table, columns, if_not_exists=True,
+            postgresql_where=where, postgresql_concurrently=postgresql
+        )
+
+
+def upgrade() -> None:
+    # CONCURRENTLY no puede ir dentro de una transacción
+    with op.get_context().autocommit_block():
+        create_indexes(INDEXES)
+        if op.get_context().dialect.name == "postgresql":
+            for name, table in PARTIAL_KEYSET:
+                op.drop_index(name, table_name=table, if_exists=True, postgresql_concurrently=True)
+            create_indexes([(name, table, ["name", "id"], ACTIVE) for name, table in PARTIAL_KEYSET])
+
+
+def downgrade() -> None:
+    if op.get_context().dialect.name == "postgresql":
+        for name, table in PARTIAL_KEYSET:
+            op.drop_index(name, table_name=table)
+            op.create_index(name, table, ["name", "id"])
+    for name, table, _, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
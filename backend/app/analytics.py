@@ -0,0 +1,324 @@
+"""
+Cache analítica en columnas (NumPy) del histórico de transacciones.
+
+Las consultas de análisis (contrapartes principales, matrices de flujo,
+tendencias mensuales) recorren todo el histórico; en lugar de hidratar objetos
+`Transaction`, cada worker mantiene el histórico en arrays compactos:
+
+    columna        tipo    bytes/fila
+    moved_at       int64   8   segundos desde 1970 (`transaction_date`)
+    amount         int64   8   importe en céntimos
+    from_account   int32   4   código de diccionario (-1 = sin cuenta)
+    to_account     int32   4   código de diccionario (-1 = sin cuenta)
+    kind           int8    1   código de `transaction_type`
+
+25 bytes por fila: ~24 MiB por millón de transacciones, más la capacidad
+libre del crecimiento geométrico (hasta el doble) y los diccionarios (uno por
+cuenta/empresa/grupo, no por fila). Con 200.000 filas, las consultas tardan
+~3 ms frente a 100-200 ms en Python puro (benchmarks/bench_analytics.py).
+
+Empresa y grupo no se guardan por fila: se obtienen con arrays de traducción
+cuenta -> empresa -> grupo que se recargan en cada refresco (son pequeños),
+así que mover una empresa de grupo no obliga a recargar el histórico.
+
+El refresco es incremental por `created_at` (marca de agua). Editar o borrar
+una transacción incrementa la versión "transactions:history" y provoca una
+recarga completa en el siguiente refresco.
+"""
+import threading
+import time
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.cache_bus import HISTORY_VERSION_KEY
+from app.models import Account, Company, Group, CacheVersion, Transaction
+from app.money import to_cents
+
+LEVELS = ("account", "company", "group")
+LOAD_BATCH_SIZE = 50_000
+# Margen para transacciones confirmadas con un created_at anterior a la marca
+HIGH_WATER_OVERLAP = timedelta(minutes=5)
+REFRESH_INTERVAL = 5.0  # segundos entre consultas de refresco
+
+
+class Dictionary:
+    """Codificación de valores (UUID, textos) como enteros consecutivos."""
+
+    def __init__(self):
+        self.codes: Dict[object, int] = {}
+        self.values: List[object] = []
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def encode(self, value) -> int:
+        if value is None:
+            return -1
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def decode(self, code: int):
+        return self.values[code] if code >= 0 else None
+
+
+class TransactionColumns:
+    """Arrays de columnas con capacidad que crece al doble al añadir filas."""
+
+    DTYPES = {
+        "moved_at": np.int64,
+        "amount": np.int64,
+        "from_account": np.int32,
+        "to_account": np.int32,
+        "kind": np.int8
+    }
+
+    def __init__(self, capacity: int = 1024):
+        self.size = 0
+        self._data = {name: np.empty(capacity, dtype=dtype) for name, dtype in self.DTYPES.items()}
+
+    def __getattr__(self, name: str) -> np.ndarray:
+        if name in TransactionColumns.DTYPES:
+            return self._data[name][:self.size]
+        raise AttributeError(name)
+
+    @property
+    def nbytes(self) -> int:
+        """Memoria reservada (incluida la capacidad libre)."""
+        return sum(array.nbytes for array in self._data.values())
+
+    def append(self, **columns: np.ndarray) -> None:
+        count = len(columns["amount"])
+        needed = self.size + count
+        capacity = len(self._data["amount"])
+        if needed > capacity:
+            capacity = max(needed, capacity * 2)
+            for name, array in self._data.items():
+                grown = np.empty(capacity, dtype=array.dtype)
+                grown[:self.size] = array[:self.size]
+                self._data[name] = grown
+        for name, values in columns.items():
+            self._data[name][self.size:needed] = values
+        self.size = needed
+
+
+class AnalyticsCache:
+    """
+    Histórico en columnas de un proceso. Las consultas deben hacerse con
+    `lock` tomado para no mezclar datos de antes y después de una recarga.
+    """
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self._reset()
+
+    def _reset(self):
+        self.columns = TransactionColumns()
+        self.accounts = Dictionary()
+        self.companies = Dictionary()
+        self.groups = Dictionary()
+        self.kinds = Dictionary()
+        self.names: Dict[str, Dict[int, str]] = {level: {} for level in LEVELS}
+        # Traducción por código; la posición final (-1) es el centinela "sin valor"
+        self.account_company = np.full(1, -1, dtype=np.int32)
+        self.company_group = np.full(1, -1, dtype=np.int32)
+        self.high_water: Optional[datetime] = None
+        self.recent_ids: Dict[object, datetime] = {}
+        self.history_version: Optional[int] = None
+        self.refreshed_at = 0.0
+
+    # ============ CARGA ============
+
+    def refresh(self, db: Session, force: bool = False) -> None:
+        """Cargar las transacciones nuevas (o todo, si cambió el histórico)."""
+        with self.lock:
+            if not force and time.monotonic() - self.refreshed_at < REFRESH_INTERVAL:
+                return
+
+            version = db.query(CacheVersion.version).filter(
+                CacheVersion.key == HISTORY_VERSION_KEY
+            ).scalar() or 0
+            if version != self.history_version:
+                self._reset()
+                self.history_version = version
+
+            # Después de las transacciones: así la traducción cubre todas sus cuentas
+            self._load_transactions(db)
+            self._load_hierarchy(db)
+            self.refreshed_at = time.monotonic()
+
+    def _load_hierarchy(self, db: Session) -> None:
+        """Cuentas, empresas y grupos: nombres y traducción cuenta -> empresa -> grupo."""
+        for group in db.query(Group.id, Group.name):
+            self.names["group"][self.groups.encode(group.id)] = group.name
+
+        company_group = {}
+        for company in db.query(Company.id, Company.name, Company.group_id):
+            code = self.companies.encode(company.id)
+            self.names["company"][code] = company.name
+            company_group[code] = self.groups.encode(company.group_id)
+
+        account_company = {}
+        for account in db.query(Account.id, Account.name, Account.company_id):
+            code = self.accounts.encode(account.id)
+            self.names["account"][code] = account.name
+            account_company[code] = self.companies.encode(account.company_id)
+
+        self.account_company = self._translation(account_company, len(self.accounts))
+        self.company_group = self._translation(company_group, len(self.companies))
+
+    @staticmethod
+    def _translation(mapping: Dict[int, int], size: int) -> np.ndarray:
+        array = np.full(size + 1, -1, dtype=np.int32)
+        if mapping:
+            array[np.fromiter(mapping.keys(), dtype=np.int32, count=len(mapping))] = np.fromiter(
+                mapping.values(), dtype=np.int32, count=len(mapping)
+            )
+        return array
+
+    def _load_transactions(self, db: Session) -> None:
+        stmt = select(
+            Transaction.id,
+            Transaction.created_at,
+            Transaction.transaction_date,
+            Transaction.amount,
+            Transaction.from_account_id,
+            Transaction.to_account_id,
+            Transaction.transaction_type
+        ).where(Transaction.status == "completed").order_by(Transaction.created_at)
+
+        if self.high_water is not None:
+            stmt = stmt.where(Transaction.created_at > self.high_water - HIGH_WATER_OVERLAP)
+
+        result = db.execute(stmt.execution_options(yield_per=LOAD_BATCH_SIZE))
+        for batch in result.partitions():
+            rows = [row for row in batch if row.id not in self.recent_ids]
+            if rows:
+                self._append(rows)
+                # Solo hace falta recordar los IDs dentro del margen de solape
+                horizon = self.high_water - HIGH_WATER_OVERLAP
+                self.recent_ids = {
+                    tx_id: created_at for tx_id, created_at in self.recent_ids.items() if created_at > horizon
+                }
+
+    def _append(self, rows) -> None:
+        self.columns.append(
+            moved_at=np.array(
+                [row.transaction_date or row.created_at for row in rows], dtype="datetime64[s]"
+            ).astype(np.int64),
+            amount=np.fromiter((to_cents(row.amount) for row in rows), dtype=np.int64, count=len(rows)),
+            from_account=np.fromiter(
+                (self.accounts.encode(row.from_account_id) for row in rows), dtype=np.int32, count=len(rows)
+            ),
+            to_account=np.fromiter(
+                (self.accounts.encode(row.to_account_id) for row in rows), dtype=np.int32, count=len(rows)
+            ),
+            kind=np.fromiter(
+                (self.kinds.encode(row.transaction_type) for row in rows), dtype=np.int8, count=len(rows)
+            )
+        )
+        for row in rows:
+            self.recent_ids[row.id] = row.created_at
+            if self.high_water is None or row.created_at > self.high_water:
+                self.high_water = row.created_at
+
+    # ============ CONSULTAS ============
+
+    def codes(self, level: str, side: str) -> np.ndarray:
+        """Código de cuenta, empresa o grupo de origen (`from`) o destino (`to`)."""
+        accounts = self.columns.from_account if side == "from" else self.columns.to_account
+        if level == "account":
+            return accounts
+        companies = self.account_company[accounts]
+        if level == "company":
+            return companies
+        return self.company_group[companies]
+
+    def dictionary(self, level: str) -> Dictionary:
+        return {"account": self.accounts, "company": self.companies, "group": self.groups}[level]
+
+    def encode_id(self, level: str, entity_id) -> int:
+        return self.dictionary(level).codes.get(entity_id, -2)  # -2: no coincide con nada
+
+    def describe(self, level: str, code: int) -> Tuple[Optional[object], str]:
+        dictionary = self.dictionary(level)
+        if code < 0:
+            return None, "Sin grupo" if level == "group" else "Sin cuenta"
+        return dictionary.decode(code), self.names[level].get(int(code), "")
+
+    def mask(self, date_from: Optional[date] = None, date_to: Optional[date] = None,
+             transaction_types: Optional[List[str]] = None) -> np.ndarray:
+        """Filtro vectorizado por fechas (inclusive) y tipos de transacción."""
+        mask = np.ones(self.columns.size, dtype=bool)
+        moved_at = self.columns.moved_at
+        if date_from is not None:
+            mask &= moved_at >= _epoch_seconds(date_from)
+        if date_to is not None:
+            mask &= moved_at < _epoch_seconds(date_to + timedelta(days=1))
+        if transaction_types is not None:
+            kinds = [self.kinds.codes[kind] for kind in transaction_types if kind in self.kinds.codes]
+            mask &= np.isin(self.columns.kind, kinds)
+        return mask
+
+    def top_counterparties(self, level: str, entity_id, direction: str = "out", limit: int = 10,
+                           mask: Optional[np.ndarray] = None) -> List[Tuple[int, int, int]]:
+        """
+        Contrapartes con más importe: a quién paga (`out`) o de quién recibe
+        (`in`) la entidad. Devuelve (código, céntimos, nº transacciones).
+        """
+        own_side, other_side = ("from", "to") if direction == "out" else ("to", "from")
+        selected = self.codes(level, own_side) == self.encode_id(level, entity_id)
+        selected &= self.codes(level, other_side) >= 0
+        if mask is not None:
+            selected &= mask
+
+        others = self.codes(level, other_side)[selected]
+        amounts = self.columns.amount[selected]
+        size = len(self.dictionary(level))
+        # bincount suma en float64: exacto hasta 2^53 céntimos
+        totals = np.rint(np.bincount(others, weights=amounts, minlength=size)).astype(np.int64)
+        counts = np.bincount(others, minlength=size)
+
+        top = np.argsort(-totals, kind="stable")[:limit]
+        return [(int(code), int(totals[code]), int(counts[code])) for code in top if counts[code] > 0]
+
+    def monthly_trend(self, level: str, entity_id, mask: Optional[np.ndarray] = None):
+        """Entradas y salidas por mes de una entidad: (mes, entradas, salidas, nº)."""
+        code = self.encode_id(level, entity_id)
+        incoming = self.codes(level, "to") == code
+        outgoing = self.codes(level, "from") == code
+        if mask is not None:
+            incoming &= mask
+            outgoing &= mask
+
+        selected = incoming | outgoing
+        months = self.columns.moved_at[selected].astype("datetime64[s]").astype("datetime64[M]")
+        unique_months, index = np.unique(months, return_inverse=True)
+        amounts = self.columns.amount[selected]
+        inflow = np.bincount(index, weights=np.where(incoming[selected], amounts, 0), minlength=len(unique_months))
+        outflow = np.bincount(index, weights=np.where(outgoing[selected], amounts, 0), minlength=len(unique_months))
+        counts = np.bincount(index, minlength=len(unique_months))
+
+        return [
+            (month.astype(date), int(round(inflow[i])), int(round(outflow[i])), int(counts[i]))
+            for i, month in enumerate(unique_months)
+        ]
+
+
+def _epoch_seconds(value: date) -> int:
+    return int(np.datetime64(value, "s").astype(np.int64))
+
+
+analytics_cache = AnalyticsCache()
+
+
+def get_analytics(db: Session) -> AnalyticsCache:
+    """Cache del proceso, refrescada si han pasado más de REFRESH_INTERVAL segundos."""
+    analytics_cache.refresh(db)
+    return analytics_cache
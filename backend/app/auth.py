@@ -1,22 +1,35 @@
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Optional, Set
 from uuid import UUID
 
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
 from passlib.context import CryptContext
-from sqlalchemy.orm import Session
+from sqlalchemy import and_, case, or_, select, true
+from sqlalchemy.orm import Session, aliased
 
+from app.cache_bus import HIERARCHY_KEY, LocalCache, has_pending, permissions_key
 from app.config import get_settings
 from app.database import get_db
-from app.models import User
+from app.models import User, Account, AccountPermission, Company
 from app.schemas import TokenData
 
 settings = get_settings()
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
 
+# Un permiso puede darse sobre una cuenta, una empresa o un grupo. Para cada
+# cuenta manda el permiso más específico que exista (cuenta > empresa > grupo),
+# completo: un permiso de cuenta con can_view=False oculta esa cuenta aunque
+# haya un permiso sobre su empresa o su grupo.
+PERMISSION_LEVELS = ("account", "company", "group")
+
+# Permisos por usuario: nivel -> {id: (can_view, can_transfer)}
+permissions_cache = LocalCache("permissions", ttl=settings.permissions_cache_ttl)
+# Jerarquía: cuenta -> (empresa, grupo); cambia al crear cuentas o mover empresas
+hierarchy_cache = LocalCache("hierarchy", ttl=settings.permissions_cache_ttl, max_entries=1)
+
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
@@ -86,6 +99,40 @@ async def get_current_supervisor(
     return current_user
 
 
+def _load_grants(db: Session, user_id: UUID) -> dict:
+    grants = {level: {} for level in PERMISSION_LEVELS}
+    rows = db.query(
+        AccountPermission.account_id,
+        AccountPermission.company_id,
+        AccountPermission.group_id,
+        AccountPermission.can_view,
+        AccountPermission.can_transfer
+    ).filter(AccountPermission.user_id == user_id).all()
+    for row in rows:
+        if row.account_id:
+            grants["account"][row.account_id] = (row.can_view, row.can_transfer)
+        elif row.company_id:
+            grants["company"][row.company_id] = (row.can_view, row.can_transfer)
+        else:
+            grants["group"][row.group_id] = (row.can_view, row.can_transfer)
+    return grants
+
+
+def _load_hierarchy(db: Session) -> dict:
+    # outerjoin: las cuentas sin empresa también están (empresa y grupo None)
+    rows = db.query(Account.id, Account.company_id, Company.group_id).outerjoin(
+        Company, Account.company_id == Company.id
+    ).all()
+    return {row.id: (row.company_id, row.group_id) for row in rows}
+
+
+def _cached(db: Session, cache: LocalCache, key: str, loader):
+    if has_pending(db, key):
+        # Cambios propios sin confirmar: no cachearlos
+        return loader()
+    return cache.get_or_load(key, loader)
+
+
 def check_account_permission(
     db: Session,
     user: User,
@@ -93,21 +140,93 @@ def check_account_permission(
     require_transfer: bool = False
 ) -> bool:
     """Verifica si el usuario tiene permiso para acceder a una cuenta."""
-    from app.models import AccountPermission
-    
     # Supervisores tienen acceso total
     if user.role == "supervisor":
         return True
     
-    permission = db.query(AccountPermission).filter(
-        AccountPermission.user_id == user.id,
-        AccountPermission.account_id == account_id
-    ).first()
+    grants = _cached(db, permissions_cache, permissions_key(user.id), lambda: _load_grants(db, user.id))
+    
+    permission = grants["account"].get(account_id)
+    if permission is None and (grants["company"] or grants["group"]):
+        hierarchy = _cached(db, hierarchy_cache, HIERARCHY_KEY, lambda: _load_hierarchy(db))
+        company_id, group_id = hierarchy.get(account_id, (None, None))
+        permission = grants["company"].get(company_id)
+        if permission is None:
+            permission = grants["group"].get(group_id)
     
     if not permission:
         return False
     
+    can_view, can_transfer = permission
     if require_transfer:
-        return permission.can_transfer
+        return bool(can_transfer)
     
-    return permission.can_view
+    return bool(can_view)
+
+
+def visible_company_ids(db: Session, user: User) -> Optional[Set[Optional[UUID]]]:
+    """
+    Empresas con alguna cuenta a la que el usuario tiene permiso (None = todas),
+    a partir de las caches de permisos y jerarquía. Puede incluir de más
+    (permisos sin can_view): sirve para versionar, no para autorizar.
+    """
+    if user.role == "supervisor":
+        return None
+    
+    grants = _cached(db, permissions_cache, permissions_key(user.id), lambda: _load_grants(db, user.id))
+    company_ids = set(grants["company"])
+    if grants["account"] or grants["group"]:
+        hierarchy = _cached(db, hierarchy_cache, HIERARCHY_KEY, lambda: _load_hierarchy(db))
+        # Las cuentas sin empresa tienen ámbito None
+        company_ids.update(hierarchy.get(account_id, (None, None))[0] for account_id in grants["account"])
+        if grants["group"]:
+            company_ids.update(
+                company_id for company_id, group_id in hierarchy.values() if group_id in grants["group"]
+            )
+    return company_ids
+
+
+def effective_permissions(user_id: UUID):
+    """
+    Permisos efectivos del usuario por cuenta (SQL): account_id, can_view,
+    can_transfer y level (nivel del permiso que se aplica).
+    """
+    by_account = aliased(AccountPermission)
+    by_company = aliased(AccountPermission)
+    by_group = aliased(AccountPermission)
+    
+    def pick(column):
+        return case(
+            (by_account.id.isnot(None), getattr(by_account, column)),
+            (by_company.id.isnot(None), getattr(by_company, column)),
+            else_=getattr(by_group, column)
+        )
+    
+    return select(
+        Account.id.label("account_id"),
+        pick("can_view").label("can_view"),
+        pick("can_transfer").label("can_transfer"),
+        case(
+            (by_account.id.isnot(None), "account"),
+            (by_company.id.isnot(None), "company"),
+            else_="group"
+        ).label("level")
+    ).select_from(Account).outerjoin(
+        # Cuentas sin empresa: solo les aplica el permiso directo de cuenta
+        Company, Account.company_id == Company.id
+    ).outerjoin(
+        by_account, and_(by_account.account_id == Account.id, by_account.user_id == user_id)
+    ).outerjoin(
+        by_company, and_(by_company.company_id == Company.id, by_company.user_id == user_id)
+    ).outerjoin(
+        by_group, and_(by_group.group_id == Company.group_id, by_group.user_id == user_id)
+    ).where(
+        or_(by_account.id.isnot(None), by_company.id.isnot(None), by_group.id.isnot(None))
+    )
+
+
+def visible_account_ids(user: User, require_transfer: bool = False):
+    """Subconsulta con los IDs de las cuentas que el usuario puede ver (o transferir)."""
+    effective = effective_permissions(user.id).subquery()
+    column = effective.c.can_transfer if require_transfer else effective.c.can_view
+    return select(effective.c.account_id).where(column == true())
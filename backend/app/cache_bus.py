@@ -0,0 +1,357 @@
+"""
+Bus de invalidación de caches entre workers (PostgreSQL LISTEN/NOTIFY).
+
+Cada worker mantiene caches locales en memoria (`LocalCache`) cuyas claves son
+las mismas que las de `cache_versions` ("groups", "permissions:<user_id>"...).
+
+- Al escribir, `bump_versions` anota las claves en la sesión; justo antes del
+  commit se envía UN solo NOTIFY con todas ellas (coalescencia por
+  transacción). PostgreSQL solo lo entrega si el commit tiene éxito.
+- Un hilo por worker escucha el canal, agrupa las notificaciones que llegan en
+  una ventana corta (coalescencia en recepción) y desaloja las entradas
+  locales con versión anterior.
+- Las entradas tienen además un TTL como red de seguridad si se pierde el bus.
+
+El mismo hilo escucha otros canales que registran los módulos
+(`add_channel`), como el de eventos en vivo, y `send` publica en ellos desde
+un hilo emisor con su propia conexión, fuera de las sesiones de las peticiones.
+"""
+import json
+import logging
+import queue
+import select
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from sqlalchemy import event, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import Session
+
+from app.config import get_settings
+from app.database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "cache_invalidation"
+MAX_PAYLOAD = 7000  # NOTIFY admite hasta 8000 bytes
+PENDING_KEY = "pending_invalidations"
+
+
+# Versión de la relación cuenta -> empresa -> grupo (herencia de permisos)
+HIERARCHY_KEY = "accounts:hierarchy"
+
+# Versión del histórico de transacciones (editar o borrar recarga la cache analítica)
+HISTORY_VERSION_KEY = "transactions:history"
+
+
+def permissions_key(user_id) -> str:
+    """Clave de versión de los permisos de un usuario."""
+    return f"permissions:{user_id}"
+
+
+BALANCES_PREFIX = "balances:"
+
+
+def balances_key(company_id) -> str:
+    """Clave de versión de los saldos y movimientos de las cuentas de una empresa."""
+    return f"{BALANCES_PREFIX}{company_id}"
+
+
+class LocalCache:
+    """Cache en memoria por proceso, indexada por clave de versión."""
+
+    def __init__(self, name: str, ttl: float = 300.0, max_entries: int = 10_000):
+        self.name = name
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: Dict[str, tuple] = {}  # clave -> (versión, expira, valor)
+        self._lock = threading.Lock()
+        registry.register(self)
+
+    def get_or_load(self, key: str, loader: Callable[[], Any]) -> Any:
+        """Valor cacheado de `key` o, si no está o caducó, el de `loader()`."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > now:
+                return entry[2]
+            version = registry.version(key)
+
+        value = loader()
+
+        with self._lock:
+            # Si llegó una invalidación mientras se cargaba, no guardar
+            if registry.version(key) == version:
+                if len(self._entries) >= self.max_entries:
+                    self._entries.clear()
+                self._entries[key] = (version, now + self.ttl, value)
+        return value
+
+    def evict(self, key: str, version: Optional[int] = None) -> None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (version is None or entry[0] < version):
+                del self._entries[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+class CacheRegistry:
+    """Caches locales del proceso y última versión vista de cada clave."""
+
+    def __init__(self):
+        self._caches: List[LocalCache] = []
+        self._versions: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def register(self, cache: LocalCache) -> None:
+        self._caches.append(cache)
+
+    def version(self, key: str) -> int:
+        return self._versions.get(key, 0)
+
+    def invalidate(self, versions: Dict[str, Optional[int]]) -> None:
+        with self._lock:
+            for key, version in versions.items():
+                if version is None:
+                    self._versions[key] = self._versions.get(key, 0) + 1
+                else:
+                    self._versions[key] = max(self._versions.get(key, 0), version)
+        for cache in self._caches:
+            for key, version in versions.items():
+                cache.evict(key, version)
+
+    def clear_all(self) -> None:
+        for cache in self._caches:
+            cache.clear()
+
+
+registry = CacheRegistry()
+
+
+# ============ PUBLICACIÓN (escritores) ============
+
+def queue_invalidation(db: Session, versions: Dict[str, int]) -> None:
+    """Anotar claves a invalidar cuando la transacción haga commit."""
+    pending = db.info.setdefault(PENDING_KEY, {})
+    for key, version in versions.items():
+        pending[key] = max(pending.get(key, 0), version)
+
+
+def has_pending(db: Session, key: str) -> bool:
+    """La sesión ha modificado `key` y aún no ha hecho commit."""
+    return key in db.info.get(PENDING_KEY, ())
+
+
+def _payloads(versions: Dict[str, int]) -> Iterable[str]:
+    """Trocear las claves en mensajes que quepan en un NOTIFY."""
+    chunk: Dict[str, int] = {}
+    size = 2
+    for key, version in sorted(versions.items()):
+        item_size = len(key) + len(str(version)) + 6
+        if chunk and size + item_size > MAX_PAYLOAD:
+            yield json.dumps(chunk, separators=(",", ":"))
+            chunk, size = {}, 2
+        chunk[key] = version
+        size += item_size
+    if chunk:
+        yield json.dumps(chunk, separators=(",", ":"))
+
+
+def notify_versions(connection, versions: Dict[str, int]) -> None:
+    """
+    Enviar las nuevas versiones por el canal (sesión o conexión, en su
+    transacción: PostgreSQL solo lo entrega con el commit). Para escrituras
+    que no pasan por `bump_versions`, como los scripts con SQL directo.
+    """
+    for payload in _payloads(versions):
+        connection.execute(text("SELECT pg_notify(:channel, :payload)"), {"channel": CHANNEL, "payload": payload})
+
+
+@event.listens_for(SessionLocal, "before_commit")
+def _notify_before_commit(session: Session) -> None:
+    pending = session.info.get(PENDING_KEY)
+    if not pending or session.get_bind().dialect.name != "postgresql":
+        return
+    notify_versions(session, pending)
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _evict_after_commit(session: Session) -> None:
+    # En el propio worker se desaloja sin esperar al bus
+    pending = session.info.pop(PENDING_KEY, None)
+    if pending:
+        registry.invalidate(pending)
+
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _discard_after_rollback(session: Session) -> None:
+    session.info.pop(PENDING_KEY, None)
+
+
+# ============ OTROS CANALES ============
+
+_channels: Dict[str, Callable[[List[str]], None]] = {}
+
+
+def add_channel(channel: str, handler: Callable[[List[str]], None]) -> None:
+    """
+    Escuchar también `channel`: `handler` recibe, desde el hilo del bus, los
+    payloads de cada ráfaga en orden de llegada. Registrar antes de arrancar.
+    """
+    _channels[channel] = handler
+
+
+class NotifySender:
+    """Hilo que envía NOTIFY por una conexión psycopg2 dedicada, en orden."""
+
+    def __init__(self, dsn: str, reconnect_delay: float = 2.0, max_queue: int = 10_000):
+        self.dsn = dsn
+        self.reconnect_delay = reconnect_delay
+        self._queue: "queue.Queue[Optional[tuple]]" = queue.Queue(maxsize=max_queue)
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="cache-bus-sender", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._queue.put(None)
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def send(self, channel: str, payload: str) -> bool:
+        try:
+            self._queue.put_nowait((channel, payload))
+            return True
+        except queue.Full:
+            return False
+
+    def _run(self) -> None:
+        import psycopg2
+
+        conn = None
+        while True:
+            message = self._queue.get()
+            if message is None:
+                break
+            try:
+                if conn is None or conn.closed:
+                    conn = psycopg2.connect(self.dsn)
+                    conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+                with conn.cursor() as cur:
+                    cur.execute("SELECT pg_notify(%s, %s)", message)
+            except Exception:
+                # Se pierde el mensaje: los clientes se ponen al día al recargar
+                logger.exception("No se pudo enviar un NOTIFY por el bus")
+                conn = None
+                time.sleep(self.reconnect_delay)
+        if conn is not None:
+            conn.close()
+
+
+# ============ ESCUCHA (un hilo por worker) ============
+
+class InvalidationListener:
+    """Hilo que escucha el canal con una conexión psycopg2 dedicada."""
+
+    def __init__(self, database_url: str, coalesce_window: float = 0.05, reconnect_delay: float = 2.0):
+        url = make_url(database_url).set(drivername="postgresql")
+        self.dsn = url.render_as_string(hide_password=False)
+        self.coalesce_window = coalesce_window
+        self.reconnect_delay = reconnect_delay
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="cache-invalidation", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def _run(self) -> None:
+        import psycopg2
+
+        while not self._stop.is_set():
+            try:
+                conn = psycopg2.connect(self.dsn)
+                conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+                with conn.cursor() as cur:
+                    for channel in (CHANNEL, *_channels):
+                        cur.execute(f"LISTEN {channel}")
+                # Tras (re)conectar se pudo perder algo: vaciar todo
+                registry.clear_all()
+                self._listen(conn)
+            except Exception:
+                logger.exception("Bus de invalidación desconectado; reintentando")
+                self._stop.wait(self.reconnect_delay)
+
+    def _listen(self, conn) -> None:
+        try:
+            while not self._stop.is_set():
+                if select.select([conn], [], [], 1.0) == ([], [], []):
+                    continue
+                # Ventana de coalescencia: agrupar ráfagas de escrituras
+                time.sleep(self.coalesce_window)
+                conn.poll()
+                versions: Dict[str, int] = {}
+                others: Dict[str, List[str]] = {}
+                while conn.notifies:
+                    notification = conn.notifies.pop(0)
+                    if notification.channel != CHANNEL:
+                        others.setdefault(notification.channel, []).append(notification.payload)
+                        continue
+                    for key, version in json.loads(notification.payload).items():
+                        versions[key] = max(versions.get(key, 0), version)
+                # Primero las invalidaciones: un evento puede depender de permisos nuevos
+                if versions:
+                    registry.invalidate(versions)
+                for channel, payloads in others.items():
+                    try:
+                        _channels[channel](payloads)
+                    except Exception:
+                        logger.exception("Error procesando el canal %s", channel)
+        finally:
+            conn.close()
+
+
+_listener: Optional[InvalidationListener] = None
+_sender: Optional[NotifySender] = None
+
+
+def start_listener() -> None:
+    global _listener, _sender
+    settings = get_settings()
+    if _listener is not None or make_url(settings.database_url).get_backend_name() != "postgresql":
+        return
+    _listener = InvalidationListener(settings.database_url, settings.cache_bus_coalesce_ms / 1000)
+    _listener.start()
+    _sender = NotifySender(_listener.dsn)
+    _sender.start()
+
+
+def stop_listener() -> None:
+    global _listener, _sender
+    if _sender is not None:
+        _sender.stop()
+        _sender = None
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def send(channel: str, payload: str) -> bool:
+    """
+    Publicar `payload` en `channel` para todos los workers, este incluido
+    (lo recibe el handler de `add_channel`). False si el bus no está activo
+    o el mensaje no cabe: el llamante lo entrega solo en local.
+    """
+    if _sender is None or len(payload.encode("utf-8")) > MAX_PAYLOAD:
+        return False
+    return _sender.send(channel, payload)
@@ -0,0 +1,154 @@
+"""
+Agregados de flujo de caja (`cashflow_rollups`).
+
+Cada movimiento suma su importe como salida en la cuenta de origen y como
+entrada en la de destino, en los periodos día, semana (ISO, empieza en lunes)
+y mes de su `transaction_date`. Los routers llaman a `apply_to_rollups`
+dentro de la misma transacción que el movimiento; `rebuild_rollups` recalcula
+un rango de fechas desde `transactions` (ver rebuild_cashflow.py).
+
+Los agregados se guardan por cuenta: los totales por empresa y grupo se
+obtienen sumando en la consulta, así que cambiar una empresa de grupo no deja
+datos desactualizados.
+"""
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import Date, cast, func, literal, literal_column, select, text, union_all
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from app.cache_bus import balances_key
+from app.http_cache import bump_versions
+from app.models import Account, CashflowRollup, Transaction
+
+PERIODS = ("day", "week", "month")
+
+
+def period_start(value: date, period: str) -> date:
+    """Inicio del periodo, igual que `date_trunc` de PostgreSQL."""
+    if isinstance(value, datetime):
+        value = value.date()
+    if period == "week":
+        return value - timedelta(days=value.weekday())
+    if period == "month":
+        return value.replace(day=1)
+    return value
+
+
+def next_period_start(value: date, period: str) -> date:
+    start = period_start(value, period)
+    if period == "week":
+        return start + timedelta(days=7)
+    if period == "month":
+        return (start + timedelta(days=32)).replace(day=1)
+    return start + timedelta(days=1)
+
+
+def apply_to_rollups(db: Session, transaction: Transaction, sign: int = 1) -> None:
+    """
+    Sumar (`sign=1`) o restar (`sign=-1`) un movimiento en los agregados.
+    Para una edición: restar con los valores antiguos y sumar con los nuevos.
+    """
+    if transaction.status not in (None, "completed"):
+        return
+
+    when = transaction.transaction_date or datetime.utcnow()
+    amount = transaction.amount * sign
+    # (periodo, inicio, cuenta) -> [entradas, salidas, movimientos]
+    deltas: Dict[Tuple[str, date, object], list] = defaultdict(lambda: [Decimal("0"), Decimal("0"), 0])
+
+    for period in PERIODS:
+        start = period_start(when, period)
+        if transaction.to_account_id:
+            delta = deltas[(period, start, transaction.to_account_id)]
+            delta[0] += amount
+            delta[2] += sign
+        if transaction.from_account_id:
+            delta = deltas[(period, start, transaction.from_account_id)]
+            delta[1] += amount
+            delta[2] += sign
+
+    # Orden fijo de claves para evitar interbloqueos entre escrituras
+    stmt = insert(CashflowRollup).values([
+        {
+            "period": period, "period_start": start, "account_id": account_id,
+            "inflow": inflow, "outflow": outflow, "transaction_count": count
+        }
+        for (period, start, account_id), (inflow, outflow, count) in sorted(deltas.items(), key=str)
+    ])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[CashflowRollup.period, CashflowRollup.period_start, CashflowRollup.account_id],
+        set_={
+            "inflow": CashflowRollup.inflow + stmt.excluded.inflow,
+            "outflow": CashflowRollup.outflow + stmt.excluded.outflow,
+            "transaction_count": CashflowRollup.transaction_count + stmt.excluded.transaction_count
+        }
+    )
+    db.execute(stmt)
+
+
+def rebuild_rollups(db: Session, date_from: Optional[date] = None, date_to: Optional[date] = None) -> int:
+    """
+    Recalcular los agregados de [date_from, date_to] desde `transactions`
+    (todo el histórico si no se indican fechas). No hace commit.
+    Los límites se amplían al periodo completo en cada granularidad.
+    Incrementa las versiones de saldos de todas las empresas (y de las cuentas
+    sin empresa) para que los informes cacheados por ETag se recarguen.
+    """
+    # Bloquea las escrituras incrementales mientras se recalcula
+    db.execute(text("LOCK TABLE cashflow_rollups IN SHARE ROW EXCLUSIVE MODE"))
+
+    completed = Transaction.status == "completed"
+    legs = union_all(
+        select(
+            Transaction.to_account_id.label("account_id"),
+            Transaction.transaction_date.label("moved_at"),
+            Transaction.amount.label("inflow"),
+            literal(0).label("outflow")
+        ).where(completed, Transaction.to_account_id.isnot(None)),
+        select(
+            Transaction.from_account_id,
+            Transaction.transaction_date,
+            literal(0),
+            Transaction.amount
+        ).where(completed, Transaction.from_account_id.isnot(None))
+    ).subquery()
+
+    inserted = 0
+    for period in PERIODS:
+        delete = CashflowRollup.__table__.delete().where(CashflowRollup.period == period)
+        rows = select(legs)
+        if date_from is not None:
+            start = period_start(date_from, period)
+            delete = delete.where(CashflowRollup.period_start >= start)
+            rows = rows.where(legs.c.moved_at >= start)
+        if date_to is not None:
+            end = next_period_start(date_to, period)
+            delete = delete.where(CashflowRollup.period_start < end)
+            rows = rows.where(legs.c.moved_at < end)
+        db.execute(delete)
+
+        rows = rows.subquery()
+        # Literal (no parámetro): el GROUP BY debe repetir la misma expresión
+        bucket = cast(func.date_trunc(literal_column(f"'{period}'"), rows.c.moved_at), Date)
+        aggregated = select(
+            literal(period),
+            bucket,
+            rows.c.account_id,
+            func.sum(rows.c.inflow),
+            func.sum(rows.c.outflow),
+            func.count()
+        ).group_by(bucket, rows.c.account_id)
+
+        result = db.execute(insert(CashflowRollup).from_select(
+            ["period", "period_start", "account_id", "inflow", "outflow", "transaction_count"],
+            aggregated
+        ))
+        inserted += result.rowcount
+
+    company_ids = db.execute(select(Account.company_id).distinct()).scalars()
+    bump_versions(db, *(balances_key(company_id) for company_id in company_ids))
+    return inserted
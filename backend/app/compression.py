@@ -0,0 +1,192 @@
+"""
+Middleware de compresión de respuestas (brotli si está instalado, si no gzip).
+
+- Solo comprime respuestas de al menos `minimum_size` bytes.
+- Las respuestas en streaming se comprimen trozo a trozo, sin acumularlas.
+- Los tipos que ya vienen comprimidos (PDF, JPEG, ZIP...) se envían tal cual,
+  igual que las respuestas parciales (206) y las que ya traen Content-Encoding.
+- Las respuestas con `Accept-Ranges: bytes` (descarga de adjuntos) tampoco se
+  comprimen: la respuesta completa y los rangos (206) deben ser los mismos bytes.
+- Al comprimir, un ETag fuerte pasa a débil (W/): el cuerpo ya no es byte a
+  byte el que identifica.
+"""
+import gzip
+import io
+from typing import Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:  # brotli es opcional
+    brotli = None
+
+UNCOMPRESSIBLE_CONTENT_TYPES = {
+    "application/pdf",
+    "application/zip",
+    "application/gzip",
+    "application/x-gzip",
+    "application/x-7z-compressed",
+    "application/x-rar-compressed",
+    "application/octet-stream",
+    "text/event-stream",  # Cada evento debe llegar en cuanto se emite
+}
+UNCOMPRESSIBLE_PREFIXES = ("image/", "video/", "audio/")
+
+
+def _accepted_encodings(accept_encoding: str) -> set:
+    encodings = set()
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        params = params.replace(" ", "")
+        if params.startswith("q=") and params[2:] in ("0", "0.0", "0.00", "0.000"):
+            continue
+        if name:
+            encodings.add(name.lower())
+    return encodings
+
+
+def is_compressible(content_type: Optional[str]) -> bool:
+    if not content_type:
+        return False
+    media_type = content_type.split(";")[0].strip().lower()
+    if media_type in UNCOMPRESSIBLE_CONTENT_TYPES or media_type.startswith(UNCOMPRESSIBLE_PREFIXES):
+        return False
+    return True
+
+
+class _GzipCompressor:
+    def __init__(self, level: int):
+        self.buffer = io.BytesIO()
+        self.file = gzip.GzipFile(mode="wb", fileobj=self.buffer, compresslevel=level)
+
+    def _drain(self) -> bytes:
+        data = self.buffer.getvalue()
+        self.buffer.seek(0)
+        self.buffer.truncate()
+        return data
+
+    def compress(self, data: bytes) -> bytes:
+        self.file.write(data)
+        return self._drain()
+
+    def finish(self) -> bytes:
+        self.file.close()
+        return self._drain()
+
+
+class _BrotliCompressor:
+    def __init__(self, quality: int):
+        self.compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data: bytes) -> bytes:
+        return self.compressor.process(data)
+
+    def finish(self) -> bytes:
+        return self.compressor.finish()
+
+
+class CompressionMiddleware:
+    def __init__(self, app: ASGIApp, minimum_size: int = 1024, gzip_level: int = 6,
+                 brotli_quality: int = 4) -> None:
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        accepted = _accepted_encodings(Headers(scope=scope).get("accept-encoding", ""))
+        if brotli is not None and "br" in accepted:
+            responder = _CompressionResponder(
+                self.app, "br", lambda: _BrotliCompressor(self.brotli_quality), self.minimum_size
+            )
+        elif "gzip" in accepted:
+            responder = _CompressionResponder(
+                self.app, "gzip", lambda: _GzipCompressor(self.gzip_level), self.minimum_size
+            )
+        else:
+            await self.app(scope, receive, send)
+            return
+
+        await responder(scope, receive, send)
+
+
+class _CompressionResponder:
+    def __init__(self, app: ASGIApp, encoding: str, compressor_factory, minimum_size: int) -> None:
+        self.app = app
+        self.encoding = encoding
+        self.compressor_factory = compressor_factory
+        self.minimum_size = minimum_size
+        self.send: Send = None
+        self.start_message: Optional[Message] = None
+        self.compressor = None
+        self.passthrough = False
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        self.send = send
+        await self.app(scope, receive, self.send_with_compression)
+
+    async def send_with_compression(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            # Esperar al primer trozo del cuerpo para decidir
+            self.start_message = message
+            headers = Headers(raw=message["headers"])
+            self.passthrough = (
+                message["status"] < 200
+                or message["status"] in (204, 206, 304)
+                or "content-encoding" in headers
+                or headers.get("accept-ranges", "").lower() == "bytes"
+                or not is_compressible(headers.get("content-type"))
+            )
+            return
+
+        if message["type"] != "http.response.body":
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.start_message is not None:
+            start_message, self.start_message = self.start_message, None
+
+            if self.passthrough or (not more_body and len(body) < self.minimum_size):
+                self.passthrough = True
+                await self.send(start_message)
+                await self.send(message)
+                return
+
+            self.compressor = self.compressor_factory()
+            headers = MutableHeaders(raw=start_message["headers"])
+            headers["Content-Encoding"] = self.encoding
+            headers.add_vary_header("Accept-Encoding")
+            etag = headers.get("etag")
+            if etag is not None and not etag.startswith("W/"):
+                headers["ETag"] = f"W/{etag}"
+
+            if not more_body:
+                # Respuesta completa: comprimir de una vez
+                compressed = self.compressor.compress(body) + self.compressor.finish()
+                headers["Content-Length"] = str(len(compressed))
+                await self.send(start_message)
+                await self.send({"type": "http.response.body", "body": compressed})
+                return
+
+            # Streaming: la longitud final no se conoce
+            del headers["Content-Length"]
+            await self.send(start_message)
+
+        if self.passthrough:
+            await self.send(message)
+            return
+
+        data = self.compressor.compress(body)
+        if not more_body:
+            data += self.compressor.finish()
+        if data or not more_body:
+            await self.send({"type": "http.response.body", "body": data, "more_body": more_body})
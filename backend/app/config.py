@@ -1,5 +1,6 @@
 from pydantic_settings import BaseSettings
 from functools import lru_cache
+from typing import Optional
 
 
 class Settings(BaseSettings):
@@ -10,6 +11,38 @@ class Settings(BaseSettings):
     secret_key: str = "tu-clave-secreta-muy-segura-cambiar-en-produccion"
     algorithm: str = "HS256"
     access_token_expire_minutes: int = 60 * 24  # 24 horas
+
+    # Almacenamiento de adjuntos ("local" o "s3")
+    storage_backend: str = "local"
+    storage_path: str = "./storage"
+    s3_bucket: str = "finance-app"
+    s3_endpoint_url: Optional[str] = None
+    s3_access_key: Optional[str] = None
+    s3_secret_key: Optional[str] = None
+    s3_region: Optional[str] = None
+
+    # Compresión de respuestas (brotli se usa si el paquete está instalado)
+    compression_enabled: bool = True
+    compression_minimum_size: int = 1024  # bytes
+    compression_gzip_level: int = 6
+    compression_brotli_quality: int = 4
+
+    # Crear las tablas al arrancar (solo desarrollo; en producción: alembic upgrade head)
+    create_schema_on_startup: bool = False
+
+    # Invalidación de caches entre workers (LISTEN/NOTIFY, solo PostgreSQL)
+    cache_bus_enabled: bool = True
+    cache_bus_coalesce_ms: int = 50
+    permissions_cache_ttl: int = 300  # segundos, red de seguridad
+
+    # Métricas Prometheus en /metrics (con debug, también X-DB-Queries y Server-Timing)
+    metrics_enabled: bool = True
+    # Presupuestos de consultas por ruta (app/query_budget.py): "off", "log" o "raise" (tests)
+    query_budget_mode: str = "log"
+
+    # Detección de flujos circulares (A→B→C→A)
+    circular_flow_window_days: int = 30
+    circular_flow_max_length: int = 5
     
     # App
     app_name: str = "Finance App"
@@ -0,0 +1,335 @@
+"""
+Detección de flujos circulares (round-tripping) en el grafo de transferencias.
+
+El grafo tiene un nodo por empresa (o grupo) y una arista A→B si hubo
+transferencias de A a B dentro de la ventana; su peso es el importe total.
+
+- Análisis completo (`scan_circular_flows`, lo usa detect_circular_flows.py):
+  componentes fuertemente conexas con Tarjan (O(V + E)); solo dentro de las
+  componentes con más de un nodo puede haber ciclos, y en ellas se enumeran
+  los ciclos simples de hasta `max_length` aristas.
+- Incremental (`check_new_transfer`, tras cada transferencia): un ciclo nuevo
+  debe pasar por la arista nueva u→v, así que basta buscar caminos v→...→u de
+  hasta `max_length - 1` saltos, expandiendo la vecindad de v nivel a nivel
+  con una consulta por nivel en lugar de releer el histórico.
+
+Cada ciclo se guarda una sola vez (forma canónica) en `circular_flow_alerts`.
+"""
+import logging
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import Dict, Hashable, Iterable, List, Optional, Set, Tuple
+from uuid import UUID
+
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session, aliased
+
+from app.config import get_settings
+from app.database import SessionLocal
+from app.models import Account, CircularFlowAlert, Company, Transaction
+
+logger = logging.getLogger(__name__)
+
+MAX_CYCLES = 1000  # Tope de ciclos por análisis (el número puede crecer exponencialmente)
+
+Edges = Dict[Tuple[Hashable, Hashable], Decimal]
+
+
+# ============ ALGORITMOS ============
+
+def strongly_connected_components(adjacency: Dict[Hashable, Iterable[Hashable]]) -> List[List[Hashable]]:
+    """Tarjan iterativo (sin recursión, apto para grafos grandes)."""
+    index: Dict[Hashable, int] = {}
+    lowlink: Dict[Hashable, int] = {}
+    on_stack: Set[Hashable] = set()
+    stack: List[Hashable] = []
+    components = []
+    counter = 0
+
+    for root in adjacency:
+        if root in index:
+            continue
+        work = [(root, iter(adjacency.get(root, ())))]
+        index[root] = lowlink[root] = counter
+        counter += 1
+        stack.append(root)
+        on_stack.add(root)
+
+        while work:
+            node, successors = work[-1]
+            advanced = False
+            for successor in successors:
+                if successor not in index:
+                    index[successor] = lowlink[successor] = counter
+                    counter += 1
+                    stack.append(successor)
+                    on_stack.add(successor)
+                    work.append((successor, iter(adjacency.get(successor, ()))))
+                    advanced = True
+                    break
+                if successor in on_stack:
+                    lowlink[node] = min(lowlink[node], index[successor])
+            if advanced:
+                continue
+
+            work.pop()
+            if work:
+                parent = work[-1][0]
+                lowlink[parent] = min(lowlink[parent], lowlink[node])
+            if lowlink[node] == index[node]:
+                component = []
+                while True:
+                    member = stack.pop()
+                    on_stack.discard(member)
+                    component.append(member)
+                    if member == node:
+                        break
+                components.append(component)
+
+    return components
+
+
+def bounded_cycles(adjacency: Dict[Hashable, Iterable[Hashable]], component: Iterable[Hashable],
+                   max_length: int, limit: int = MAX_CYCLES) -> List[Tuple[Hashable, ...]]:
+    """
+    Ciclos simples de hasta `max_length` aristas dentro de una componente.
+    Cada ciclo se genera una vez: desde su nodo de menor orden y visitando solo
+    nodos de orden mayor.
+    """
+    order = {node: position for position, node in enumerate(sorted(component, key=str))}
+    cycles = []
+
+    for start in sorted(order, key=order.get):
+        path = [start]
+        on_path = {start}
+        work = [iter(adjacency.get(start, ()))]
+        while work:
+            advanced = False
+            for successor in work[-1]:
+                if successor == start and len(path) > 1:
+                    cycles.append(tuple(path))
+                    if len(cycles) >= limit:
+                        return cycles
+                elif (successor in order and order[successor] > order[start]
+                      and successor not in on_path and len(path) < max_length):
+                    path.append(successor)
+                    on_path.add(successor)
+                    work.append(iter(adjacency.get(successor, ())))
+                    advanced = True
+                    break
+            if not advanced:
+                work.pop()
+                on_path.discard(path.pop())
+
+    return cycles
+
+
+def canonical_cycle(cycle: Tuple[Hashable, ...]) -> Tuple[Hashable, ...]:
+    """Rotación que empieza por el menor nodo: A→B→C y B→C→A son el mismo ciclo."""
+    start = min(range(len(cycle)), key=lambda i: str(cycle[i]))
+    return cycle[start:] + cycle[:start]
+
+
+def cycle_amount(cycle: Tuple[Hashable, ...], edges: Edges) -> Decimal:
+    """Importe que puede haber dado la vuelta completa: la arista más débil."""
+    return min(edges[(cycle[i], cycle[(i + 1) % len(cycle)])] for i in range(len(cycle)))
+
+
+# ============ GRAFO DESDE LA BASE DE DATOS ============
+
+def _transfer_edges_query(db: Session, level: str, since: datetime, until: datetime):
+    from_account = aliased(Account)
+    to_account = aliased(Account)
+    from_company = aliased(Company)
+    to_company = aliased(Company)
+    if level == "company":
+        from_key, to_key = from_company.id, to_company.id
+    else:
+        from_key, to_key = from_company.group_id, to_company.group_id
+
+    query = db.query(
+        from_key.label("from_id"), to_key.label("to_id"), func.sum(Transaction.amount).label("amount")
+    ).select_from(Transaction).join(
+        from_account, Transaction.from_account_id == from_account.id
+    ).join(
+        from_company, from_account.company_id == from_company.id
+    ).join(
+        to_account, Transaction.to_account_id == to_account.id
+    ).join(
+        to_company, to_account.company_id == to_company.id
+    ).filter(
+        Transaction.transaction_type == "transfer",
+        Transaction.status == "completed",
+        Transaction.transaction_date >= since,
+        Transaction.transaction_date <= until,
+        from_key.isnot(None),
+        to_key.isnot(None),
+        from_key != to_key
+    ).group_by(from_key, to_key)
+    return query, from_key
+
+
+def load_transfer_graph(db: Session, level: str, since: datetime, until: datetime) -> Edges:
+    query, _ = _transfer_edges_query(db, level, since, until)
+    return {(row.from_id, row.to_id): row.amount for row in query}
+
+
+def _adjacency(edges: Edges) -> Dict[Hashable, List[Hashable]]:
+    adjacency = defaultdict(list)
+    for source, target in edges:
+        adjacency[source].append(target)
+    return adjacency
+
+
+def save_alerts(db: Session, level: str, cycles: List[Tuple[Hashable, ...]], edges: Edges,
+                since: datetime, until: datetime) -> List[Tuple[Hashable, ...]]:
+    """Registrar ciclos (sin commit); si ya existían se actualizan ventana e importe."""
+    rows = {}
+    for cycle in cycles:
+        cycle = canonical_cycle(cycle)
+        key = ">".join(str(node) for node in cycle)
+        rows[key] = {
+            "id": uuid.uuid4(), "level": level, "cycle_key": key, "entity_ids": [str(node) for node in cycle],
+            "length": len(cycle), "amount": cycle_amount(cycle, edges),
+            "window_start": since, "window_end": until, "status": "open"
+        }
+    if not rows:
+        return []
+
+    stmt = insert(CircularFlowAlert).values([rows[key] for key in sorted(rows)])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["level", "cycle_key"],
+        set_={
+            "amount": stmt.excluded.amount,
+            "window_start": stmt.excluded.window_start,
+            "window_end": stmt.excluded.window_end,
+            "updated_at": func.now()
+        }
+    )
+    db.execute(stmt)
+    return [tuple(row["entity_ids"]) for row in rows.values()]
+
+
+# ============ ANÁLISIS COMPLETO ============
+
+def scan_circular_flows(db: Session, level: str = "company", days: Optional[int] = None,
+                        max_length: Optional[int] = None, until: Optional[datetime] = None):
+    """
+    Analizar la ventana de `days` días que termina en `until` (por defecto,
+    ahora). Devuelve (componentes con más de un nodo, ciclos). No hace commit.
+    """
+    settings = get_settings()
+    days = days or settings.circular_flow_window_days
+    max_length = max_length or settings.circular_flow_max_length
+    until = until or datetime.utcnow()
+    since = until - timedelta(days=days)
+
+    edges = load_transfer_graph(db, level, since, until)
+    adjacency = _adjacency(edges)
+    components = [
+        component for component in strongly_connected_components(adjacency) if len(component) > 1
+    ]
+
+    cycles = []
+    for component in components:
+        cycles.extend(bounded_cycles(adjacency, component, max_length, MAX_CYCLES - len(cycles)))
+        if len(cycles) >= MAX_CYCLES:
+            logger.warning("Análisis de ciclos truncado a %s ciclos", MAX_CYCLES)
+            break
+
+    save_alerts(db, level, cycles, edges, since, until)
+    return components, [canonical_cycle(cycle) for cycle in cycles]
+
+
+# ============ INCREMENTAL ============
+
+def cycles_through_edge(db: Session, level: str, source, target, since: datetime, until: datetime,
+                        max_length: int) -> Tuple[List[Tuple[Hashable, ...]], Edges]:
+    """Ciclos que usan la arista source→target, explorando solo la vecindad de target."""
+    edges: Edges = {}
+    # En el primer nivel también se leen las aristas de source (para su importe)
+    frontier = {source, target}
+    visited = {source, target}
+    for _ in range(max_length - 1):
+        query, from_key = _transfer_edges_query(db, level, since, until)
+        next_frontier = set()
+        for row in query.filter(from_key.in_(list(frontier))):
+            edges[(row.from_id, row.to_id)] = row.amount
+            if row.to_id not in visited:
+                visited.add(row.to_id)
+                next_frontier.add(row.to_id)
+        frontier = next_frontier
+        if not frontier:
+            break
+
+    if (source, target) not in edges:
+        return [], edges
+
+    # Caminos target→...→source de hasta max_length - 1 saltos
+    adjacency = _adjacency(edges)
+    cycles = []
+    path = [target]
+    work = [iter(adjacency.get(target, ()))]
+    while work:
+        advanced = False
+        for successor in work[-1]:
+            if successor == source:
+                cycles.append(tuple([source] + path))
+                if len(cycles) >= MAX_CYCLES:
+                    return cycles, edges
+            elif successor not in path and len(path) < max_length - 1:
+                path.append(successor)
+                work.append(iter(adjacency.get(successor, ())))
+                advanced = True
+                break
+        if not advanced:
+            work.pop()
+            path.pop()
+    return cycles, edges
+
+
+def check_new_transfer(from_account_id: UUID, to_account_id: UUID, transaction_date: datetime) -> None:
+    """
+    Buscar ciclos que cierra una transferencia nueva (empresas y grupos).
+    Se ejecuta en segundo plano tras el commit, con su propia sesión.
+    Usa la misma ventana que el análisis completo por defecto (los últimos
+    N días hasta ahora): una transferencia fuera de ella (muy atrasada o con
+    fecha futura) no cierra ningún ciclo que ese análisis fuera a encontrar.
+    """
+    settings = get_settings()
+    until = datetime.utcnow()
+    since = until - timedelta(days=settings.circular_flow_window_days)
+    if not since <= transaction_date <= until:
+        return
+
+    db = SessionLocal()
+    try:
+        rows = db.query(Account.id, Company.id.label("company_id"), Company.group_id).join(
+            Company, Account.company_id == Company.id
+        ).filter(Account.id.in_([from_account_id, to_account_id])).all()
+        by_account = {row.id: row for row in rows}
+        if from_account_id not in by_account or to_account_id not in by_account:
+            return
+
+        source, target = by_account[from_account_id], by_account[to_account_id]
+        for level, source_id, target_id in (
+            ("company", source.company_id, target.company_id),
+            ("group", source.group_id, target.group_id)
+        ):
+            if source_id is None or target_id is None or source_id == target_id:
+                continue
+            cycles, edges = cycles_through_edge(
+                db, level, source_id, target_id, since, until, settings.circular_flow_max_length
+            )
+            if cycles:
+                save_alerts(db, level, cycles, edges, since, until)
+                logger.warning("Flujo circular detectado (%s): %s ciclos", level, len(cycles))
+        db.commit()
+    except Exception:
+        db.rollback()
+        logger.exception("Error buscando flujos circulares")
+    finally:
+        db.close()
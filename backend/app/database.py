@@ -1,15 +1,41 @@
+from functools import lru_cache
+
 from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
 from app.config import get_settings
 
 settings = get_settings()
 
-engine = create_engine(settings.database_url)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+@lru_cache()
+def get_engine() -> Engine:
+    """
+    Motor de la BD, creado en el primer uso (lifespan de la app, primera
+    sesión o scripts): importar la app no carga el driver ni conecta.
+    """
+    return create_engine(settings.database_url)
+
+
+class LazySession(Session):
+    """Sesión que toma el motor al crearse, no al importar el módulo."""
+
+    def __init__(self, bind=None, **kwargs):
+        super().__init__(bind=bind if bind is not None else get_engine(), **kwargs)
+
+
+SessionLocal = sessionmaker(class_=LazySession, autocommit=False, autoflush=False)
 Base = declarative_base()
 
 
+def __getattr__(name: str):
+    # `from app.database import engine` (scripts) sigue funcionando
+    if name == "engine":
+        return get_engine()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
 def get_db():
     db = SessionLocal()
     try:
@@ -0,0 +1,187 @@
+"""
+Canal de eventos en vivo (saldos y transacciones) para SSE/WebSocket.
+
+Los routers publican después del commit; cada evento se serializa una sola vez
+y se entrega solo a los suscriptores que pueden ver alguna de sus cuentas
+(índice cuenta -> suscriptores, los supervisores reciben todo). La publicación
+es segura desde los hilos del threadpool donde corren los endpoints síncronos.
+Las cuentas de un suscriptor se pueden cambiar sobre la marcha (`update`) cuando
+cambian sus permisos.
+
+Con varios workers, los eventos viajan por el bus de PostgreSQL (canal
+EVENTS_CHANNEL, mismo hilo de escucha que el de invalidación de caches) y
+cada worker los reparte entre sus propios suscriptores. Sin bus (SQLite,
+CACHE_BUS_ENABLED=false) o si el mensaje no cabe en un NOTIFY, se reparten
+solo en el worker que los genera.
+"""
+import asyncio
+import json
+import threading
+from collections import defaultdict
+from decimal import Decimal
+from typing import Dict, Iterable, Optional, Set
+from uuid import UUID
+
+from app import cache_bus
+from app.fast_json import dumps
+from app.models import Account, Transaction
+
+QUEUE_SIZE = 256
+EVENTS_CHANNEL = "live_events"
+
+
+class Event:
+    __slots__ = ("type", "data", "sse", "account_ids")
+
+    def __init__(self, event_type: str, data: str, account_ids: Iterable[UUID] = ()):
+        self.type = event_type
+        self.account_ids = frozenset(account_ids)
+        self.data = data  # JSON ya serializado
+        self.sse = f"event: {event_type}\ndata: {self.data}\n\n".encode("utf-8")
+
+
+class Subscription:
+    def __init__(self, account_ids: Optional[Set[UUID]]):
+        self.account_ids = account_ids  # None = todas (supervisor)
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        self.overflowed = False
+
+    def can_see(self, event: Event) -> bool:
+        """El suscriptor (con sus cuentas actuales) puede ver el evento."""
+        return self.account_ids is None or not self.account_ids.isdisjoint(event.account_ids)
+
+    def deliver(self, event: Event) -> None:
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Cliente demasiado lento: se corta y al reconectar recarga los datos
+            self.overflowed = True
+
+
+class EventBroker:
+    def __init__(self):
+        self._by_account: Dict[UUID, Set[Subscription]] = defaultdict(set)
+        self._all: Set[Subscription] = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._lock = threading.Lock()
+
+    def subscribe(self, account_ids: Optional[Iterable[UUID]]) -> Subscription:
+        """Registrar un suscriptor (llamar desde el event loop)."""
+        self._loop = asyncio.get_running_loop()
+        subscription = Subscription(set(account_ids) if account_ids is not None else None)
+        with self._lock:
+            self._index(subscription)
+        return subscription
+
+    def update(self, subscription: Subscription, account_ids: Optional[Iterable[UUID]]) -> None:
+        """Cambiar las cuentas de un suscriptor (sus permisos han cambiado)."""
+        with self._lock:
+            self._unindex(subscription)
+            subscription.account_ids = set(account_ids) if account_ids is not None else None
+            self._index(subscription)
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            self._unindex(subscription)
+
+    def _index(self, subscription: Subscription) -> None:
+        if subscription.account_ids is None:
+            self._all.add(subscription)
+        else:
+            for account_id in subscription.account_ids:
+                self._by_account[account_id].add(subscription)
+
+    def _unindex(self, subscription: Subscription) -> None:
+        self._all.discard(subscription)
+        for account_id in subscription.account_ids or ():
+            subscribers = self._by_account.get(account_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._by_account[account_id]
+
+    def publish(self, account_ids: Iterable[UUID], event_type: str, payload: dict) -> None:
+        """Publicar un evento para quien pueda ver alguna de `account_ids` (en todos los workers)."""
+        account_ids = [account_id for account_id in account_ids if account_id is not None]
+        data = dumps(payload).decode("utf-8")
+        message = json.dumps({"type": event_type, "accounts": [str(a) for a in account_ids], "data": data})
+        if not cache_bus.send(EVENTS_CHANNEL, message):
+            self.dispatch(account_ids, event_type, data)
+
+    def receive(self, messages: Iterable[str]) -> None:
+        """Eventos llegados por el bus (hilo del bus), de este worker o de otro."""
+        for message in messages:
+            event = json.loads(message)
+            self.dispatch([UUID(a) for a in event["accounts"]], event["type"], event["data"])
+
+    def dispatch(self, account_ids: Iterable[UUID], event_type: str, data: str) -> None:
+        """Entregar un evento a los suscriptores de este worker."""
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return  # Nadie conectado todavía
+
+        account_ids = list(account_ids)
+        with self._lock:
+            targets = set(self._all)
+            for account_id in account_ids:
+                targets.update(self._by_account.get(account_id, ()))
+        if not targets:
+            return
+
+        event = Event(event_type, data, account_ids)
+        loop.call_soon_threadsafe(self._deliver, targets, event)
+
+    @staticmethod
+    def _deliver(targets: Set[Subscription], event: Event) -> None:
+        for subscription in targets:
+            subscription.deliver(event)
+
+
+broker = EventBroker()
+cache_bus.add_channel(EVENTS_CHANNEL, broker.receive)
+
+
+def publish_balance(account: Account, delta: Decimal) -> None:
+    """Publicar el nuevo saldo de una cuenta."""
+    broker.publish([account.id], "balance", {
+        "account_id": account.id,
+        "delta": delta,
+        "balance": account.balance
+    })
+
+
+def _transaction_summary(transaction: Transaction) -> dict:
+    return {
+        "id": transaction.id,
+        "transaction_type": transaction.transaction_type,
+        "amount": transaction.amount,
+        "description": transaction.description,
+        "from_account_id": transaction.from_account_id,
+        "to_account_id": transaction.to_account_id,
+        "operation_id": transaction.operation_id,
+        "transaction_date": transaction.transaction_date
+    }
+
+
+def publish_transaction(transaction: Transaction, event_type: str = "transaction.created") -> None:
+    """Publicar una transacción (ya confirmada) y los saldos resultantes."""
+    accounts = [transaction.from_account_id, transaction.to_account_id]
+    broker.publish(accounts, event_type, _transaction_summary(transaction))
+
+    if event_type != "transaction.created":
+        return
+
+    if transaction.from_account_id and transaction.from_balance_after is not None:
+        broker.publish([transaction.from_account_id], "balance", {
+            "account_id": transaction.from_account_id,
+            "delta": -transaction.amount,
+            "balance": transaction.from_balance_after
+        })
+    if transaction.to_account_id and transaction.to_balance_after is not None:
+        broker.publish([transaction.to_account_id], "balance", {
+            "account_id": transaction.to_account_id,
+            "delta": transaction.amount,
+            "balance": transaction.to_balance_after
+        })
@@ -0,0 +1,107 @@
+"""
+Serialización rápida para listados grandes.
+
+En lugar de hidratar objetos ORM y validarlos con Pydantic (`from_attributes`)
+fila a fila, los listados seleccionan columnas planas con SQLAlchemy Core y las
+convierten a JSON con orjson siguiendo un plan precompilado a partir del
+esquema de respuesta. El plan respeta el orden y el formato de campos de
+Pydantic, de modo que el JSON resultante es idéntico byte a byte al de
+`response_model` (ver benchmarks/bench_serialization.py).
+
+Convención de nombres: las columnas de un modelo anidado llevan como prefijo
+la ruta de la relación separada por "__" (p. ej. `from_account__company__name`).
+"""
+import typing
+from decimal import Decimal
+from typing import Any, Callable, List, Mapping, Optional, Tuple, Type
+
+import orjson
+from fastapi.responses import Response
+from pydantic import BaseModel
+
+
+def _nested_model(annotation) -> Tuple[Type[BaseModel], bool]:
+    """Devolver (modelo, opcional) si el campo es un modelo anidado."""
+    optional = False
+    if typing.get_origin(annotation) is typing.Union:
+        args = [arg for arg in typing.get_args(annotation) if arg is not type(None)]
+        optional = len(args) < len(typing.get_args(annotation))
+        annotation = args[0] if len(args) == 1 else None
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return annotation, optional
+    if typing.get_origin(annotation) in (list, List):
+        raise TypeError("Los listados rápidos no admiten listas anidadas")
+    return None, optional
+
+
+def _key(path: str, name: str) -> str:
+    return f"{path}__{name}" if path else name
+
+
+def select_columns(schema: Type[BaseModel], entities: Mapping[str, Any], path: str = "") -> list:
+    """
+    Columnas etiquetadas que necesita `schema`.
+    `entities` asocia cada ruta ("" para la raíz) a su entidad o alias ORM.
+    """
+    columns = []
+    for name, field in schema.model_fields.items():
+        nested, _ = _nested_model(field.annotation)
+        if nested is not None:
+            columns.extend(select_columns(nested, entities, _key(path, name)))
+        else:
+            columns.append(getattr(entities[path], name).label(_key(path, name)))
+    return columns
+
+
+def compile_row_serializer(schema: Type[BaseModel]) -> Callable[[Mapping[str, Any]], dict]:
+    """Precompilar la conversión fila plana -> dict con la forma de `schema`."""
+
+    def build(model: Type[BaseModel], path: str):
+        plan = []
+        for name, field in model.model_fields.items():
+            nested, optional = _nested_model(field.annotation)
+            if nested is not None:
+                plan.append((name, build(nested, _key(path, name)), _key(_key(path, name), "id") if optional else None))
+            else:
+                plan.append((name, _key(path, name), None))
+
+        def convert(row: Mapping[str, Any]):
+            result = {}
+            for name, source, presence_key in plan:
+                if isinstance(source, str):
+                    result[name] = row[source]
+                elif presence_key is not None and row[presence_key] is None:
+                    result[name] = None
+                else:
+                    result[name] = source(row)
+            return result
+
+        return convert
+
+    return build(schema, "")
+
+
+def _default(value):
+    if isinstance(value, Decimal):
+        return str(value)  # Mismo formato que Pydantic en modo JSON
+    raise TypeError(f"Tipo no serializable: {type(value).__name__}")
+
+
+def dumps(content) -> bytes:
+    return orjson.dumps(content, default=_default)
+
+
+def rows_response(rows, serializer: Callable[[Mapping[str, Any]], dict],
+                  response: Optional[Response] = None) -> Response:
+    """
+    Respuesta JSON directa a partir de filas Core, sin validación Pydantic.
+    `response` es la respuesta temporal del endpoint: sus cabeceras (p. ej. el
+    ETag puesto por una dependencia) se copian a la respuesta final.
+    """
+    result = Response(
+        content=dumps([serializer(row._mapping) for row in rows]),
+        media_type="application/json"
+    )
+    if response is not None:
+        result.headers.raw.extend(response.headers.raw)
+    return result
@@ -0,0 +1,165 @@
+"""
+Caché HTTP con ETags para los endpoints de lectura.
+
+Cada colección tiene un contador en `cache_versions` que los routers
+incrementan (`bump_versions`) dentro de la misma transacción que la escritura.
+El ETag de un listado se deriva de esos contadores, del usuario y de la query
+string, así que un `If-None-Match` se resuelve con una consulta por clave
+primaria sin ejecutar la consulta completa ni serializar la respuesta.
+
+Los saldos se versionan por empresa ("balances:<company_id>", `bump_balances`):
+cada movimiento incrementa solo las filas de las empresas de sus cuentas, así
+que los de empresas distintas no compiten por la misma fila hasta el commit.
+Los listados que muestran saldos suman las versiones de las empresas que ve
+el usuario (todas para un supervisor).
+"""
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from fastapi import Depends, HTTPException, Request, Response, status
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from app.auth import get_current_user, visible_company_ids
+from app.cache_bus import BALANCES_PREFIX, balances_key, permissions_key, queue_invalidation
+from app.database import get_db
+from app.models import CacheVersion, User
+
+
+def bump_versions(db: Session, *keys: str) -> None:
+    """
+    Incrementar las versiones de `keys` (sin commit: va con la escritura).
+    Las nuevas versiones se notifican a los demás workers al hacer commit.
+    """
+    keys = sorted(set(keys))  # Orden fijo para evitar interbloqueos
+    if not keys:
+        return
+
+    now = datetime.utcnow()
+    stmt = insert(CacheVersion).values([
+        {"key": key, "version": 1, "updated_at": now} for key in keys
+    ])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[CacheVersion.key],
+        set_={"version": CacheVersion.version + 1, "updated_at": now}
+    ).returning(CacheVersion.key, CacheVersion.version)
+    queue_invalidation(db, {row.key: row.version for row in db.execute(stmt)})
+
+
+def bump_balances(db: Session, *accounts, keys: Iterable[str] = ()) -> None:
+    """
+    Saldos o movimientos de `accounts` modificados (sin commit): versión de
+    sus empresas, junto con `keys` en la misma sentencia.
+    """
+    bump_versions(db, *keys, *(balances_key(account.company_id) for account in accounts if account is not None))
+
+
+def get_balances_version(db: Session, company_ids: Optional[Iterable]) -> Tuple[str, Optional[datetime]]:
+    """
+    Huella de las versiones de saldos de `company_ids` (None = todas) y su
+    última modificación. Las versiones solo crecen, así que número de filas y
+    suma cambian con cualquier movimiento.
+    """
+    query = db.query(
+        func.count(CacheVersion.key), func.coalesce(func.sum(CacheVersion.version), 0), func.max(CacheVersion.updated_at)
+    )
+    if company_ids is None:
+        query = query.filter(CacheVersion.key.startswith(BALANCES_PREFIX))
+    else:
+        query = query.filter(CacheVersion.key.in_([balances_key(company_id) for company_id in company_ids]))
+    count, total, updated_at = query.one()
+    return f"{count}.{total}", updated_at
+
+
+def get_versions(db: Session, keys: Iterable[str]) -> Dict[str, Tuple[int, Optional[datetime]]]:
+    """Versión y fecha de modificación de cada clave (0/None si no existe)."""
+    keys = list(keys)
+    rows = db.query(CacheVersion.key, CacheVersion.version, CacheVersion.updated_at).filter(
+        CacheVersion.key.in_(keys)
+    ).all()
+    found = {row.key: (row.version, row.updated_at) for row in rows}
+    return {key: found.get(key, (0, None)) for key in keys}
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # Comparación débil: se ignora el prefijo W/
+    candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return etag.removeprefix("W/") in candidates
+
+
+def _not_modified_since(if_modified_since: Optional[str], last_modified: Optional[datetime]) -> bool:
+    if not if_modified_since or last_modified is None:
+        return False
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    return last_modified.replace(microsecond=0) <= since.replace(tzinfo=None)
+
+
+def check_not_modified(request: Request, etag: str,
+                       last_modified: Optional[datetime] = None,
+                       cache_control: str = "private, no-cache") -> Dict[str, str]:
+    """
+    Cortar con un 304 si el cliente ya tiene la versión actual; si no,
+    devolver las cabeceras de caché (ETag, Last-Modified...) para la respuesta.
+    """
+    headers = {"ETag": etag, "Cache-Control": cache_control, "Vary": "Authorization"}
+    if last_modified is not None:
+        headers["Last-Modified"] = format_datetime(
+            last_modified.replace(microsecond=0, tzinfo=timezone.utc), usegmt=True
+        )
+
+    if_none_match = request.headers.get("if-none-match")
+    if _etag_matches(if_none_match, etag) or (
+        if_none_match is None
+        and _not_modified_since(request.headers.get("if-modified-since"), last_modified)
+    ):
+        raise HTTPException(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    return headers
+
+
+def collection_cache(*collections: str, balances: bool = False):
+    """
+    Dependencia para listados: calcula el ETag a partir de las versiones de
+    `collections` (más los permisos del usuario si no es supervisor y, con
+    `balances`, los saldos de las empresas que ve) y responde 304 antes de
+    ejecutar el endpoint si no ha cambiado nada.
+    """
+    def dependency(
+        request: Request,
+        response: Response,
+        current_user: User = Depends(get_current_user),
+        db: Session = Depends(get_db)
+    ):
+        keys: List[str] = list(collections)
+        if current_user.role != "supervisor":
+            keys.append(permissions_key(current_user.id))
+
+        versions = get_versions(db, keys)
+        parts = [str(current_user.id), current_user.role, request.url.path, request.url.query]
+        parts += [f"{key}={versions[key][0]}" for key in keys]
+        timestamps = [updated_at for _, updated_at in versions.values() if updated_at]
+
+        if balances:
+            balances_version, balances_updated_at = get_balances_version(
+                db, visible_company_ids(db, current_user)
+            )
+            parts.append(f"balances={balances_version}")
+            if balances_updated_at:
+                timestamps.append(balances_updated_at)
+
+        etag = 'W/"' + hashlib.sha1("|".join(parts).encode()).hexdigest() + '"'
+        response.headers.update(
+            check_not_modified(request, etag, max(timestamps) if timestamps else None)
+        )
+
+    return Depends(dependency)
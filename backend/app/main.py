@@ -1,10 +1,15 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
 import os
 
+from app.cache_bus import start_listener, stop_listener
 from app.config import get_settings
-from app.database import engine
+from app.compression import CompressionMiddleware
+from app.database import get_engine
+from app.metrics import DB_QUERIES_HEADER, METRICS_CONTENT_TYPE, REGISTRY, MetricsMiddleware
 from app.models import Base
+from app.pagination import NEXT_CURSOR_HEADER, TOTAL_COUNT_HEADER
 from app.routers import (
     auth_router,
     users_router,
@@ -15,18 +20,41 @@ from app.routers import (
     transactions_router,
     operations_router,
     attachments_router,
-    pending_entries_router
+    pending_entries_router,
+    events_router,
+    search_router,
+    reports_router,
+    analytics_router,
+    compliance_router
 )
 
 settings = get_settings()
 
-# Crear tablas
-Base.metadata.create_all(bind=engine)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Arranque y parada del worker. Importar la app no toca la base de datos:
+    el esquema se gestiona con las migraciones (alembic upgrade head).
+    """
+    engine = get_engine()
+    if settings.create_schema_on_startup:
+        Base.metadata.create_all(bind=engine)
+    # Invalidación de caches locales entre workers
+    if settings.cache_bus_enabled:
+        start_listener()
+    
+    yield
+    
+    stop_listener()
+    engine.dispose()
+
 
 app = FastAPI(
     title=settings.app_name,
     description="API para gestión financiera de empresas",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # CORS - permitir frontend local y en producción
@@ -45,8 +73,28 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, TOTAL_COUNT_HEADER, DB_QUERIES_HEADER],
 )
 
+# Compresión gzip/brotli de respuestas JSON grandes
+if settings.compression_enabled:
+    app.add_middleware(
+        CompressionMiddleware,
+        minimum_size=settings.compression_minimum_size,
+        gzip_level=settings.compression_gzip_level,
+        brotli_quality=settings.compression_brotli_quality,
+    )
+
+# Latencia y SQL por ruta, y presupuestos de consultas
+# (el último añadido es el más externo: mide también la compresión)
+if settings.metrics_enabled or settings.query_budget_mode != "off":
+    app.add_middleware(
+        MetricsMiddleware,
+        registry=REGISTRY,
+        debug_headers=settings.debug,
+        budget_mode=settings.query_budget_mode,
+    )
+
 # Routers
 app.include_router(auth_router)
 app.include_router(users_router)
@@ -58,6 +106,11 @@ app.include_router(transactions_router)
 app.include_router(operations_router)
 app.include_router(attachments_router)
 app.include_router(pending_entries_router)
+app.include_router(events_router)
+app.include_router(search_router)
+app.include_router(reports_router)
+app.include_router(analytics_router)
+app.include_router(compliance_router)
 
 
 @app.get("/")
@@ -68,3 +121,9 @@ def root():
 @app.get("/health")
 def health():
     return {"status": "healthy"}
+
+
+if settings.metrics_enabled:
+    @app.get("/metrics", include_in_schema=False)
+    def metrics():
+        return Response(REGISTRY.render(), media_type=METRICS_CONTENT_TYPE)
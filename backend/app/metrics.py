@@ -0,0 +1,259 @@
+"""
+Métricas de la API en formato Prometheus (GET /metrics).
+
+Por ruta (la plantilla, p. ej. /api/operations/{operation_id}/flow):
+- peticiones por código de estado y latencia (histograma)
+- sentencias SQL por petición (histograma), tiempo en la BD y filas devueltas
+
+Las sentencias se cuentan con los eventos before/after_cursor_execute del
+motor y se atribuyen a la petición en curso con una ContextVar: los endpoints
+síncronos se ejecutan en el threadpool con una copia del contexto y ven el
+mismo acumulador. Cada petición acumula en su propio objeto, que se suma al
+registro (con un lock) una sola vez al terminar.
+
+Los contadores son por proceso: con varios workers, Prometheus debe leer
+cada uno por separado.
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.query_budget import enforce_budget
+
+METRICS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+DB_QUERIES_HEADER = "X-DB-Queries"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+# Peticiones que no corresponden a ninguna ruta (404): una sola serie
+UNMATCHED_ROUTE = "<unmatched>"
+
+
+class RequestStats:
+    """Acumulador SQL de la petición en curso."""
+    __slots__ = ("statements", "db_time", "rows", "shapes", "closed")
+
+    def __init__(self):
+        self.statements = 0
+        self.db_time = 0.0
+        self.rows = 0
+        self.shapes: Dict[str, int] = {}  # ejecuciones por sentencia (presupuestos de consultas)
+        self.closed = False  # respuesta enviada: lo que siga (tareas de fondo) no cuenta
+
+
+_current_stats: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+
+def current_stats() -> Optional[RequestStats]:
+    """Acumulador de la petición en curso (None fuera de una petición)."""
+    return _current_stats.get()
+
+
+@contextmanager
+def untracked() -> Iterator[None]:
+    """
+    No atribuir a la petición en curso las sentencias del bloque (ni las de
+    los hilos que se lancen dentro): trabajo que no forma parte de la
+    respuesta, como revalidar una conexión de eventos que dura horas.
+    """
+    token = _current_stats.set(None)
+    try:
+        yield
+    finally:
+        _current_stats.reset(token)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current_stats.get()
+    if stats is not None and not stats.closed:
+        stats.statements += 1
+        stats.shapes[statement] = stats.shapes.get(statement, 0) + 1
+        conn.info["metrics_started"] = time.perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current_stats.get()
+    started = conn.info.pop("metrics_started", None)
+    if stats is None or started is None or stats.closed:
+        return
+    stats.db_time += time.perf_counter() - started
+    # rowcount de un SELECT: filas del resultado (-1 si el driver no lo sabe)
+    if cursor.description is not None and cursor.rowcount > 0:
+        stats.rows += cursor.rowcount
+
+
+class _Histogram:
+    __slots__ = ("bounds", "counts", "total")
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # el último es +Inf
+        self.total = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.total += value
+
+    def samples(self, name: str, labels: str) -> List[str]:
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.bounds, self.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+        cumulative += self.counts[-1]
+        lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {cumulative}')
+        lines.append(f"{name}_sum{{{labels}}} {self.total}")
+        lines.append(f"{name}_count{{{labels}}} {cumulative}")
+        return lines
+
+
+class _RouteMetrics:
+    __slots__ = ("statuses", "latency", "statements", "db_time", "rows")
+
+    def __init__(self):
+        self.statuses: Dict[int, int] = {}
+        self.latency = _Histogram(LATENCY_BUCKETS)
+        self.statements = _Histogram(STATEMENT_BUCKETS)
+        self.db_time = 0.0
+        self.rows = 0
+
+
+def _label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._routes: Dict[Tuple[str, str], _RouteMetrics] = {}
+
+    def observe(self, method: str, route: str, status: int, duration: float, stats: RequestStats) -> None:
+        with self._lock:
+            metrics = self._routes.get((method, route))
+            if metrics is None:
+                metrics = self._routes[(method, route)] = _RouteMetrics()
+            metrics.statuses[status] = metrics.statuses.get(status, 0) + 1
+            metrics.latency.observe(duration)
+            metrics.statements.observe(stats.statements)
+            metrics.db_time += stats.db_time
+            metrics.rows += stats.rows
+
+    def render(self) -> str:
+        with self._lock:
+            routes = [
+                (f'method="{_label(method)}",route="{_label(route)}"', metrics)
+                for (method, route), metrics in sorted(self._routes.items())
+            ]
+            lines = [
+                "# HELP http_requests_total Peticiones atendidas por ruta y código de estado.",
+                "# TYPE http_requests_total counter",
+            ]
+            for labels, metrics in routes:
+                for status, count in sorted(metrics.statuses.items()):
+                    lines.append(f'http_requests_total{{{labels},status="{status}"}} {count}')
+
+            lines += [
+                "# HELP http_request_duration_seconds Latencia de las peticiones.",
+                "# TYPE http_request_duration_seconds histogram",
+            ]
+            for labels, metrics in routes:
+                lines += metrics.latency.samples("http_request_duration_seconds", labels)
+
+            lines += [
+                "# HELP http_request_db_statements Sentencias SQL por petición.",
+                "# TYPE http_request_db_statements histogram",
+            ]
+            for labels, metrics in routes:
+                lines += metrics.statements.samples("http_request_db_statements", labels)
+
+            lines += [
+                "# HELP http_request_db_seconds_total Tiempo en la base de datos.",
+                "# TYPE http_request_db_seconds_total counter",
+            ]
+            lines += [f"http_request_db_seconds_total{{{labels}}} {m.db_time}" for labels, m in routes]
+
+            lines += [
+                "# HELP http_request_db_rows_total Filas devueltas por la base de datos.",
+                "# TYPE http_request_db_rows_total counter",
+            ]
+            lines += [f"http_request_db_rows_total{{{labels}}} {m.rows}" for labels, m in routes]
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+
+class MetricsMiddleware:
+    """
+    Registra cada petición HTTP en `registry`. Con `debug_headers` añade a la
+    respuesta X-DB-Queries y Server-Timing (visible en las devtools del navegador).
+    Al enviar el final del cuerpo comprueba el presupuesto de consultas de la
+    ruta (app.query_budget).
+
+    La petición termina con el último trozo del cuerpo (`more_body` falso): lo
+    que se ejecuta después (BackgroundTasks, como la detección de flujos
+    circulares tras una transferencia) no cuenta ni en la latencia ni en las
+    sentencias ni en el presupuesto.
+    """
+
+    def __init__(self, app: ASGIApp, registry: MetricsRegistry = REGISTRY, debug_headers: bool = False,
+                 budget_mode: str = "off") -> None:
+        self.app = app
+        self.registry = registry
+        self.debug_headers = debug_headers
+        self.budget_mode = budget_mode
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _current_stats.set(stats)
+        started = time.perf_counter()
+        status = 500
+        finished = False
+
+        def finish() -> None:
+            nonlocal finished
+            finished = True
+            # Las tareas de fondo siguen en el mismo contexto (o en una copia, en el
+            # threadpool): el acumulador deja de contar en lugar de soltarse
+            stats.closed = True
+            route = getattr(scope.get("route"), "path", UNMATCHED_ROUTE)
+            self.registry.observe(scope["method"], route, status, time.perf_counter() - started, stats)
+
+        async def send_with_metrics(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if self.debug_headers:
+                    headers = MutableHeaders(scope=message)
+                    headers[DB_QUERIES_HEADER] = str(stats.statements)
+                    headers.append(
+                        "Server-Timing",
+                        f'db;dur={stats.db_time * 1000:.1f};desc="{stats.statements} SQL", '
+                        f"app;dur={(time.perf_counter() - started) * 1000:.1f}"
+                    )
+            await send(message)
+            if message["type"] == "http.response.body" and not message.get("more_body", False) and not finished:
+                finish()
+                if self.budget_mode != "off":
+                    enforce_budget(scope, stats.statements, stats.shapes, self.budget_mode)
+
+        try:
+            await self.app(scope, receive, send_with_metrics)
+        finally:
+            _current_stats.reset(token)
+            if not finished:  # error o desconexión antes de terminar el cuerpo
+                finish()
@@ -1,12 +1,44 @@
-from sqlalchemy import Column, String, Boolean, DateTime, ForeignKey, Numeric, CheckConstraint, Integer, LargeBinary
+from sqlalchemy import Column, String, Boolean, Date, DateTime, ForeignKey, Numeric, CheckConstraint, Integer, LargeBinary, BigInteger, JSON, UniqueConstraint, case, DDL, Index, event, literal_column
 from sqlalchemy.dialects.postgresql import UUID
-from sqlalchemy.orm import relationship
+from sqlalchemy.ext.hybrid import hybrid_property
+from sqlalchemy.orm import relationship, deferred
 from sqlalchemy.sql import func
 import uuid
 
 from app.database import Base
 
 
+# ============ BÚSQUEDA ============
+# Las expresiones de los índices deben coincidir exactamente con las de las
+# consultas (app/routers/search.py) para que PostgreSQL los use.
+
+SEARCH_CONFIG = literal_column("'spanish'::regconfig")
+
+
+def search_vector(column):
+    """tsvector de una columna de texto (índice GIN)."""
+    return func.to_tsvector(SEARCH_CONFIG, func.coalesce(column, literal_column("''")))
+
+
+def normalized_iban(column):
+    """IBAN en mayúsculas y sin espacios."""
+    return func.upper(func.replace(column, literal_column("' '"), literal_column("''")))
+
+
+def trigram_index(name: str, expression, label: str) -> Index:
+    """Índice GiST de trigramas (pg_trgm): similitud, ILIKE y orden por distancia."""
+    return Index(
+        name, expression if isinstance(expression, Column) else expression.label(label),
+        postgresql_using="gist", postgresql_ops={label: "gist_trgm_ops"}
+    ).ddl_if(dialect="postgresql")
+
+
+event.listen(
+    Base.metadata, "before_create",
+    DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(dialect="postgresql")
+)
+
+
 class User(Base):
     __tablename__ = "users"
     
@@ -25,6 +57,8 @@ class User(Base):
     
     __table_args__ = (
         CheckConstraint("role IN ('supervisor', 'user', 'demo')", name="valid_role"),
+        trigram_index("ix_users_email_trgm", email, "email"),
+        trigram_index("ix_users_full_name_trgm", full_name, "full_name"),
     )
 
 
@@ -42,6 +76,10 @@ class Group(Base):
     # Relaciones
     creator = relationship("User")
     companies = relationship("Company", back_populates="group")
+    
+    __table_args__ = (
+        Index("ix_groups_name_keyset", "name", "id", postgresql_where=is_active == True),
+    )
 
 
 class Company(Base):
@@ -60,6 +98,12 @@ class Company(Base):
     creator = relationship("User", back_populates="created_companies")
     group = relationship("Group", back_populates="companies")
     accounts = relationship("Account", back_populates="company", cascade="all, delete-orphan")
+    
+    __table_args__ = (
+        trigram_index("ix_companies_name_trgm", name, "name"),
+        Index("ix_companies_name_keyset", "name", "id", postgresql_where=is_active == True),
+        Index("ix_companies_group_active", "group_id", postgresql_where=is_active == True),
+    )
 
 
 class Account(Base):
@@ -83,7 +127,7 @@ class Account(Base):
     outgoing_transactions = relationship("Transaction", back_populates="from_account", foreign_keys="Transaction.from_account_id")
     incoming_transactions = relationship("Transaction", back_populates="to_account", foreign_keys="Transaction.to_account_id")
     
-    @property
+    @hybrid_property
     def available(self):
         """Calcula el disponible según el tipo de cuenta."""
         if self.account_type == "corriente":
@@ -96,8 +140,20 @@ class Account(Base):
             return self.credit_limit + self.balance
         return self.balance
     
+    @available.inplace.expression
+    @classmethod
+    def _available_expression(cls):
+        """Mismo cálculo en SQL, para consultas sin objetos ORM."""
+        return case(
+            (cls.account_type.in_(["credito", "confirming"]), cls.credit_limit + cls.balance),
+            else_=cls.balance
+        )
+    
     __table_args__ = (
         CheckConstraint("account_type IN ('corriente', 'credito', 'confirming')", name="valid_account_type"),
+        Index("ix_accounts_company_active", "company_id", postgresql_where=is_active == True),
+        trigram_index("ix_accounts_name_trgm", name, "name"),
+        trigram_index("ix_accounts_iban_trgm", normalized_iban(iban), "iban_normalized"),
     )
 
 
@@ -106,7 +162,10 @@ class AccountPermission(Base):
     
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"))
-    account_id = Column(UUID(as_uuid=True), ForeignKey("accounts.id", ondelete="CASCADE"))
+    # Destino: exactamente uno de los tres (cuenta, empresa o grupo entero)
+    account_id = Column(UUID(as_uuid=True), ForeignKey("accounts.id", ondelete="CASCADE"), nullable=True)
+    company_id = Column(UUID(as_uuid=True), ForeignKey("companies.id", ondelete="CASCADE"), nullable=True)
+    group_id = Column(UUID(as_uuid=True), ForeignKey("groups.id", ondelete="CASCADE"), nullable=True)
     can_view = Column(Boolean, default=True)
     can_transfer = Column(Boolean, default=False)
     granted_by = Column(UUID(as_uuid=True), ForeignKey("users.id"))
@@ -115,7 +174,38 @@ class AccountPermission(Base):
     # Relaciones
     user = relationship("User", back_populates="permissions", foreign_keys=[user_id])
     account = relationship("Account", back_populates="permissions")
+    company = relationship("Company")
+    group = relationship("Group")
     granter = relationship("User", foreign_keys=[granted_by])
+    
+    @hybrid_property
+    def level(self):
+        """Nivel del destino: account, company o group."""
+        if self.account_id:
+            return "account"
+        return "company" if self.company_id else "group"
+    
+    @level.inplace.expression
+    @classmethod
+    def _level_expression(cls):
+        return case(
+            (cls.account_id.isnot(None), "account"),
+            (cls.company_id.isnot(None), "company"),
+            else_="group"
+        )
+    
+    __table_args__ = (
+        # Un permiso por usuario y destino (destino de los INSERT ... ON CONFLICT)
+        Index("ux_account_permissions_user_account", "user_id", "account_id", unique=True),
+        Index("ux_account_permissions_user_company", "user_id", "company_id", unique=True),
+        Index("ux_account_permissions_user_group", "user_id", "group_id", unique=True),
+        CheckConstraint(
+            "(CASE WHEN account_id IS NULL THEN 0 ELSE 1 END"
+            " + CASE WHEN company_id IS NULL THEN 0 ELSE 1 END"
+            " + CASE WHEN group_id IS NULL THEN 0 ELSE 1 END) = 1",
+            name="single_permission_target"
+        ),
+    )
 
 
 class Operation(Base):
@@ -137,6 +227,8 @@ class Operation(Base):
     
     __table_args__ = (
         CheckConstraint("status IN ('open', 'completed', 'cancelled')", name="valid_operation_status"),
+        trigram_index("ix_operations_name_trgm", name, "name"),
+        Index("ix_operations_created_keyset", "created_at", "id"),
     )
 
 
@@ -150,12 +242,12 @@ class Transaction(Base):
     description = Column(String)
     transaction_type = Column(String(30))
     status = Column(String(20), default="completed")
-    operation_id = Column(UUID(as_uuid=True), ForeignKey("operations.id"), nullable=True)
+    operation_id = Column(UUID(as_uuid=True), ForeignKey("operations.id"), nullable=True, index=True)
     from_balance_after = Column(Numeric(15, 2), nullable=True)
     to_balance_after = Column(Numeric(15, 2), nullable=True)
-    transaction_date = Column(DateTime, server_default=func.now())  # Fecha del movimiento (editable)
+    transaction_date = Column(DateTime, server_default=func.now(), index=True)  # Fecha del movimiento (editable)
     created_by = Column(UUID(as_uuid=True), ForeignKey("users.id"))
-    created_at = Column(DateTime, server_default=func.now())  # Fecha de registro (automática)
+    created_at = Column(DateTime, server_default=func.now(), index=True)  # Fecha de registro (automática)
     
     # Relaciones
     from_account = relationship("Account", back_populates="outgoing_transactions", foreign_keys=[from_account_id])
@@ -168,6 +260,11 @@ class Transaction(Base):
         CheckConstraint("amount > 0", name="positive_amount"),
         CheckConstraint("transaction_type IN ('transfer', 'deposit', 'withdrawal', 'confirming_settlement')", name="valid_transaction_type"),
         CheckConstraint("status IN ('pending', 'completed', 'failed', 'cancelled')", name="valid_status"),
+        # Movimientos de una cuenta, los más recientes primero (BitmapOr de los dos)
+        Index("ix_transactions_from_account_created", "from_account_id", "created_at"),
+        Index("ix_transactions_to_account_created", "to_account_id", "created_at"),
+        Index("ix_transactions_description_tsv", search_vector(description), postgresql_using="gin").ddl_if(dialect="postgresql"),
+        trigram_index("ix_transactions_description_trgm", description, "description"),
     )
 
 
@@ -175,10 +272,11 @@ class Attachment(Base):
     __tablename__ = "attachments"
     
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    transaction_id = Column(UUID(as_uuid=True), ForeignKey("transactions.id", ondelete="CASCADE"), nullable=False)
+    transaction_id = Column(UUID(as_uuid=True), ForeignKey("transactions.id", ondelete="CASCADE"), nullable=False, index=True)
     filename = Column(String(255), nullable=False)
     content_type = Column(String(100), nullable=False)
-    file_data = Column(LargeBinary, nullable=False)  # Archivo en binario
+    file_data = deferred(Column(LargeBinary, nullable=True))  # Legado: contenido antes del almacén de blobs
+    content_hash = Column(String(64), nullable=True, index=True)  # SHA-256, clave en el almacén de blobs
     file_size = Column(Integer, nullable=False)
     uploaded_by = Column(UUID(as_uuid=True), ForeignKey("users.id"))
     created_at = Column(DateTime, server_default=func.now())
@@ -197,8 +295,8 @@ class PendingEntry(Base):
     to_group_id = Column(UUID(as_uuid=True), ForeignKey("groups.id"), nullable=False)    # Grupo acreedor
     amount = Column(Numeric(15, 2), nullable=False)
     description = Column(String(500))
-    operation_id = Column(UUID(as_uuid=True), ForeignKey("operations.id"), nullable=True)  # Operación donde se creó
-    settled_in_operation_id = Column(UUID(as_uuid=True), ForeignKey("operations.id"), nullable=True)  # Operación donde se liquidó
+    operation_id = Column(UUID(as_uuid=True), ForeignKey("operations.id"), nullable=True, index=True)  # Operación donde se creó
+    settled_in_operation_id = Column(UUID(as_uuid=True), ForeignKey("operations.id"), nullable=True, index=True)  # Operación donde se liquidó
     status = Column(String(20), default="pending")  # pending, settled
     created_by = Column(UUID(as_uuid=True), ForeignKey("users.id"))
     created_at = Column(DateTime, server_default=func.now())
@@ -214,4 +312,55 @@ class PendingEntry(Base):
     __table_args__ = (
         CheckConstraint("amount > 0", name="positive_pending_amount"),
         CheckConstraint("status IN ('pending', 'settled')", name="valid_pending_status"),
+        Index("ix_pending_entries_status_created", "status", "created_at"),
+        Index("ix_pending_entries_from_group_status", "from_group_id", "status"),
+        Index("ix_pending_entries_to_group_status", "to_group_id", "status"),
+    )
+
+
+class CacheVersion(Base):
+    """Contador de versión por colección/ámbito, usado para ETags y caches."""
+    __tablename__ = "cache_versions"
+    
+    key = Column(String(100), primary_key=True)  # p. ej. "accounts", "permissions:<user_id>"
+    version = Column(BigInteger, nullable=False, default=0)
+    updated_at = Column(DateTime, server_default=func.now(), nullable=False)
+
+
+class CashflowRollup(Base):
+    """Entradas y salidas por cuenta y periodo, mantenidas al registrar movimientos."""
+    __tablename__ = "cashflow_rollups"
+    
+    period = Column(String(10), primary_key=True)  # day, week, month
+    period_start = Column(Date, primary_key=True)
+    account_id = Column(UUID(as_uuid=True), ForeignKey("accounts.id", ondelete="CASCADE"), primary_key=True)
+    inflow = Column(Numeric(18, 2), nullable=False, default=0)
+    outflow = Column(Numeric(18, 2), nullable=False, default=0)
+    transaction_count = Column(Integer, nullable=False, default=0)
+    
+    __table_args__ = (
+        CheckConstraint("period IN ('day', 'week', 'month')", name="valid_rollup_period"),
+    )
+
+
+class CircularFlowAlert(Base):
+    """Ciclo de dinero detectado entre empresas o grupos (A→B→C→A)."""
+    __tablename__ = "circular_flow_alerts"
+    
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    level = Column(String(10), nullable=False)  # company, group
+    cycle_key = Column(String(1000), nullable=False)  # IDs del ciclo en forma canónica
+    entity_ids = Column(JSON, nullable=False)  # IDs en el orden del ciclo
+    length = Column(Integer, nullable=False)
+    amount = Column(Numeric(15, 2), nullable=False)  # Mínimo de las aristas: importe que circula
+    window_start = Column(DateTime, nullable=False)
+    window_end = Column(DateTime, nullable=False)
+    status = Column(String(20), default="open")  # open, dismissed
+    detected_at = Column(DateTime, server_default=func.now())
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+    
+    __table_args__ = (
+        UniqueConstraint("level", "cycle_key", name="uq_circular_flow_cycle"),
+        CheckConstraint("level IN ('company', 'group')", name="valid_alert_level"),
+        CheckConstraint("status IN ('open', 'dismissed')", name="valid_alert_status"),
     )
@@ -0,0 +1,16 @@
+"""
+Importes en céntimos enteros.
+
+Los importes son Numeric(15, 2); los cálculos que acumulan muchos importes
+(netting, analítica en columnas) trabajan en céntimos para que las sumas sean
+exactas y convierten a Decimal solo al responder.
+"""
+from decimal import Decimal
+
+
+def to_cents(amount: Decimal) -> int:
+    return int((amount * 100).to_integral_value())
+
+
+def from_cents(cents: int) -> Decimal:
+    return Decimal(cents).scaleb(-2)
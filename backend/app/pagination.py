@@ -0,0 +1,123 @@
+"""
+Paginación por cursor (keyset) y recuentos estimados para los listados.
+
+- El cursor codifica los valores de las columnas de orden de la última fila
+  devuelta; la página siguiente filtra con una comparación de filas
+  `(a, b) > (:a, :b)`, que usa el índice compuesto y cuesta lo mismo en la
+  página 1 que en la 1000 (OFFSET recorre y descarta todas las anteriores).
+- El siguiente cursor va en la cabecera `X-Next-Cursor`, así la respuesta
+  sigue siendo la misma lista de siempre.
+- `X-Total-Count` (opcional) es la estimación del planificador de PostgreSQL
+  (EXPLAIN), no un COUNT(*) exacto que recorrería toda la tabla.
+"""
+import base64
+import json
+from datetime import date, datetime
+from typing import List, Optional, Sequence
+from uuid import UUID
+
+from fastapi import HTTPException, Response, status
+from sqlalchemy import or_, tuple_
+from sqlalchemy.orm import Query, Session
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+TOTAL_COUNT_HEADER = "X-Total-Count"
+
+
+def encode_cursor(values: Sequence) -> str:
+    raw = json.dumps([
+        value.isoformat() if isinstance(value, (date, datetime)) else
+        str(value) if isinstance(value, UUID) else value
+        for value in values
+    ]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, columns: Sequence) -> List:
+    """Valores del cursor convertidos al tipo Python de cada columna."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+        if len(values) != len(columns):
+            raise ValueError(cursor)
+        return [_parse(column, value) for column, value in zip(columns, values)]
+    except (ValueError, TypeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Cursor inválido"
+        )
+
+
+def _parse(column, value):
+    if value is None:
+        return None
+    python_type = column.type.python_type
+    if python_type is datetime:
+        return datetime.fromisoformat(value)
+    if python_type is date:
+        return date.fromisoformat(value)
+    if python_type is UUID:
+        return UUID(value)
+    return python_type(value)
+
+
+def keyset_page(query: Query, columns: Sequence, cursor: Optional[str], limit: int,
+                descending: bool = False, response: Optional[Response] = None):
+    """
+    Una página de `query` ordenada por `columns` (la última debe ser única,
+    normalmente el id). Devuelve (filas, siguiente cursor o None) y, si se
+    pasa `response`, pone el cursor en la cabecera X-Next-Cursor.
+    """
+    key = tuple_(*columns)
+    if cursor:
+        last = tuple_(*decode_cursor(cursor, columns))
+        query = query.filter(key < last if descending else key > last)
+
+    order = [column.desc() for column in columns] if descending else list(columns)
+    rows = query.order_by(*order).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor([_value(rows[-1], column) for column in columns])
+        if response is not None:
+            response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return rows, next_cursor
+
+
+def _value(row, column):
+    if hasattr(row, "_mapping"):
+        return row._mapping[column]
+    return getattr(row, column.key)
+
+
+def text_filter(db: Session, q: str, *columns):
+    """
+    Coincidencia de `q` en cualquiera de las columnas: prefijo o subcadena
+    (ILIKE, servido por los índices de trigramas) y, en PostgreSQL, también
+    por similitud para tolerar errores tipográficos.
+    """
+    conditions = []
+    for column in columns:
+        conditions.append(column.icontains(q, autoescape=True))
+        if db.get_bind().dialect.name == "postgresql":
+            conditions.append(column.op("%")(q))
+    return or_(*conditions)
+
+
+def estimated_count(db: Session, query: Query) -> int:
+    """Filas que el planificador espera para `query` (exacto fuera de PostgreSQL)."""
+    if db.get_bind().dialect.name != "postgresql":
+        return query.order_by(None).count()
+
+    compiled = query.order_by(None).statement.compile(
+        dialect=db.get_bind().dialect, compile_kwargs={"render_postcompile": True}
+    )
+    plan = db.connection().exec_driver_sql(f"EXPLAIN (FORMAT JSON) {compiled}", compiled.params).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+def set_total_count(db: Session, query: Query, response: Response) -> None:
+    response.headers[TOTAL_COUNT_HEADER] = str(estimated_count(db, query))
@@ -0,0 +1,131 @@
+"""
+Presupuestos de consultas SQL por petición (detector de N+1).
+
+Cada router declara cuántas sentencias puede ejecutar una petición y cuántas
+veces puede repetirse una misma sentencia (la misma SQL con otros parámetros:
+el síntoma de un N+1). Una ruta con otro coste lo declara en su decorador,
+que manda sobre el del router:
+
+    router = APIRouter(prefix="/api/operations", dependencies=[query_budget(7)])
+
+    @router.get("/{operation_id}/flow", dependencies=[query_budget(8)])
+
+Cada número es el máximo de sentencias medido para la ruta (o la más cara
+del router) más 2 de margen, para las sentencias que solo ejecuta PostgreSQL
+(locks consultivos, FOR UPDATE) y las recargas de caches por worker. Al
+cambiar una consulta se vuelve a medir: las cabeceras X-DB-Queries con
+DEBUG=true, o la columna SQL de benchmarks/bench_endpoints.py.
+
+MetricsMiddleware comprueba el presupuesto al terminar cada petición, según
+QUERY_BUDGET_MODE: "log" (aviso con las sentencias repetidas), "raise"
+(QueryBudgetExceeded, que hace fallar los tests con TestClient y
+benchmarks/bench_endpoints.py) u "off".
+
+En tests y scripts, `count_queries` cuenta lo que se ejecuta en un bloque
+(bench_endpoints.py lo usa para la columna SQL):
+
+    with count_queries(max_statements=5, max_repeats=1) as counter:
+        client.get("/api/companies/")
+"""
+import logging
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, NamedTuple, Optional
+
+from fastapi import Depends
+from fastapi.requests import HTTPConnection
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.types import Scope
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+class QueryBudget(NamedTuple):
+    statements: int
+    repeats: int
+
+
+def query_budget(statements: int, repeats: int = 2):
+    """
+    Dependencia que declara el presupuesto de la ruta (o de todas las rutas
+    del router): como mucho `statements` sentencias y `repeats` ejecuciones
+    de la misma sentencia por petición.
+    """
+    budget = QueryBudget(statements, repeats)
+
+    async def dependency(connection: HTTPConnection):
+        connection.state.query_budget = budget
+
+    return Depends(dependency)
+
+
+def budget_violations(budget: QueryBudget, statements: int, shapes: Dict[str, int]) -> List[str]:
+    """Descripción de lo que excede el presupuesto (vacía si se cumple)."""
+    violations = []
+    if statements > budget.statements:
+        violations.append(f"{statements} sentencias SQL (presupuesto {budget.statements})")
+    for statement, count in Counter(shapes).most_common():
+        if count <= budget.repeats:
+            break
+        violations.append(f"{count} veces (máximo {budget.repeats}): {' '.join(statement.split())[:200]}")
+    return violations
+
+
+def enforce_budget(scope: Scope, statements: int, shapes: Dict[str, int], mode: str) -> None:
+    """Comprobar el presupuesto declarado por la ruta de `scope` (si lo tiene)."""
+    budget: Optional[QueryBudget] = scope.get("state", {}).get("query_budget")
+    if budget is None:
+        return
+    violations = budget_violations(budget, statements, shapes)
+    if not violations:
+        return
+
+    route = getattr(scope.get("route"), "path", scope.get("path"))
+    message = f"{scope.get('method')} {route} excede su presupuesto de consultas:\n  " + "\n  ".join(violations)
+    if mode == "raise":
+        raise QueryBudgetExceeded(message)
+    logger.warning(message)
+
+
+class QueryCounter:
+    """Sentencias ejecutadas por cualquier motor mientras está activo."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.shapes: Dict[str, int] = {}
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        with self._lock:
+            self.shapes[statement] = self.shapes.get(statement, 0) + 1
+
+    @property
+    def count(self) -> int:
+        return sum(self.shapes.values())
+
+
+@contextmanager
+def count_queries(max_statements: Optional[int] = None, max_repeats: Optional[int] = None) -> Iterator[QueryCounter]:
+    """
+    Contar las sentencias del bloque. Con `max_statements` o `max_repeats`,
+    lanza QueryBudgetExceeded al salir si se superan.
+    """
+    counter = QueryCounter()
+    event.listen(Engine, "before_cursor_execute", counter._record)
+    try:
+        yield counter
+    finally:
+        event.remove(Engine, "before_cursor_execute", counter._record)
+
+    budget = QueryBudget(
+        max_statements if max_statements is not None else counter.count,
+        max_repeats if max_repeats is not None else counter.count,
+    )
+    violations = budget_violations(budget, counter.count, counter.shapes)
+    if violations:
+        raise QueryBudgetExceeded("Presupuesto de consultas excedido:\n  " + "\n  ".join(violations))
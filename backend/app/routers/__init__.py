@@ -8,6 +8,11 @@ from app.routers.transactions import router as transactions_router
 from app.routers.operations import router as operations_router
 from app.routers.attachments import router as attachments_router
 from app.routers.pending_entries import router as pending_entries_router
+from app.routers.events import router as events_router
+from app.routers.search import router as search_router
+from app.routers.reports import router as reports_router
+from app.routers.analytics import router as analytics_router
+from app.routers.compliance import router as compliance_router
 
 __all__ = [
     "auth_router",
@@ -19,5 +24,10 @@ __all__ = [
     "transactions_router",
     "operations_router",
     "attachments_router",
-    "pending_entries_router"
+    "pending_entries_router",
+    "events_router",
+    "search_router",
+    "reports_router",
+    "analytics_router",
+    "compliance_router"
 ]
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Response
 from sqlalchemy.orm import Session, joinedload
 from typing import List
 from uuid import UUID
@@ -6,11 +6,19 @@ from decimal import Decimal
 from datetime import datetime
 
 from app.database import get_db
-from app.models import User, Company, Account, AccountPermission, Transaction
+from app.models import User, Company, Account, Transaction
 from app.schemas import AccountCreate, AccountUpdate, AccountResponse, AccountWithCompany
-from app.auth import get_current_user, get_current_supervisor, check_account_permission
+from app.auth import get_current_user, get_current_supervisor, check_account_permission, visible_account_ids
+from app.http_cache import bump_balances, bump_versions, collection_cache
+from app.cache_bus import HIERARCHY_KEY
+from app.fast_json import select_columns, compile_row_serializer, rows_response
+from app.events import publish_transaction
+from app.cashflow import apply_to_rollups
+from app.query_budget import query_budget
 
-router = APIRouter(prefix="/api/accounts", tags=["Cuentas"])
+router = APIRouter(prefix="/api/accounts", tags=["Cuentas"], dependencies=[query_budget(9)])
+
+serialize_account_row = compile_row_serializer(AccountWithCompany)
 
 
 @router.post("/", response_model=AccountResponse, status_code=status.HTTP_201_CREATED)
@@ -66,38 +74,35 @@ def create_account(
     )
     
     db.add(account)
+    bump_versions(db, "accounts", HIERARCHY_KEY)
     db.commit()
     db.refresh(account)
     
     return account
 
 
-@router.get("/", response_model=List[AccountWithCompany])
+@router.get("/", response_model=List[AccountWithCompany], dependencies=[collection_cache("accounts", "companies", balances=True)])
 def list_accounts(
+    response: Response,
     company_id: UUID = None,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Listar cuentas. Supervisores ven todas, usuarios solo las permitidas."""
-    query = db.query(Account).filter(Account.is_active == True).options(
-        joinedload(Account.company)
-    )
+    query = db.query(
+        *select_columns(AccountWithCompany, {"": Account, "company": Company})
+    ).outerjoin(Company, Account.company_id == Company.id).filter(Account.is_active == True)
     
     if company_id:
         query = query.filter(Account.company_id == company_id)
     
-    if current_user.role == "supervisor":
-        accounts = query.all()
-    else:
+    if current_user.role != "supervisor":
         # Filtrar solo cuentas con permiso
-        permitted_account_ids = db.query(AccountPermission.account_id).filter(
-            AccountPermission.user_id == current_user.id,
-            AccountPermission.can_view == True
-        ).subquery()
+        permitted_account_ids = visible_account_ids(current_user)
         
-        accounts = query.filter(Account.id.in_(permitted_account_ids)).all()
+        query = query.filter(Account.id.in_(permitted_account_ids))
     
-    return accounts
+    return rows_response(query.all(), serialize_account_row, response)
 
 
 @router.get("/{account_id}", response_model=AccountWithCompany)
@@ -163,6 +168,7 @@ def update_account(
     for field, value in update_data.items():
         setattr(account, field, value)
     
+    bump_versions(db, "accounts")
     db.commit()
     db.refresh(account)
     
@@ -192,6 +198,7 @@ def delete_account(
         )
     
     account.is_active = False
+    bump_versions(db, "accounts")
     db.commit()
 
 
@@ -253,8 +260,12 @@ def adjust_balance(
         transaction.from_balance_after = account.balance
     
     db.add(transaction)
+    apply_to_rollups(db, transaction)
+    bump_balances(db, account)
     db.commit()
     
+    publish_transaction(transaction)
+    
     return {
         "message": "Saldo ajustado correctamente",
         "previous_balance": float(current_balance),
@@ -0,0 +1,75 @@
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.orm import Session
+from typing import List, Optional
+from uuid import UUID
+from datetime import date
+
+from app.database import get_db
+from app.models import User
+from app.schemas import CounterpartyTotal, MonthlyTrendPoint
+from app.auth import get_current_supervisor
+from app.money import from_cents
+from app.query_budget import query_budget
+
+router = APIRouter(prefix="/api/analytics", tags=["Análisis"], dependencies=[query_budget(8)])
+
+LEVEL_PATTERN = "^(account|company|group)$"
+
+
+def analytics_cache(db: Session = Depends(get_db)):
+    """Cache analítica refrescada. NumPy se importa en la primera consulta, no al arrancar el worker."""
+    from app.analytics import get_analytics
+    return get_analytics(db)
+
+
+@router.get("/top-counterparties", response_model=List[CounterpartyTotal])
+def get_top_counterparties(
+    entity_id: UUID,
+    level: str = Query("company", pattern=LEVEL_PATTERN),
+    direction: str = Query("out", pattern="^(in|out)$"),
+    limit: int = Query(10, ge=1, le=100),
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    current_user: User = Depends(get_current_supervisor),
+    cache=Depends(analytics_cache)
+):
+    """
+    Contrapartes con mayor importe de una cuenta, empresa o grupo (solo
+    supervisores): a quién paga (`out`) o de quién recibe (`in`).
+    No incluye depósitos ni retiros (no tienen contraparte).
+    """
+    with cache.lock:
+        mask = cache.mask(date_from, date_to)
+        top = cache.top_counterparties(level, entity_id, direction, limit, mask)
+        result = []
+        for code, cents, count in top:
+            counterparty_id, name = cache.describe(level, code)
+            result.append(CounterpartyTotal(
+                id=counterparty_id, name=name,
+                amount=from_cents(cents), transaction_count=count
+            ))
+    return result
+
+
+@router.get("/monthly-trend", response_model=List[MonthlyTrendPoint])
+def get_monthly_trend(
+    entity_id: UUID,
+    level: str = Query("company", pattern=LEVEL_PATTERN),
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    current_user: User = Depends(get_current_supervisor),
+    cache=Depends(analytics_cache)
+):
+    """Entradas y salidas por mes de una cuenta, empresa o grupo (solo supervisores)."""
+    with cache.lock:
+        points = cache.monthly_trend(level, entity_id, cache.mask(date_from, date_to))
+    return [
+        MonthlyTrendPoint(
+            month=month,
+            inflow=from_cents(inflow),
+            outflow=from_cents(outflow),
+            net=from_cents(inflow - outflow),
+            transaction_count=count
+        )
+        for month, inflow, outflow, count in points
+    ]
@@ -1,16 +1,43 @@
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File
-from fastapi.responses import Response
-from sqlalchemy.orm import Session
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Header, Query, Request
+from fastapi.responses import Response, StreamingResponse
+from sqlalchemy.orm import Session, load_only
+from sqlalchemy import or_, text
+from typing import Dict, List, Optional
 from uuid import UUID
 
 from app.database import get_db
-from app.models import User, Transaction, Attachment, AccountPermission
-from app.auth import get_current_user
+from app.models import User, Transaction, Attachment
+from app.auth import get_current_user, check_account_permission, visible_account_ids
+from app.http_cache import check_not_modified
+from app.storage import (
+    BlobStore, BlobTooLarge, BlobNotFound, content_disposition, get_blob_store, parse_range_header
+)
+from app.query_budget import query_budget
 
-router = APIRouter(prefix="/api/attachments", tags=["Adjuntos"])
+router = APIRouter(prefix="/api/attachments", tags=["Adjuntos"], dependencies=[query_budget(7)])
 
 MAX_FILE_SIZE = 5 * 1024 * 1024  # 5MB
+MAX_BULK_TRANSACTIONS = 500
+
+# Columnas de metadatos: nunca incluyen el contenido del fichero
+METADATA_COLUMNS = (
+    Attachment.id,
+    Attachment.transaction_id,
+    Attachment.filename,
+    Attachment.content_type,
+    Attachment.file_size,
+    Attachment.created_at
+)
+
+
+def _metadata_to_dict(row) -> dict:
+    return {
+        "id": str(row.id),
+        "filename": row.filename,
+        "content_type": row.content_type,
+        "file_size": row.file_size,
+        "created_at": row.created_at
+    }
 
 
 def check_transaction_permission(db: Session, user: User, transaction_id: UUID) -> Transaction:
@@ -29,22 +56,10 @@ def check_transaction_permission(db: Session, user: User, transaction_id: UUID)
     # Verificar permisos en las cuentas de la transacción
     has_permission = False
     if transaction.from_account_id:
-        perm = db.query(AccountPermission).filter(
-            AccountPermission.user_id == user.id,
-            AccountPermission.account_id == transaction.from_account_id,
-            AccountPermission.can_view == True
-        ).first()
-        if perm:
-            has_permission = True
+        has_permission = check_account_permission(db, user, transaction.from_account_id)
     
     if transaction.to_account_id and not has_permission:
-        perm = db.query(AccountPermission).filter(
-            AccountPermission.user_id == user.id,
-            AccountPermission.account_id == transaction.to_account_id,
-            AccountPermission.can_view == True
-        ).first()
-        if perm:
-            has_permission = True
+        has_permission = check_account_permission(db, user, transaction.to_account_id)
     
     if not has_permission:
         raise HTTPException(
@@ -55,32 +70,63 @@ def check_transaction_permission(db: Session, user: User, transaction_id: UUID)
     return transaction
 
 
+def _lock_blob(db: Session, content_hash: str) -> None:
+    """
+    Serializar, hasta el commit, las subidas y borrados de un mismo contenido
+    (solo PostgreSQL: lock consultivo por hash, sin tabla).
+    """
+    if db.get_bind().dialect.name == "postgresql":
+        db.execute(
+            text("SELECT pg_advisory_xact_lock(hashtextextended(:key, 0))"),
+            {"key": f"attachment_blob:{content_hash}"}
+        )
+
+
+def _release_blob(db: Session, store: BlobStore, content_hash: str) -> None:
+    """Borrar el blob si ya no lo referencia ningún adjunto."""
+    _lock_blob(db, content_hash)
+    try:
+        # Con el lock, una subida del mismo contenido ya ha hecho commit (y se
+        # ve aquí) o espera y vuelve a escribir el blob si no lo encuentra
+        if not db.query(Attachment.id).filter(Attachment.content_hash == content_hash).first():
+            store.delete(content_hash)
+    finally:
+        db.commit()
+
+
 @router.post("/transaction/{transaction_id}", status_code=status.HTTP_201_CREATED)
-async def upload_attachment(
+def upload_attachment(
     transaction_id: UUID,
     file: UploadFile = File(...),
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    store: BlobStore = Depends(get_blob_store)
 ):
     """Subir un adjunto a una transacción."""
     transaction = check_transaction_permission(db, current_user, transaction_id)
     
-    # Leer contenido del archivo
-    content = await file.read()
-    
-    if len(content) > MAX_FILE_SIZE:
+    # Guardar el contenido por trozos en el almacén (deduplicado por SHA-256)
+    try:
+        content_hash, file_size = store.put(file.file, max_size=MAX_FILE_SIZE)
+    except BlobTooLarge:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=f"El archivo es demasiado grande. Máximo: {MAX_FILE_SIZE // (1024*1024)}MB"
         )
     
+    # Un borrado concurrente del mismo contenido pudo quitar el blob tras put()
+    _lock_blob(db, content_hash)
+    if not store.exists(content_hash):
+        file.file.seek(0)
+        store.put(file.file, max_size=MAX_FILE_SIZE)
+    
     # Crear adjunto
     attachment = Attachment(
         transaction_id=transaction.id,
         filename=file.filename,
         content_type=file.content_type or "application/octet-stream",
-        file_data=content,
-        file_size=len(content),
+        content_hash=content_hash,
+        file_size=file_size,
         uploaded_by=current_user.id
     )
     
@@ -106,29 +152,59 @@ def list_attachments(
     """Listar adjuntos de una transacción."""
     transaction = check_transaction_permission(db, current_user, transaction_id)
     
-    attachments = db.query(Attachment).filter(
+    rows = db.query(*METADATA_COLUMNS).filter(
         Attachment.transaction_id == transaction.id
     ).order_by(Attachment.created_at.desc()).all()
     
-    return [
-        {
-            "id": str(a.id),
-            "filename": a.filename,
-            "content_type": a.content_type,
-            "file_size": a.file_size,
-            "created_at": a.created_at
-        }
-        for a in attachments
-    ]
+    return [_metadata_to_dict(row) for row in rows]
+
+
+@router.get("/transactions", response_model=Dict[UUID, List[dict]])
+def list_attachments_bulk(
+    ids: List[UUID] = Query(..., description="IDs de transacciones"),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Listar los adjuntos de varias transacciones en una sola llamada.
+    Devuelve un diccionario transaction_id -> lista de adjuntos; las
+    transacciones sin permiso o inexistentes se omiten.
+    """
+    if len(ids) > MAX_BULK_TRANSACTIONS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Máximo {MAX_BULK_TRANSACTIONS} transacciones por consulta"
+        )
+    
+    query = db.query(*METADATA_COLUMNS).filter(Attachment.transaction_id.in_(ids))
+    
+    if current_user.role != "supervisor":
+        permitted_account_ids = visible_account_ids(current_user)
+        
+        query = query.join(Transaction, Transaction.id == Attachment.transaction_id).filter(
+            or_(
+                Transaction.from_account_id.in_(permitted_account_ids),
+                Transaction.to_account_id.in_(permitted_account_ids)
+            )
+        )
+    
+    result = {}
+    for row in query.order_by(Attachment.created_at.desc()).all():
+        result.setdefault(row.transaction_id, []).append(_metadata_to_dict(row))
+    
+    return result
 
 
 @router.get("/{attachment_id}/download")
 def download_attachment(
     attachment_id: UUID,
+    request: Request,
+    range_header: Optional[str] = Header(None, alias="Range"),
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    store: BlobStore = Depends(get_blob_store)
 ):
-    """Descargar un adjunto."""
+    """Descargar un adjunto (admite peticiones parciales con `Range`)."""
     attachment = db.query(Attachment).filter(Attachment.id == attachment_id).first()
     
     if not attachment:
@@ -140,12 +216,53 @@ def download_attachment(
     # Verificar permiso
     check_transaction_permission(db, current_user, attachment.transaction_id)
     
-    return Response(
-        content=attachment.file_data,
+    headers = {
+        "Content-Disposition": content_disposition(attachment.filename or "adjunto"),
+        "Accept-Ranges": "bytes"
+    }
+    
+    # Adjuntos antiguos aún no migrados al almacén de blobs
+    if attachment.content_hash is None:
+        return Response(
+            content=attachment.file_data,
+            media_type=attachment.content_type,
+            headers=headers
+        )
+    
+    # El contenido de un adjunto nunca cambia: caché inmutable por hash
+    headers.update(check_not_modified(
+        request, f'"{attachment.content_hash}"',
+        cache_control="private, max-age=31536000, immutable"
+    ))
+    
+    size = attachment.file_size
+    try:
+        byte_range = parse_range_header(range_header, size)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+            detail="Rango no válido",
+            headers={"Content-Range": f"bytes */{size}"}
+        )
+    
+    start, end = byte_range if byte_range else (0, size - 1)
+    try:
+        content = store.open_range(attachment.content_hash, start, end)
+    except BlobNotFound:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Contenido del adjunto no encontrado"
+        )
+    
+    headers["Content-Length"] = str(end - start + 1)
+    if byte_range:
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    
+    return StreamingResponse(
+        content,
+        status_code=status.HTTP_206_PARTIAL_CONTENT if byte_range else status.HTTP_200_OK,
         media_type=attachment.content_type,
-        headers={
-            "Content-Disposition": f'attachment; filename="{attachment.filename}"'
-        }
+        headers=headers
     )
 
 
@@ -153,10 +270,13 @@ def download_attachment(
 def delete_attachment(
     attachment_id: UUID,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    store: BlobStore = Depends(get_blob_store)
 ):
     """Eliminar un adjunto."""
-    attachment = db.query(Attachment).filter(Attachment.id == attachment_id).first()
+    attachment = db.query(Attachment).options(
+        load_only(Attachment.id, Attachment.transaction_id, Attachment.uploaded_by, Attachment.content_hash)
+    ).filter(Attachment.id == attachment_id).first()
     
     if not attachment:
         raise HTTPException(
@@ -174,7 +294,13 @@ def delete_attachment(
             detail="Solo puedes eliminar adjuntos que hayas subido"
         )
     
+    content_hash = attachment.content_hash
+    
     db.delete(attachment)
     db.commit()
     
+    # Borrar el blob si ningún otro adjunto comparte el mismo contenido
+    if content_hash:
+        _release_blob(db, store, content_hash)
+    
     return None
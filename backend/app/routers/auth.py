@@ -13,8 +13,9 @@ from app.auth import (
     get_current_user
 )
 from app.config import get_settings
+from app.query_budget import query_budget
 
-router = APIRouter(prefix="/api/auth", tags=["Autenticación"])
+router = APIRouter(prefix="/api/auth", tags=["Autenticación"], dependencies=[query_budget(5)])
 settings = get_settings()
 
 
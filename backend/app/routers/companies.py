@@ -1,14 +1,18 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
 from sqlalchemy.orm import Session, joinedload
-from typing import List
+from typing import List, Optional
 from uuid import UUID
 
 from app.database import get_db
-from app.models import User, Company, Account, AccountPermission
+from app.models import User, Company, Account
 from app.schemas import CompanyCreate, CompanyUpdate, CompanyResponse, CompanyWithAccounts
-from app.auth import get_current_user, get_current_supervisor
+from app.auth import get_current_user, get_current_supervisor, check_account_permission, visible_account_ids
+from app.http_cache import bump_versions, collection_cache
+from app.cache_bus import HIERARCHY_KEY
+from app.pagination import keyset_page, set_total_count, text_filter
+from app.query_budget import query_budget
 
-router = APIRouter(prefix="/api/companies", tags=["Empresas"])
+router = APIRouter(prefix="/api/companies", tags=["Empresas"], dependencies=[query_budget(8)])
 
 
 @router.post("/", response_model=CompanyResponse, status_code=status.HTTP_201_CREATED)
@@ -26,47 +30,55 @@ def create_company(
     )
     
     db.add(company)
+    bump_versions(db, "companies")
     db.commit()
     db.refresh(company)
     
     return company
 
 
-@router.get("/", response_model=List[CompanyWithAccounts])
+@router.get("/", response_model=List[CompanyWithAccounts], dependencies=[collection_cache("companies", "accounts", balances=True)])
 def list_companies(
+    response: Response,
+    q: Optional[str] = Query(None, min_length=1, max_length=100),
+    cursor: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    total: bool = False,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Listar empresas. Supervisores ven todas, usuarios solo las que tienen permiso."""
-    if current_user.role == "supervisor":
-        companies = db.query(Company).filter(Company.is_active == True).options(
-            joinedload(Company.accounts)
-        ).all()
-    else:
-        # Obtener empresas donde el usuario tiene al menos una cuenta con permiso
-        account_ids = db.query(AccountPermission.account_id).filter(
-            AccountPermission.user_id == current_user.id,
-            AccountPermission.can_view == True
-        ).subquery()
+    """
+    Listar empresas por nombre. Supervisores ven todas, usuarios solo las que
+    tienen permiso. Sin `limit` se devuelven todas.
+    """
+    query = db.query(Company).filter(Company.is_active == True)
+    if current_user.role != "supervisor":
+        # Empresas donde el usuario tiene al menos una cuenta con permiso
+        account_ids = visible_account_ids(current_user)
         
         company_ids = db.query(Account.company_id).filter(
             Account.id.in_(account_ids)
         ).distinct().subquery()
         
-        companies = db.query(Company).filter(
-            Company.id.in_(company_ids),
-            Company.is_active == True
-        ).options(joinedload(Company.accounts)).all()
-        
+        query = query.filter(Company.id.in_(company_ids))
+    
+    if q:
+        query = query.filter(text_filter(db, q, Company.name))
+    if total:
+        set_total_count(db, query, response)
+    
+    query = query.options(joinedload(Company.accounts))
+    if limit is None and cursor is None:
+        companies = query.order_by(Company.name, Company.id).all()
+    else:
+        companies, _ = keyset_page(query, (Company.name, Company.id), cursor, limit or 100, response=response)
+    
+    if current_user.role != "supervisor":
         # Filtrar cuentas para mostrar solo las permitidas
         for company in companies:
             permitted_accounts = []
             for account in company.accounts:
-                if db.query(AccountPermission).filter(
-                    AccountPermission.user_id == current_user.id,
-                    AccountPermission.account_id == account.id,
-                    AccountPermission.can_view == True
-                ).first():
+                if check_account_permission(db, current_user, account.id):
                     permitted_accounts.append(account)
             company.accounts = permitted_accounts
     
@@ -93,27 +105,17 @@ def get_company(
     
     if current_user.role != "supervisor":
         # Verificar si tiene permiso en al menos una cuenta
-        has_permission = db.query(AccountPermission).join(Account).filter(
-            Account.company_id == company_id,
-            AccountPermission.user_id == current_user.id,
-            AccountPermission.can_view == True
-        ).first()
+        permitted_accounts = [
+            account for account in company.accounts
+            if check_account_permission(db, current_user, account.id)
+        ]
         
-        if not has_permission:
+        if not permitted_accounts:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="No tienes permiso para ver esta empresa"
             )
         
-        # Filtrar cuentas permitidas
-        permitted_accounts = []
-        for account in company.accounts:
-            if db.query(AccountPermission).filter(
-                AccountPermission.user_id == current_user.id,
-                AccountPermission.account_id == account.id,
-                AccountPermission.can_view == True
-            ).first():
-                permitted_accounts.append(account)
         company.accounts = permitted_accounts
     
     return company
@@ -136,9 +138,15 @@ def update_company(
         )
     
     update_data = company_data.model_dump(exclude_unset=True)
+    moved = "group_id" in update_data and update_data["group_id"] != company.group_id
     for field, value in update_data.items():
         setattr(company, field, value)
     
+    if moved:
+        # Cambian los permisos heredados del grupo
+        bump_versions(db, "companies", HIERARCHY_KEY)
+    else:
+        bump_versions(db, "companies")
     db.commit()
     db.refresh(company)
     
@@ -161,4 +169,5 @@ def delete_company(
         )
     
     company.is_active = False
+    bump_versions(db, "companies")
     db.commit()
@@ -0,0 +1,130 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy.orm import Session
+from typing import Dict, Iterable, List, Optional
+from uuid import UUID
+from datetime import datetime, timedelta
+
+from app.config import get_settings
+from app.database import get_db
+from app.models import User, CircularFlowAlert, Company, Group
+from app.schemas import (
+    CircularFlowEntity, CircularFlowAlertResponse, CircularFlowAlertUpdate, CircularFlowScanResult
+)
+from app.auth import get_current_supervisor
+from app.cycles import MAX_CYCLES, scan_circular_flows
+from app.query_budget import query_budget
+
+router = APIRouter(prefix="/api/compliance", tags=["Cumplimiento"], dependencies=[query_budget(7)])
+
+settings = get_settings()
+
+
+def _entity_names(db: Session, level: str, ids: Iterable) -> Dict[str, str]:
+    """Nombres de empresas o grupos por ID (como texto)."""
+    ids = {UUID(str(entity_id)) for entity_id in ids}
+    if not ids:
+        return {}
+    model = Company if level == "company" else Group
+    return {
+        str(row.id): row.name
+        for row in db.query(model.id, model.name).filter(model.id.in_(ids))
+    }
+
+
+def _entities(ids: Iterable, names: Dict[str, str]) -> List[CircularFlowEntity]:
+    return [
+        CircularFlowEntity(id=entity_id, name=names.get(str(entity_id), "Desconocido"))
+        for entity_id in ids
+    ]
+
+
+def _alert_response(alert: CircularFlowAlert, names: Dict[str, str]) -> CircularFlowAlertResponse:
+    return CircularFlowAlertResponse(
+        id=alert.id,
+        level=alert.level,
+        entities=_entities(alert.entity_ids, names),
+        length=alert.length,
+        amount=alert.amount,
+        window_start=alert.window_start,
+        window_end=alert.window_end,
+        status=alert.status,
+        detected_at=alert.detected_at,
+        updated_at=alert.updated_at
+    )
+
+
+@router.get("/circular-flows", response_model=List[CircularFlowAlertResponse])
+def list_circular_flows(
+    alert_status: Optional[str] = Query("open", alias="status", pattern="^(open|dismissed)$"),
+    level: Optional[str] = Query(None, pattern="^(company|group)$"),
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=500),
+    current_user: User = Depends(get_current_supervisor),
+    db: Session = Depends(get_db)
+):
+    """Flujos circulares detectados (solo supervisores), los de mayor importe primero."""
+    query = db.query(CircularFlowAlert)
+    if alert_status:
+        query = query.filter(CircularFlowAlert.status == alert_status)
+    if level:
+        query = query.filter(CircularFlowAlert.level == level)
+    alerts = query.order_by(
+        CircularFlowAlert.amount.desc(), CircularFlowAlert.id
+    ).offset(skip).limit(limit).all()
+
+    names = {}
+    for alert_level in ("company", "group"):
+        names.update(_entity_names(db, alert_level, (
+            entity_id for alert in alerts if alert.level == alert_level for entity_id in alert.entity_ids
+        )))
+    return [_alert_response(alert, names) for alert in alerts]
+
+
+@router.post("/circular-flows/scan", response_model=CircularFlowScanResult)
+def scan_circular_flows_now(
+    level: str = Query("company", pattern="^(company|group)$"),
+    days: int = Query(settings.circular_flow_window_days, ge=1, le=366),
+    max_length: int = Query(settings.circular_flow_max_length, ge=2, le=8),
+    current_user: User = Depends(get_current_supervisor),
+    db: Session = Depends(get_db)
+):
+    """
+    Analizar ahora la ventana de los últimos `days` días (solo supervisores).
+    Los ciclos encontrados se registran como alertas; las descartadas siguen
+    descartadas.
+    """
+    until = datetime.utcnow()
+    components, cycles = scan_circular_flows(db, level, days, max_length, until)
+    db.commit()
+
+    names = _entity_names(db, level, (node for component in components for node in component))
+    return CircularFlowScanResult(
+        level=level,
+        window_start=until - timedelta(days=days),
+        window_end=until,
+        components=[_entities(sorted(component, key=str), names) for component in components],
+        cycles=[_entities(cycle, names) for cycle in cycles],
+        truncated=len(cycles) >= MAX_CYCLES
+    )
+
+
+@router.patch("/circular-flows/{alert_id}", response_model=CircularFlowAlertResponse)
+def update_circular_flow(
+    alert_id: UUID,
+    update_data: CircularFlowAlertUpdate,
+    current_user: User = Depends(get_current_supervisor),
+    db: Session = Depends(get_db)
+):
+    """Descartar (o reabrir) una alerta de flujo circular."""
+    alert = db.query(CircularFlowAlert).filter(CircularFlowAlert.id == alert_id).first()
+    if not alert:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Alerta no encontrada"
+        )
+
+    alert.status = update_data.status
+    db.commit()
+    db.refresh(alert)
+
+    return _alert_response(alert, _entity_names(db, alert.level, alert.entity_ids))
@@ -0,0 +1,156 @@
+import asyncio
+import time
+from typing import Optional, Set, Tuple
+from uuid import UUID
+
+from fastapi import APIRouter, HTTPException, Query, WebSocket, WebSocketDisconnect, status
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+
+from app.auth import decode_token, visible_account_ids
+from app.cache_bus import HIERARCHY_KEY, permissions_key, registry
+from app.database import SessionLocal
+from app.events import Subscription, broker
+from app.metrics import untracked
+from app.models import User
+from app.query_budget import query_budget
+
+router = APIRouter(prefix="/api/events", tags=["Eventos"], dependencies=[query_budget(4)])
+
+KEEPALIVE_SECONDS = 15
+# Revalidar los permisos aunque no llegue ninguna invalidación (red de seguridad si se pierde el bus)
+REAUTHORIZE_SECONDS = 60
+
+
+def _authorize(token: str) -> UUID:
+    """
+    Validar el token y devolver el id del usuario.
+    EventSource y WebSocket no permiten cabeceras, así que el token va en la URL.
+    """
+    token_data = decode_token(token)
+    if token_data is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token inválido")
+    return token_data.user_id
+
+
+def _visible_accounts(user_id: UUID) -> Optional[Set[UUID]]:
+    """Cuentas que puede ver el usuario (None = todas); 401 si ya no está activo."""
+    # Sesión corta: la conexión puede durar horas y no debe retener la BD
+    db = SessionLocal()
+    try:
+        user = db.query(User).filter(User.id == user_id).first()
+        if not user or not user.is_active:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Usuario no válido")
+
+        if user.role == "supervisor":
+            return None
+
+        return set(db.execute(visible_account_ids(user)).scalars())
+    finally:
+        db.close()
+
+
+def _permission_versions(user_id: UUID) -> Tuple[int, int]:
+    """Versiones locales (bus de caches) de lo que decide qué cuentas ve el usuario."""
+    return registry.version(permissions_key(user_id)), registry.version(HIERARCHY_KEY)
+
+
+class _Listener:
+    """
+    Suscripción de una conexión de eventos. Las cuentas visibles se recalculan
+    antes de entregar nada en cuanto este worker recibe una invalidación de los
+    permisos del usuario (o de la jerarquía de cuentas), y cada
+    REAUTHORIZE_SECONDS en cualquier caso. Si el usuario ya no es válido
+    (desactivado o borrado), la conexión se cierra.
+    """
+
+    def __init__(self, user_id: UUID):
+        self.user_id = user_id
+        self.versions = _permission_versions(user_id)
+        self.checked_at = time.monotonic()
+        self.subscription: Optional[Subscription] = None
+
+    async def start(self) -> Subscription:
+        account_ids = await run_in_threadpool(_visible_accounts, self.user_id)
+        self.subscription = broker.subscribe(account_ids)
+        return self.subscription
+
+    async def still_authorized(self) -> bool:
+        versions = _permission_versions(self.user_id)
+        if versions == self.versions and time.monotonic() - self.checked_at < REAUTHORIZE_SECONDS:
+            return True
+
+        # Trabajo de fondo de la conexión: no cuenta en las métricas de la petición
+        with untracked():
+            try:
+                account_ids = await run_in_threadpool(_visible_accounts, self.user_id)
+            except HTTPException:
+                return False
+        self.versions = versions
+        self.checked_at = time.monotonic()
+        broker.update(self.subscription, account_ids)
+        return True
+
+
+@router.get("/stream")
+async def stream_events(token: str = Query(...)):
+    """
+    Eventos en vivo por Server-Sent Events: `transaction.created`,
+    `transaction.updated`, `transaction.deleted` y `balance`.
+    """
+    listener = _Listener(_authorize(token))
+    subscription = await listener.start()
+
+    async def event_stream():
+        try:
+            yield b"retry: 5000\n\n"
+            while not subscription.overflowed:
+                try:
+                    event = await asyncio.wait_for(subscription.queue.get(), KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    event = None
+                if not await listener.still_authorized():
+                    break
+                if event is None:
+                    yield b": ping\n\n"
+                elif subscription.can_see(event):  # encolado con los permisos anteriores
+                    yield event.sse
+        finally:
+            broker.unsubscribe(subscription)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.websocket("/ws")
+async def websocket_events(websocket: WebSocket, token: str = Query(...)):
+    """Mismos eventos que /stream, por WebSocket ({"type": ..., "data": ...})."""
+    try:
+        listener = _Listener(_authorize(token))
+        subscription = await listener.start()
+    except HTTPException:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    try:
+        await websocket.accept()
+        while not subscription.overflowed:
+            try:
+                event = await asyncio.wait_for(subscription.queue.get(), KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                event = None
+            if not await listener.still_authorized():
+                await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+                return
+            if event is None:
+                await websocket.send_text('{"type":"ping"}')
+            elif subscription.can_see(event):  # encolado con los permisos anteriores
+                await websocket.send_text(f'{{"type":"{event.type}","data":{event.data}}}')
+        await websocket.close(code=status.WS_1013_TRY_AGAIN_LATER)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        broker.unsubscribe(subscription)
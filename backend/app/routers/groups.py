@@ -1,14 +1,17 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 from uuid import UUID
 
 from app.database import get_db
 from app.models import User, Group
 from app.schemas import GroupCreate, GroupUpdate, GroupResponse
 from app.auth import get_current_user, get_current_supervisor
+from app.http_cache import bump_versions, collection_cache
+from app.pagination import keyset_page, set_total_count, text_filter
+from app.query_budget import query_budget
 
-router = APIRouter(prefix="/api/groups", tags=["Grupos"])
+router = APIRouter(prefix="/api/groups", tags=["Grupos"], dependencies=[query_budget(7)])
 
 
 @router.post("/", response_model=GroupResponse, status_code=status.HTTP_201_CREATED)
@@ -25,19 +28,34 @@ def create_group(
     )
     
     db.add(group)
+    bump_versions(db, "groups")
     db.commit()
     db.refresh(group)
     
     return group
 
 
-@router.get("/", response_model=List[GroupResponse])
+@router.get("/", response_model=List[GroupResponse], dependencies=[collection_cache("groups")])
 def list_groups(
+    response: Response,
+    q: Optional[str] = Query(None, min_length=1, max_length=100),
+    cursor: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    total: bool = False,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Listar grupos activos."""
-    return db.query(Group).filter(Group.is_active == True).order_by(Group.name).all()
+    """Listar grupos activos por nombre. Sin `limit` se devuelven todos."""
+    query = db.query(Group).filter(Group.is_active == True)
+    if q:
+        query = query.filter(text_filter(db, q, Group.name))
+    if total:
+        set_total_count(db, query, response)
+    
+    if limit is None and cursor is None:
+        return query.order_by(Group.name, Group.id).all()
+    groups, _ = keyset_page(query, (Group.name, Group.id), cursor, limit or 100, response=response)
+    return groups
 
 
 @router.get("/{group_id}", response_model=GroupResponse)
@@ -78,6 +96,7 @@ def update_group(
     for field, value in update_data.items():
         setattr(group, field, value)
     
+    bump_versions(db, "groups")
     db.commit()
     db.refresh(group)
     
@@ -101,4 +120,5 @@ def delete_group(
     
     # Desactivar en lugar de eliminar
     group.is_active = False
+    bump_versions(db, "groups")
     db.commit()
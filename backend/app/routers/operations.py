@@ -1,22 +1,31 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import or_
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session, joinedload, aliased
+from sqlalchemy import func, or_
+from typing import List, Optional
 from uuid import UUID
 from datetime import datetime
 from decimal import Decimal
 from collections import defaultdict
+import csv
+import io
+import re
 
-from app.database import get_db
-from app.models import User, Operation, Transaction, Account, AccountPermission
+from app.database import get_db, SessionLocal
+from app.models import User, Operation, Transaction, Account, Attachment, Company
 from app.schemas import (
     OperationCreate, OperationUpdate, OperationResponse,
     OperationWithTransactions, OperationFlowMap, OperationFlowNode, OperationFlowEdge,
     OperationGroupNode
 )
-from app.auth import get_current_user, get_current_supervisor
+from app.auth import get_current_user, get_current_supervisor, visible_account_ids
+from app.http_cache import bump_versions
+from app.storage import BlobNotFound, BlobStore, content_disposition, get_blob_store
+from app.zipstream import stream_zip
+from app.pagination import keyset_page, set_total_count, text_filter
+from app.query_budget import query_budget
 
-router = APIRouter(prefix="/api/operations", tags=["Operaciones"])
+router = APIRouter(prefix="/api/operations", tags=["Operaciones"], dependencies=[query_budget(7)])
 
 
 @router.post("/", response_model=OperationResponse, status_code=status.HTTP_201_CREATED)
@@ -46,10 +55,7 @@ def get_user_permitted_account_ids(db: Session, user: User) -> List[UUID]:
     if user.role == "supervisor":
         return None  # None significa todas
     
-    return [p.account_id for p in db.query(AccountPermission).filter(
-        AccountPermission.user_id == user.id,
-        AccountPermission.can_view == True
-    ).all()]
+    return db.execute(visible_account_ids(user)).scalars().all()
 
 
 def get_user_operation_ids(db: Session, user: User) -> List[UUID]:
@@ -73,14 +79,21 @@ def get_user_operation_ids(db: Session, user: User) -> List[UUID]:
 
 @router.get("/", response_model=List[OperationResponse])
 def list_operations(
+    response: Response,
     status: str = None,
-    skip: int = 0,
-    limit: int = 100,
+    q: Optional[str] = Query(None, min_length=1, max_length=100),
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    total: bool = False,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Listar operaciones. Supervisores ven todas, usuarios solo las de sus cuentas."""
-    query = db.query(Operation).order_by(Operation.created_at.desc())
+    """
+    Listar operaciones, las más recientes primero. Supervisores ven todas,
+    usuarios solo las de sus cuentas. `q` busca en el nombre; la página
+    siguiente se pide con el cursor de X-Next-Cursor.
+    """
+    query = db.query(Operation)
     
     if current_user.role != "supervisor":
         operation_ids = get_user_operation_ids(db, current_user)
@@ -91,8 +104,15 @@ def list_operations(
     
     if status:
         query = query.filter(Operation.status == status)
+    if q:
+        query = query.filter(text_filter(db, q, Operation.name))
+    if total:
+        set_total_count(db, query, response)
     
-    return query.offset(skip).limit(limit).all()
+    operations, _ = keyset_page(
+        query, (Operation.created_at, Operation.id), cursor, limit, descending=True, response=response
+    )
+    return operations
 
 
 @router.get("/{operation_id}", response_model=OperationWithTransactions)
@@ -127,7 +147,7 @@ def get_operation(
     return operation
 
 
-@router.get("/{operation_id}/flow", response_model=OperationFlowMap)
+@router.get("/{operation_id}/flow", response_model=OperationFlowMap, dependencies=[query_budget(8)])
 def get_operation_flow(
     operation_id: UUID,
     current_user: User = Depends(get_current_user),
@@ -149,8 +169,8 @@ def get_operation_flow(
     operation = db.query(Operation).filter(
         Operation.id == operation_id
     ).options(
-        joinedload(Operation.transactions).joinedload(Transaction.from_account).joinedload(Account.company),
-        joinedload(Operation.transactions).joinedload(Transaction.to_account).joinedload(Account.company)
+        joinedload(Operation.transactions).joinedload(Transaction.from_account).joinedload(Account.company).joinedload(Company.group),
+        joinedload(Operation.transactions).joinedload(Transaction.to_account).joinedload(Account.company).joinedload(Company.group)
     ).first()
     
     if not operation:
@@ -209,16 +229,19 @@ def get_operation_flow(
     
     pending_edges = []
     pending_by_group = defaultdict(lambda: {"in": Decimal("0"), "out": Decimal("0")})
+    # Nombres de todos los grupos de los apuntes en una consulta
+    pending_group_ids = {e.from_group_id for e in pending_entries} | {e.to_group_id for e in pending_entries}
+    group_names = {
+        str(group_id): name
+        for group_id, name in db.query(Group.id, Group.name).filter(Group.id.in_(pending_group_ids))
+    } if pending_group_ids else {}
     
     for entry in pending_entries:
-        from_group = db.query(Group).filter(Group.id == entry.from_group_id).first()
-        to_group = db.query(Group).filter(Group.id == entry.to_group_id).first()
-        
         pending_edges.append(PendingEntryEdge(
             from_group_id=entry.from_group_id,
-            from_group_name=from_group.name if from_group else "Desconocido",
+            from_group_name=group_names.get(str(entry.from_group_id), "Desconocido"),
             to_group_id=entry.to_group_id,
-            to_group_name=to_group.name if to_group else "Desconocido",
+            to_group_name=group_names.get(str(entry.to_group_id), "Desconocido"),
             amount=entry.amount,
             description=entry.description,
             entry_id=entry.id,
@@ -247,8 +270,7 @@ def get_operation_flow(
             group_flows[group_id]["pending_out"] = pending_data["out"]
         else:
             # El grupo solo tiene apuntes, no transacciones
-            group = db.query(Group).filter(Group.id == group_id).first()
-            group_flows[group_id]["name"] = group.name if group else "Desconocido"
+            group_flows[group_id]["name"] = group_names.get(group_id, "Desconocido")
             group_flows[group_id]["pending_in"] = pending_data["in"]
             group_flows[group_id]["pending_out"] = pending_data["out"]
     
@@ -273,6 +295,128 @@ def get_operation_flow(
     )
 
 
+EXPORT_CSV_COLUMNS = [
+    "id", "transaction_date", "created_at", "transaction_type", "status", "amount",
+    "description", "from_company", "from_account", "from_iban", "from_balance_after",
+    "to_company", "to_account", "to_iban", "to_balance_after"
+]
+
+
+def _export_transactions_csv(rows) -> bytes:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_CSV_COLUMNS)
+    for row in rows:
+        writer.writerow([row[column] if row[column] is not None else "" for column in EXPORT_CSV_COLUMNS])
+    return buffer.getvalue().encode("utf-8-sig")  # BOM para que Excel detecte UTF-8
+
+
+def _safe_filename(filename: str) -> str:
+    return re.sub(r'[\\/:*?"<>|]+', "_", filename or "adjunto").strip(". ") or "adjunto"
+
+
+def _legacy_attachment_content(attachment_id: UUID):
+    """Leer un adjunto aún guardado en la BD (anterior al almacén de blobs)."""
+    db = SessionLocal()
+    try:
+        file_data = db.query(Attachment.file_data).filter(Attachment.id == attachment_id).scalar()
+    finally:
+        db.close()
+    if file_data:
+        yield file_data
+
+
+@router.get("/{operation_id}/export.zip", dependencies=[query_budget(10)])
+def export_operation(
+    operation_id: UUID,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+    store: BlobStore = Depends(get_blob_store)
+):
+    """
+    Exportar todo sobre una operación en un ZIP generado en streaming:
+    CSV de transacciones, mapa de flujo en JSON y todos los adjuntos. Los
+    adjuntos cuyo contenido ya no está en el almacén se omiten y se listan en
+    adjuntos_no_disponibles.txt (el ZIP nunca queda cortado).
+    """
+    # Valida acceso y existencia de la operación
+    flow = get_operation_flow(operation_id, current_user, db)
+    
+    from_account = aliased(Account)
+    to_account = aliased(Account)
+    from_company = aliased(Company)
+    to_company = aliased(Company)
+    
+    rows = db.query(
+        Transaction.id,
+        Transaction.transaction_date,
+        Transaction.created_at,
+        Transaction.transaction_type,
+        Transaction.status,
+        Transaction.amount,
+        Transaction.description,
+        from_company.name.label("from_company"),
+        from_account.name.label("from_account"),
+        from_account.iban.label("from_iban"),
+        Transaction.from_balance_after,
+        to_company.name.label("to_company"),
+        to_account.name.label("to_account"),
+        to_account.iban.label("to_iban"),
+        Transaction.to_balance_after
+    ).outerjoin(
+        from_account, Transaction.from_account_id == from_account.id
+    ).outerjoin(
+        from_company, from_account.company_id == from_company.id
+    ).outerjoin(
+        to_account, Transaction.to_account_id == to_account.id
+    ).outerjoin(
+        to_company, to_account.company_id == to_company.id
+    ).filter(
+        Transaction.operation_id == operation_id
+    ).order_by(Transaction.created_at).all()
+    
+    attachments = db.query(
+        Attachment.id,
+        Attachment.transaction_id,
+        Attachment.filename,
+        Attachment.content_type,
+        Attachment.content_hash
+    ).join(Transaction, Transaction.id == Attachment.transaction_id).filter(
+        Transaction.operation_id == operation_id
+    ).order_by(Attachment.transaction_id, Attachment.created_at).all()
+    
+    transactions_csv = _export_transactions_csv([row._mapping for row in rows])
+    flow_json = flow.model_dump_json(indent=2).encode("utf-8")
+    
+    def entries():
+        yield "transacciones.csv", [transactions_csv], "text/csv"
+        yield "flujo.json", [flow_json], "application/json"
+        missing = []
+        for att in attachments:
+            name = f"adjuntos/{att.transaction_id}/{att.id}_{_safe_filename(att.filename)}"
+            if att.content_hash:
+                # Los blobs se leen por trozos directamente del almacén; open_range
+                # falla al abrir, antes de escribir nada de la entrada
+                try:
+                    content = store.open_range(att.content_hash)
+                except BlobNotFound:
+                    missing.append(name)
+                    continue
+            else:
+                content = _legacy_attachment_content(att.id)
+            yield name, content, att.content_type
+        if missing:
+            manifest = "Adjuntos sin contenido en el almacén:\n" + "".join(f"{name}\n" for name in missing)
+            yield "adjuntos_no_disponibles.txt", [manifest.encode("utf-8")], "text/plain"
+    
+    filename = f"operacion_{_safe_filename(flow.operation.name)}.zip"
+    return StreamingResponse(
+        stream_zip(entries()),
+        media_type="application/zip",
+        headers={"Content-Disposition": content_disposition(filename)}
+    )
+
+
 @router.patch("/{operation_id}", response_model=OperationResponse)
 def update_operation(
     operation_id: UUID,
@@ -309,6 +453,8 @@ def update_operation(
     for field, value in update_data.items():
         setattr(operation, field, value)
     
+    # Estado y transacciones asignadas: lo usa el informe de flujos (operation_status)
+    bump_versions(db, "operations")
     db.commit()
     db.refresh(operation)
     
@@ -336,6 +482,7 @@ def delete_operation(
     ).update({"operation_id": None})
     
     db.delete(operation)
+    bump_versions(db, "operations")
     db.commit()
 
 
@@ -398,19 +545,15 @@ def get_groups_balance(
     
     # Añadir TODOS los apuntes (pendientes y liquidados) al balance
     pending_entries = db.query(PendingEntry).all()
+    pending_group_ids = {e.from_group_id for e in pending_entries} | {e.to_group_id for e in pending_entries}
+    if pending_group_ids:
+        for group_id, name in db.query(Group.id, Group.name).filter(Group.id.in_(pending_group_ids)):
+            group_names[str(group_id)] = name
     
     for entry in pending_entries:
-        from_group = db.query(Group).filter(Group.id == entry.from_group_id).first()
-        to_group = db.query(Group).filter(Group.id == entry.to_group_id).first()
-        
         # El grupo deudor (from) tiene ese dinero (+), el acreedor (to) le falta (-)
         group_balances[str(entry.from_group_id)]["pending"] += entry.amount
         group_balances[str(entry.to_group_id)]["pending"] -= entry.amount
-        
-        if from_group:
-            group_names[str(entry.from_group_id)] = from_group.name
-        if to_group:
-            group_names[str(entry.to_group_id)] = to_group.name
     
     # Convertir a lista con balance total
     result = []
@@ -431,7 +574,7 @@ def get_groups_balance(
     return result
 
 
-@router.get("/summary/dashboard")
+@router.get("/summary/dashboard", dependencies=[query_budget(9)])
 def get_operations_dashboard(
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -460,10 +603,20 @@ def get_operations_dashboard(
         Operation.updated_at.desc()
     ).limit(10).all()
     
-    # Contar por estado
-    total_open = base_query.filter(Operation.status == "open").count()
-    total_completed = base_query.filter(Operation.status == "completed").count()
-    total_cancelled = base_query.filter(Operation.status == "cancelled").count()
+    # Número de transacciones de las abiertas, en una consulta
+    transaction_counts = dict(db.query(
+        Transaction.operation_id, func.count(Transaction.id)
+    ).filter(
+        Transaction.operation_id.in_([op.id for op in open_operations])
+    ).group_by(Transaction.operation_id).all()) if open_operations else {}
+    
+    # Contar por estado (una sola consulta agrupada)
+    status_counts = dict(base_query.with_entities(
+        Operation.status, func.count(Operation.id)
+    ).group_by(Operation.status).all())
+    total_open = status_counts.get("open", 0)
+    total_completed = status_counts.get("completed", 0)
+    total_cancelled = status_counts.get("cancelled", 0)
     
     return {
         "open_operations": [
@@ -472,7 +625,7 @@ def get_operations_dashboard(
                 "name": op.name,
                 "description": op.description,
                 "created_at": op.created_at,
-                "transaction_count": len(op.transactions)
+                "transaction_count": transaction_counts.get(op.id, 0)
             }
             for op in open_operations
         ],
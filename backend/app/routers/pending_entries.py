@@ -9,10 +9,16 @@ from collections import defaultdict
 
 from app.database import get_db
 from app.models import User, PendingEntry, Group, Operation
-from app.schemas import PendingEntryCreate, PendingEntryResponse, GroupBalanceSummary
+from app.schemas import (
+    PendingEntryCreate, PendingEntryResponse, GroupBalanceSummary,
+    NettingProposal, NettingExecute, NettingResult, NettingTransfer
+)
 from app.auth import get_current_user, get_current_supervisor
+from app.money import from_cents
+from app.netting import NettingPlan, lock_pending_entries, settle_all
+from app.query_budget import query_budget
 
-router = APIRouter(prefix="/api/pending-entries", tags=["Apuntes Pendientes"])
+router = APIRouter(prefix="/api/pending-entries", tags=["Apuntes Pendientes"], dependencies=[query_budget(10)])
 
 
 @router.post("/", response_model=PendingEntryResponse, status_code=status.HTTP_201_CREATED)
@@ -54,7 +60,7 @@ def create_pending_entry(
     db.commit()
     db.refresh(entry)
     
-    return _entry_to_response(entry, db)
+    return _entry_to_response(entry, {from_group.id: from_group.name, to_group.id: to_group.name})
 
 
 @router.get("/", response_model=List[PendingEntryResponse])
@@ -88,7 +94,7 @@ def list_pending_entries(
         )
     
     entries = query.all()
-    return [_entry_to_response(e, db) for e in entries]
+    return _entries_to_response(entries, db)
 
 
 @router.get("/pending", response_model=List[PendingEntryResponse])
@@ -101,7 +107,75 @@ def list_only_pending(
         PendingEntry.status == "pending"
     ).order_by(PendingEntry.created_at.desc()).all()
     
-    return [_entry_to_response(e, db) for e in entries]
+    return _entries_to_response(entries, db)
+
+
+@router.get("/netting", response_model=NettingProposal)
+def get_netting_proposal(
+    operation_id: UUID = None,
+    current_user: User = Depends(get_current_supervisor),
+    db: Session = Depends(get_db)
+):
+    """
+    Proponer las transferencias mínimas entre grupos que liquidan todos los
+    apuntes pendientes (o solo los creados en `operation_id`).
+    """
+    plan = NettingPlan(db, operation_id)
+    names = _group_names(db, plan.positions)
+    
+    positions = [
+        GroupBalanceSummary(
+            group_id=group_id,
+            group_name=names.get(group_id, "Desconocido"),
+            owes=from_cents(plan.owes.get(group_id, 0)),
+            owed=from_cents(plan.owed.get(group_id, 0)),
+            net=from_cents(net)
+        )
+        for group_id, net in plan.positions.items()
+    ]
+    positions.sort(key=lambda x: x.net, reverse=True)
+    
+    return NettingProposal(
+        operation_id=operation_id,
+        entry_count=plan.entry_count,
+        total_amount=plan.total_amount,
+        positions=positions,
+        transfers=_netting_transfers(plan, names),
+        fingerprint=plan.fingerprint
+    )
+
+
+@router.post("/netting/execute", response_model=NettingResult)
+def execute_netting(
+    execute_data: NettingExecute,
+    current_user: User = Depends(get_current_supervisor),
+    db: Session = Depends(get_db)
+):
+    """
+    Liquidar de una vez todos los apuntes de una propuesta de compensación.
+    Las transferencias devueltas son las que quedan por realizar.
+    """
+    if execute_data.settled_in_operation_id:
+        operation = db.query(Operation).filter(Operation.id == execute_data.settled_in_operation_id).first()
+        if not operation:
+            raise HTTPException(status_code=404, detail="Operación no encontrada")
+    
+    lock_pending_entries(db)
+    plan = NettingPlan(db, execute_data.operation_id)
+    if plan.fingerprint != execute_data.fingerprint:
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Los apuntes pendientes han cambiado; vuelve a calcular la propuesta"
+        )
+    
+    settled_count = settle_all(db, execute_data.operation_id, execute_data.settled_in_operation_id)
+    db.commit()
+    
+    return NettingResult(
+        settled_count=settled_count,
+        transfers=_netting_transfers(plan, _group_names(db, plan.positions))
+    )
 
 
 @router.post("/{entry_id}/settle")
@@ -187,19 +261,17 @@ def get_groups_pending_summary(
     # Calcular lo que debe y lo que le deben a cada grupo
     owes = defaultdict(Decimal)  # Lo que debe cada grupo
     owed = defaultdict(Decimal)  # Lo que le deben a cada grupo
+    names = _group_names(db, {e.from_group_id for e in entries} | {e.to_group_id for e in entries})
     group_names = {}
     
     for entry in entries:
-        from_group = db.query(Group).filter(Group.id == entry.from_group_id).first()
-        to_group = db.query(Group).filter(Group.id == entry.to_group_id).first()
-        
-        if from_group:
+        if entry.from_group_id in names:
             owes[str(entry.from_group_id)] += entry.amount
-            group_names[str(entry.from_group_id)] = from_group.name
+            group_names[str(entry.from_group_id)] = names[entry.from_group_id]
         
-        if to_group:
+        if entry.to_group_id in names:
             owed[str(entry.to_group_id)] += entry.amount
-            group_names[str(entry.to_group_id)] = to_group.name
+            group_names[str(entry.to_group_id)] = names[entry.to_group_id]
     
     # Construir resumen
     all_group_ids = set(owes.keys()) | set(owed.keys())
@@ -223,17 +295,40 @@ def get_groups_pending_summary(
     return result
 
 
-def _entry_to_response(entry: PendingEntry, db: Session) -> PendingEntryResponse:
-    """Convertir PendingEntry a PendingEntryResponse con nombres de grupos."""
-    from_group = db.query(Group).filter(Group.id == entry.from_group_id).first()
-    to_group = db.query(Group).filter(Group.id == entry.to_group_id).first()
-    
+def _group_names(db: Session, group_ids) -> dict:
+    """Nombres de los grupos indicados, en una sola consulta."""
+    if not group_ids:
+        return {}
+    return dict(db.query(Group.id, Group.name).filter(Group.id.in_(list(group_ids))).all())
+
+
+def _netting_transfers(plan: NettingPlan, names: dict) -> List[NettingTransfer]:
+    return [
+        NettingTransfer(
+            from_group_id=debtor,
+            from_group_name=names.get(debtor, "Desconocido"),
+            to_group_id=creditor,
+            to_group_name=names.get(creditor, "Desconocido"),
+            amount=from_cents(cents)
+        )
+        for debtor, creditor, cents in plan.transfers
+    ]
+
+
+def _entries_to_response(entries: List[PendingEntry], db: Session) -> List[PendingEntryResponse]:
+    """Convertir una lista de apuntes, con los nombres de todos sus grupos en una consulta."""
+    names = _group_names(db, {e.from_group_id for e in entries} | {e.to_group_id for e in entries})
+    return [_entry_to_response(e, names) for e in entries]
+
+
+def _entry_to_response(entry: PendingEntry, names: dict) -> PendingEntryResponse:
+    """Convertir PendingEntry a PendingEntryResponse con nombres de grupos (`names`: id -> nombre)."""
     return PendingEntryResponse(
         id=entry.id,
         from_group_id=entry.from_group_id,
-        from_group_name=from_group.name if from_group else None,
+        from_group_name=names.get(entry.from_group_id),
         to_group_id=entry.to_group_id,
-        to_group_name=to_group.name if to_group else None,
+        to_group_name=names.get(entry.to_group_id),
         amount=entry.amount,
         description=entry.description,
         operation_id=entry.operation_id,
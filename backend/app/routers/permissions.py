@@ -1,14 +1,437 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session, joinedload
-from typing import List
-from uuid import UUID
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from sqlalchemy.orm import Session, aliased
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy import and_, or_, tuple_
+from typing import List, Optional
+from uuid import UUID, uuid4
+from collections import defaultdict
+import base64
+import json
 
 from app.database import get_db
-from app.models import User, Account, AccountPermission
-from app.schemas import PermissionCreate, PermissionUpdate, PermissionResponse, PermissionWithDetails
-from app.auth import get_current_supervisor
+from app.models import User, Account, AccountPermission, Company, Group
+from app.schemas import (
+    PermissionCreate, PermissionUpdate, PermissionResponse, PermissionWithDetails, EffectivePermission,
+    PermissionBulkTarget, PermissionBulkGrant, PermissionBulkRevoke, PermissionBulkResult,
+    PermissionMatrix, MatrixUpdate, MatrixUpdateResult
+)
+from app.auth import get_current_supervisor, effective_permissions
+from app.http_cache import bump_versions, permissions_key
+from app.fast_json import select_columns, compile_row_serializer, rows_response, dumps
+from app.query_budget import query_budget
 
-router = APIRouter(prefix="/api/permissions", tags=["Permisos"])
+router = APIRouter(prefix="/api/permissions", tags=["Permisos"], dependencies=[query_budget(9)])
+
+serialize_permission_row = compile_row_serializer(PermissionWithDetails)
+
+# Bits de las celdas de la matriz
+MATRIX_VIEW = 1
+MATRIX_TRANSFER = 2
+MATRIX_INHERITED = 4
+
+
+def _permissions_with_details_query(db: Session):
+    """Permisos con usuario y destino (cuenta, empresa o grupo) como columnas planas."""
+    account_company = aliased(Company)
+    return db.query(*select_columns(PermissionWithDetails, {
+        "": AccountPermission,
+        "user": User,
+        "account": Account,
+        "account__company": account_company,
+        "company": Company,
+        "group": Group
+    })).select_from(AccountPermission).outerjoin(
+        User, AccountPermission.user_id == User.id
+    ).outerjoin(
+        Account, AccountPermission.account_id == Account.id
+    ).outerjoin(
+        account_company, Account.company_id == account_company.id
+    ).outerjoin(
+        Company, AccountPermission.company_id == Company.id
+    ).outerjoin(
+        Group, AccountPermission.group_id == Group.id
+    )
+
+
+def _target(data) -> tuple:
+    """(nivel, columna, id) del único destino indicado; 400 si no hay exactamente uno."""
+    targets = [
+        (level, column, value)
+        for level, column, value in (
+            ("account", AccountPermission.account_id, getattr(data, "account_id", None)),
+            ("company", AccountPermission.company_id, data.company_id),
+            ("group", AccountPermission.group_id, data.group_id)
+        )
+        if value is not None
+    ]
+    if getattr(data, "account_ids", None) is not None:
+        targets.append(("account", AccountPermission.account_id, data.account_ids))
+    
+    if len(targets) != 1:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Indica un único destino: cuenta(s), empresa o grupo"
+        )
+    return targets[0]
+
+
+def _check_scope_exists(db: Session, level: str, scope_id: UUID) -> None:
+    if level == "company":
+        if not db.query(Company.id).filter(Company.id == scope_id, Company.is_active == True).first():
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Empresa no encontrada"
+            )
+    elif level == "group":
+        if not db.query(Group.id).filter(Group.id == scope_id, Group.is_active == True).first():
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Grupo no encontrado"
+            )
+
+
+def _scope_accounts_query(db: Session, level: str, target):
+    """IDs de las cuentas activas cubiertas por el destino."""
+    query = db.query(Account.id).filter(Account.is_active == True)
+    if level == "account":
+        return query.filter(Account.id.in_(set(target)))
+    if level == "company":
+        return query.filter(Account.company_id == target)
+    return query.join(Company, Account.company_id == Company.id).filter(Company.group_id == target)
+
+
+def _bulk_users(db: Session, target: PermissionBulkTarget) -> List[UUID]:
+    """Usuarios activos de la petición; 404 si falta alguno."""
+    user_ids = set(target.user_ids)
+    found = [row.id for row in db.query(User.id).filter(User.id.in_(user_ids), User.is_active == True)]
+    if len(found) != len(user_ids):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Usuario no encontrado"
+        )
+    return found
+
+
+@router.post("/bulk-grant", response_model=PermissionBulkResult)
+def bulk_grant_permissions(
+    grant_data: PermissionBulkGrant,
+    current_user: User = Depends(get_current_supervisor),
+    db: Session = Depends(get_db)
+):
+    """
+    Asignar permisos a varios usuarios (solo supervisores) sobre una lista de
+    cuentas, o sobre una empresa o un grupo entero: en ese caso se guarda un
+    solo permiso por usuario, que cubre también las cuentas que se creen
+    después. Los permisos que ya existían se actualizan. Un único INSERT.
+    """
+    level, column, target = _target(grant_data)
+    user_ids = _bulk_users(db, grant_data)
+    _check_scope_exists(db, level, target)
+    
+    account_count = _scope_accounts_query(db, level, target).count()
+    if level == "account":
+        if account_count != len(set(target)):
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Cuenta no encontrada"
+            )
+        target_ids = set(target)
+    else:
+        target_ids = [target]
+    
+    affected = 0
+    if target_ids:
+        stmt = insert(AccountPermission).values([
+            {
+                "id": uuid4(),
+                "user_id": user_id,
+                column.key: target_id,
+                "can_view": grant_data.can_view,
+                "can_transfer": grant_data.can_transfer,
+                "granted_by": current_user.id
+            }
+            for user_id in user_ids
+            for target_id in target_ids
+        ])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[AccountPermission.user_id, column],
+            set_={
+                "can_view": stmt.excluded.can_view,
+                "can_transfer": stmt.excluded.can_transfer,
+                "granted_by": stmt.excluded.granted_by
+            }
+        )
+        affected = db.execute(stmt).rowcount
+        bump_versions(db, *(permissions_key(user_id) for user_id in user_ids))
+    db.commit()
+    
+    return PermissionBulkResult(users=len(user_ids), accounts=account_count, affected=affected)
+
+
+@router.post("/bulk-revoke", response_model=PermissionBulkResult)
+def bulk_revoke_permissions(
+    revoke_data: PermissionBulkRevoke,
+    current_user: User = Depends(get_current_supervisor),
+    db: Session = Depends(get_db)
+):
+    """
+    Quitar a varios usuarios los permisos sobre una lista de cuentas, una
+    empresa o un grupo (solo supervisores). En una empresa o grupo se quitan
+    también los permisos de sus empresas y cuentas. Un único DELETE.
+    """
+    level, column, target = _target(revoke_data)
+    user_ids = set(revoke_data.user_ids)  # Incluye usuarios ya desactivados
+    account_count = _scope_accounts_query(db, level, target).count()
+    
+    if level == "account":
+        covered = AccountPermission.account_id.in_(set(target))
+    elif level == "company":
+        covered = or_(
+            AccountPermission.company_id == target,
+            AccountPermission.account_id.in_(db.query(Account.id).filter(Account.company_id == target))
+        )
+    else:
+        company_ids = db.query(Company.id).filter(Company.group_id == target)
+        covered = or_(
+            AccountPermission.group_id == target,
+            AccountPermission.company_id.in_(company_ids),
+            AccountPermission.account_id.in_(db.query(Account.id).filter(Account.company_id.in_(company_ids)))
+        )
+    
+    affected = db.query(AccountPermission).filter(
+        AccountPermission.user_id.in_(user_ids),
+        covered
+    ).delete(synchronize_session=False)
+    if affected:
+        bump_versions(db, *(permissions_key(user_id) for user_id in user_ids))
+    db.commit()
+    
+    return PermissionBulkResult(users=len(user_ids), accounts=account_count, affected=affected)
+
+
+# ============ MATRIZ ============
+
+def _encode_cursor(name: str, item_id: UUID) -> str:
+    raw = json.dumps([name, str(item_id)]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        name, item_id = json.loads(raw)
+        return str(name), UUID(item_id)
+    except (ValueError, TypeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Cursor inválido"
+        )
+
+
+def _page(query, name_column, id_column, cursor: Optional[str], limit: int):
+    """Página ordenada por (nombre, id) a partir del cursor; devuelve (filas, siguiente cursor)."""
+    if cursor:
+        last_name, last_id = _decode_cursor(cursor)
+        query = query.filter(or_(
+            name_column > last_name,
+            and_(name_column == last_name, id_column > last_id)
+        ))
+    rows = query.order_by(name_column, id_column).limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+    last = rows[limit - 1]
+    return rows[:limit], _encode_cursor(last._mapping[name_column.key], last.id)
+
+
+def _flags(can_view, can_transfer) -> int:
+    return (MATRIX_VIEW if can_view else 0) | (MATRIX_TRANSFER if can_transfer else 0)
+
+
+@router.get("/matrix", response_model=PermissionMatrix)
+def get_permission_matrix(
+    page_by: str = Query("user", pattern="^(user|company)$"),
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = None,
+    q: Optional[str] = Query(None, max_length=200),
+    group_id: Optional[UUID] = None,
+    company_id: Optional[UUID] = None,
+    include_inherited: bool = True,
+    current_user: User = Depends(get_current_supervisor),
+    db: Session = Depends(get_db)
+):
+    """
+    Matriz compacta de permisos efectivos usuarios × cuentas (solo supervisores).
+
+    Se pagina por usuarios (`page_by=user`, todas las cuentas del filtro) o por
+    empresas (`page_by=company`, todos los usuarios del filtro); `next_cursor`
+    da la página siguiente. `q` filtra usuarios por email o nombre. Los
+    supervisores no aparecen: tienen acceso a todo.
+    """
+    users_query = db.query(User.id, User.email, User.full_name).filter(
+        User.is_active == True,
+        User.role != "supervisor"
+    )
+    if q:
+        pattern = f"%{q}%"
+        users_query = users_query.filter(or_(User.email.ilike(pattern), User.full_name.ilike(pattern)))
+    
+    companies_query = db.query(Company.id, Company.name, Company.group_id).filter(Company.is_active == True)
+    if group_id:
+        companies_query = companies_query.filter(Company.group_id == group_id)
+    if company_id:
+        companies_query = companies_query.filter(Company.id == company_id)
+    
+    if page_by == "user":
+        users, next_cursor = _page(users_query, User.email, User.id, cursor, limit)
+        companies = companies_query.order_by(Company.name, Company.id).all()
+    else:
+        companies, next_cursor = _page(companies_query, Company.name, Company.id, cursor, limit)
+        users = users_query.order_by(User.email, User.id).all()
+    
+    company_index = {company.id: i for i, company in enumerate(companies)}
+    accounts = sorted(
+        db.query(Account.id, Account.name, Account.company_id).filter(
+            Account.is_active == True,
+            Account.company_id.in_(list(company_index))
+        ).all(),
+        key=lambda account: (company_index[account.company_id], account.name, str(account.id))
+    ) if companies else []
+    user_index = {user.id: i for i, user in enumerate(users)}
+    account_index = {account.id: i for i, account in enumerate(accounts)}
+    
+    # Permisos asignados que afectan a la página, en una consulta
+    grants = []
+    if users and accounts:
+        grants_query = db.query(
+            AccountPermission.user_id, AccountPermission.account_id, AccountPermission.company_id,
+            AccountPermission.group_id, AccountPermission.can_view, AccountPermission.can_transfer
+        )
+        if page_by == "user":
+            grants_query = grants_query.filter(AccountPermission.user_id.in_(list(user_index)))
+        else:
+            grants_query = grants_query.filter(or_(
+                AccountPermission.account_id.in_(list(account_index)),
+                AccountPermission.company_id.in_(list(company_index)),
+                AccountPermission.group_id.in_({company.group_id for company in companies if company.group_id})
+            ))
+        grants = grants_query.all()
+    
+    accounts_by_company = defaultdict(list)
+    for account in accounts:
+        accounts_by_company[account.company_id].append(account_index[account.id])
+    companies_by_group = defaultdict(list)
+    for company in companies:
+        companies_by_group[company.group_id].append(company.id)
+    
+    # Mismo orden de precedencia que check_account_permission: grupo < empresa < cuenta
+    cells = {}
+    for level in ("group", "company", "account"):
+        if level != "account" and not include_inherited:
+            continue
+        for grant in grants:
+            user_idx = user_index.get(grant.user_id)
+            if user_idx is None:
+                continue
+            flags = _flags(grant.can_view, grant.can_transfer)
+            if level == "account" and grant.account_id in account_index:
+                cells[(user_idx, account_index[grant.account_id])] = flags
+            elif level == "company" and grant.company_id:
+                for account_idx in accounts_by_company.get(grant.company_id, ()):
+                    cells[(user_idx, account_idx)] = flags | MATRIX_INHERITED
+            elif level == "group" and grant.group_id:
+                for matrix_company_id in companies_by_group.get(grant.group_id, ()):
+                    for account_idx in accounts_by_company.get(matrix_company_id, ()):
+                        cells[(user_idx, account_idx)] = flags | MATRIX_INHERITED
+    
+    content = {
+        "users": [{"id": user.id, "email": user.email, "full_name": user.full_name} for user in users],
+        "companies": [
+            {"id": company.id, "name": company.name, "group_id": company.group_id} for company in companies
+        ],
+        "accounts": [
+            {"id": account.id, "name": account.name, "company_idx": company_index[account.company_id]}
+            for account in accounts
+        ],
+        "cells": [[user_idx, account_idx, flags] for (user_idx, account_idx), flags in sorted(cells.items())],
+        "next_cursor": next_cursor
+    }
+    return Response(content=dumps(content), media_type="application/json")
+
+
+@router.put("/matrix", response_model=MatrixUpdateResult)
+def update_permission_matrix(
+    update_data: MatrixUpdate,
+    current_user: User = Depends(get_current_supervisor),
+    db: Session = Depends(get_db)
+):
+    """
+    Aplicar cambios de celdas de la matriz (solo supervisores). Cada celda fija
+    el permiso propio de la cuenta (`flags`) o lo quita (`null`) para volver
+    al heredado. Solo se escriben las diferencias: un INSERT ... ON CONFLICT
+    y un DELETE como mucho.
+    """
+    changes = {(cell.user_id, cell.account_id): cell.flags for cell in update_data.cells}
+    user_ids = {user_id for user_id, _ in changes}
+    account_ids = {account_id for _, account_id in changes}
+    
+    if db.query(User.id).filter(User.id.in_(user_ids)).count() != len(user_ids):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Usuario no encontrado"
+        )
+    if db.query(Account.id).filter(Account.id.in_(account_ids)).count() != len(account_ids):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Cuenta no encontrada"
+        )
+    
+    current = {
+        (row.user_id, row.account_id): _flags(row.can_view, row.can_transfer)
+        for row in db.query(
+            AccountPermission.user_id, AccountPermission.account_id,
+            AccountPermission.can_view, AccountPermission.can_transfer
+        ).filter(tuple_(AccountPermission.user_id, AccountPermission.account_id).in_(list(changes)))
+    }
+    
+    upserts = [(key, flags) for key, flags in changes.items() if flags is not None and current.get(key) != flags]
+    deletes = [key for key, flags in changes.items() if flags is None and key in current]
+    
+    if upserts:
+        stmt = insert(AccountPermission).values([
+            {
+                "id": uuid4(),
+                "user_id": user_id,
+                "account_id": account_id,
+                "can_view": bool(flags & MATRIX_VIEW),
+                "can_transfer": bool(flags & MATRIX_TRANSFER),
+                "granted_by": current_user.id
+            }
+            for (user_id, account_id), flags in upserts
+        ])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[AccountPermission.user_id, AccountPermission.account_id],
+            set_={
+                "can_view": stmt.excluded.can_view,
+                "can_transfer": stmt.excluded.can_transfer,
+                "granted_by": stmt.excluded.granted_by
+            }
+        )
+        db.execute(stmt)
+    
+    if deletes:
+        db.query(AccountPermission).filter(
+            tuple_(AccountPermission.user_id, AccountPermission.account_id).in_(deletes)
+        ).delete(synchronize_session=False)
+    
+    touched = {user_id for (user_id, _), _ in upserts} | {user_id for user_id, _ in deletes}
+    bump_versions(db, *(permissions_key(user_id) for user_id in touched))
+    db.commit()
+    
+    return MatrixUpdateResult(
+        upserted=len(upserts),
+        deleted=len(deletes),
+        unchanged=len(changes) - len(upserts) - len(deletes)
+    )
 
 
 @router.post("/", response_model=PermissionResponse, status_code=status.HTTP_201_CREATED)
@@ -17,7 +440,12 @@ def create_permission(
     current_user: User = Depends(get_current_supervisor),
     db: Session = Depends(get_db)
 ):
-    """Asignar permiso a un usuario para una cuenta (solo supervisores)."""
+    """
+    Asignar permiso a un usuario sobre una cuenta, una empresa o un grupo
+    (solo supervisores). Para cada cuenta manda el permiso más específico.
+    """
+    level, column, target = _target(permission_data)
+    
     # Verificar que el usuario existe
     user = db.query(User).filter(
         User.id == permission_data.user_id,
@@ -30,39 +458,45 @@ def create_permission(
             detail="Usuario no encontrado"
         )
     
-    # Verificar que la cuenta existe
-    account = db.query(Account).filter(
-        Account.id == permission_data.account_id,
-        Account.is_active == True
-    ).first()
+    # Verificar que el destino existe
+    if level == "account":
+        account = db.query(Account).filter(
+            Account.id == target,
+            Account.is_active == True
+        ).first()
     
-    if not account:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Cuenta no encontrada"
-        )
+        if not account:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Cuenta no encontrada"
+            )
+    else:
+        _check_scope_exists(db, level, target)
     
     # Verificar si ya existe el permiso
     existing = db.query(AccountPermission).filter(
         AccountPermission.user_id == permission_data.user_id,
-        AccountPermission.account_id == permission_data.account_id
+        column == target
     ).first()
     
     if existing:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Ya existe un permiso para este usuario y cuenta"
+            detail="Ya existe un permiso para este usuario y destino"
         )
     
     permission = AccountPermission(
         user_id=permission_data.user_id,
         account_id=permission_data.account_id,
+        company_id=permission_data.company_id,
+        group_id=permission_data.group_id,
         can_view=permission_data.can_view,
         can_transfer=permission_data.can_transfer,
         granted_by=current_user.id
     )
     
     db.add(permission)
+    bump_versions(db, permissions_key(permission.user_id))
     db.commit()
     db.refresh(permission)
     
@@ -73,14 +507,13 @@ def create_permission(
 def list_permissions(
     user_id: UUID = None,
     account_id: UUID = None,
+    company_id: UUID = None,
+    group_id: UUID = None,
     current_user: User = Depends(get_current_supervisor),
     db: Session = Depends(get_db)
 ):
-    """Listar permisos (solo supervisores)."""
-    query = db.query(AccountPermission).options(
-        joinedload(AccountPermission.user),
-        joinedload(AccountPermission.account).joinedload(Account.company)
-    )
+    """Listar permisos tal como se asignaron (solo supervisores)."""
+    query = _permissions_with_details_query(db)
     
     if user_id:
         query = query.filter(AccountPermission.user_id == user_id)
@@ -88,7 +521,13 @@ def list_permissions(
     if account_id:
         query = query.filter(AccountPermission.account_id == account_id)
     
-    return query.all()
+    if company_id:
+        query = query.filter(AccountPermission.company_id == company_id)
+    
+    if group_id:
+        query = query.filter(AccountPermission.group_id == group_id)
+    
+    return rows_response(query.all(), serialize_permission_row)
 
 
 @router.get("/user/{user_id}", response_model=List[PermissionWithDetails])
@@ -97,15 +536,34 @@ def get_user_permissions(
     current_user: User = Depends(get_current_supervisor),
     db: Session = Depends(get_db)
 ):
-    """Obtener todos los permisos de un usuario (solo supervisores)."""
-    permissions = db.query(AccountPermission).filter(
+    """Obtener todos los permisos asignados a un usuario (solo supervisores)."""
+    rows = _permissions_with_details_query(db).filter(
         AccountPermission.user_id == user_id
-    ).options(
-        joinedload(AccountPermission.user),
-        joinedload(AccountPermission.account).joinedload(Account.company)
     ).all()
     
-    return permissions
+    return rows_response(rows, serialize_permission_row)
+
+
+@router.get("/user/{user_id}/effective", response_model=List[EffectivePermission])
+def get_user_effective_permissions(
+    user_id: UUID,
+    current_user: User = Depends(get_current_supervisor),
+    db: Session = Depends(get_db)
+):
+    """
+    Permisos efectivos de un usuario por cuenta, ya resueltos (solo
+    supervisores): `level` indica de qué nivel viene cada uno.
+    """
+    rows = db.execute(effective_permissions(user_id)).all()
+    return [
+        EffectivePermission(
+            account_id=row.account_id,
+            can_view=bool(row.can_view),
+            can_transfer=bool(row.can_transfer),
+            level=row.level
+        )
+        for row in rows
+    ]
 
 
 @router.patch("/{permission_id}", response_model=PermissionResponse)
@@ -130,6 +588,7 @@ def update_permission(
     for field, value in update_data.items():
         setattr(permission, field, value)
     
+    bump_versions(db, permissions_key(permission.user_id))
     db.commit()
     db.refresh(permission)
     
@@ -154,4 +613,5 @@ def delete_permission(
         )
     
     db.delete(permission)
+    bump_versions(db, permissions_key(permission.user_id))
     db.commit()
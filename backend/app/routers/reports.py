@@ -0,0 +1,215 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy import func, literal_column
+from sqlalchemy.orm import Session, aliased
+from typing import List, Optional
+from uuid import UUID
+from datetime import date, timedelta
+from decimal import Decimal
+from collections import defaultdict
+
+from app.database import get_db
+from app.models import User, Account, CashflowRollup, Company, Group, Operation, Transaction
+from app.schemas import CashflowRow, FlowMatrix, FlowMatrixNode, FlowMatrixEdge
+from app.auth import get_current_user, get_current_supervisor, visible_account_ids
+from app.cashflow import period_start
+from app.http_cache import collection_cache
+from app.query_budget import query_budget
+
+router = APIRouter(prefix="/api/reports", tags=["Informes"], dependencies=[query_budget(7)])
+
+
+@router.get(
+    "/cashflow",
+    response_model=List[CashflowRow],
+    dependencies=[collection_cache("accounts", "companies", "groups", balances=True)]
+)
+def get_cashflow(
+    level: str = Query("company", pattern="^(account|company|group)$"),
+    period: str = Query("month", pattern="^(day|week|month)$"),
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    group_id: Optional[UUID] = None,
+    company_id: Optional[UUID] = None,
+    account_id: Optional[UUID] = None,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Entradas y salidas por periodo (día, semana o mes) a nivel de cuenta,
+    empresa o grupo, a partir de los agregados precalculados.
+
+    Los totales de empresa y grupo son brutos: un traspaso entre dos cuentas
+    de la misma empresa cuenta como entrada y como salida.
+    Los periodos se alinean al inicio (lunes para semanas, día 1 para meses).
+    """
+    if date_from and date_to and date_from > date_to:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="La fecha inicial es posterior a la final"
+        )
+
+    if level == "account":
+        key_column, name_column = Account.id, Account.name
+    elif level == "company":
+        key_column, name_column = Company.id, func.coalesce(Company.name, literal_column("'Sin empresa'"))
+    else:
+        key_column, name_column = Group.id, func.coalesce(Group.name, literal_column("'Sin grupo'"))
+
+    inflow = func.sum(CashflowRollup.inflow)
+    outflow = func.sum(CashflowRollup.outflow)
+
+    query = db.query(
+        CashflowRollup.period_start,
+        key_column.label("id"),
+        name_column.label("name"),
+        inflow.label("inflow"),
+        outflow.label("outflow"),
+        (inflow - outflow).label("net"),
+        func.sum(CashflowRollup.transaction_count).label("transaction_count")
+    ).select_from(CashflowRollup).join(
+        Account, CashflowRollup.account_id == Account.id
+    ).outerjoin(
+        # Las cuentas sin empresa también cuentan (empresa y grupo None)
+        Company, Account.company_id == Company.id
+    ).outerjoin(
+        Group, Company.group_id == Group.id
+    ).filter(CashflowRollup.period == period)
+
+    if date_from:
+        query = query.filter(CashflowRollup.period_start >= period_start(date_from, period))
+    if date_to:
+        query = query.filter(CashflowRollup.period_start <= date_to)
+    if group_id:
+        query = query.filter(Company.group_id == group_id)
+    if company_id:
+        query = query.filter(Account.company_id == company_id)
+    if account_id:
+        query = query.filter(CashflowRollup.account_id == account_id)
+
+    if current_user.role != "supervisor":
+        # Solo las cuentas visibles cuentan en los totales
+        permitted_account_ids = visible_account_ids(current_user)
+        query = query.filter(CashflowRollup.account_id.in_(permitted_account_ids))
+
+    # Los periodos que se quedaron sin movimientos (ediciones/borrados) no se muestran
+    rows = query.group_by(
+        CashflowRollup.period_start, key_column, name_column
+    ).having(func.sum(CashflowRollup.transaction_count) > 0).order_by(CashflowRollup.period_start, name_column).all()
+
+    return [CashflowRow(**row._mapping) for row in rows]
+
+
+@router.get(
+    "/flow-matrix",
+    response_model=FlowMatrix,
+    dependencies=[collection_cache("accounts", "companies", "groups", "operations", balances=True)]
+)
+def get_flow_matrix(
+    level: str = Query("company", pattern="^(company|group)$"),
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    group_id: Optional[UUID] = None,
+    operation_status: Optional[str] = Query(None, pattern="^(open|completed|cancelled)$"),
+    include_internal: bool = False,
+    current_user: User = Depends(get_current_supervisor),
+    db: Session = Depends(get_db)
+):
+    """
+    Flujos entre empresas (o grupos) en un rango de fechas (solo supervisores).
+
+    La respuesta es dispersa: solo aparecen los nodos y pares con movimientos,
+    agregados en SQL por (origen, destino). `gross_edges` tiene cada sentido por
+    separado; `net_edges` compensa ambos sentidos de cada par.
+
+    - `group_id`: solo flujos con origen o destino en ese grupo.
+    - `operation_status`: solo transacciones de operaciones en ese estado.
+    - `include_internal`: incluir traspasos dentro de la misma empresa/grupo.
+    """
+    from_account = aliased(Account)
+    to_account = aliased(Account)
+    from_company = aliased(Company)
+    to_company = aliased(Company)
+
+    if level == "company":
+        from_key, to_key = from_company.id, to_company.id
+    else:
+        from_key, to_key = from_company.group_id, to_company.group_id
+
+    query = db.query(
+        from_key.label("from_id"),
+        to_key.label("to_id"),
+        func.sum(Transaction.amount).label("amount"),
+        func.count(Transaction.id).label("transaction_count")
+    ).select_from(Transaction).join(
+        from_account, Transaction.from_account_id == from_account.id
+    ).join(
+        from_company, from_account.company_id == from_company.id
+    ).join(
+        to_account, Transaction.to_account_id == to_account.id
+    ).join(
+        to_company, to_account.company_id == to_company.id
+    ).filter(Transaction.status == "completed")
+
+    if date_from:
+        query = query.filter(Transaction.transaction_date >= date_from)
+    if date_to:
+        query = query.filter(Transaction.transaction_date < date_to + timedelta(days=1))
+    if group_id:
+        query = query.filter((from_company.group_id == group_id) | (to_company.group_id == group_id))
+    if operation_status:
+        query = query.join(Operation, Transaction.operation_id == Operation.id).filter(
+            Operation.status == operation_status
+        )
+    if not include_internal:
+        query = query.filter(from_key.is_distinct_from(to_key))
+
+    rows = query.group_by(from_key, to_key).all()
+
+    # Nodos y saldos netos: una pasada sobre las aristas (O(aristas), no O(n²))
+    totals = defaultdict(lambda: [Decimal("0"), Decimal("0")])
+    pairs = defaultdict(lambda: [Decimal("0"), 0])
+    gross_edges = []
+    for row in rows:
+        gross_edges.append(FlowMatrixEdge(
+            from_id=row.from_id, to_id=row.to_id,
+            amount=row.amount, transaction_count=row.transaction_count
+        ))
+        totals[row.from_id][1] += row.amount
+        totals[row.to_id][0] += row.amount
+        if row.from_id == row.to_id:
+            continue
+        # Clave del par sin orientación; el importe se acumula hacia `pair[1]`
+        pair_key = tuple(sorted((row.from_id, row.to_id), key=str))
+        pair = pairs[pair_key]
+        pair[0] += row.amount if row.to_id == pair_key[1] else -row.amount
+        pair[1] += row.transaction_count
+
+    net_edges = []
+    for (first, second), (net, count) in pairs.items():
+        if net == 0:
+            continue
+        from_id, to_id = (first, second) if net > 0 else (second, first)
+        net_edges.append(FlowMatrixEdge(from_id=from_id, to_id=to_id, amount=abs(net), transaction_count=count))
+
+    node_ids = [node_id for node_id in totals if node_id is not None]
+    if level == "company":
+        described = {
+            company.id: (company.name, company.group_id)
+            for company in db.query(Company.id, Company.name, Company.group_id).filter(Company.id.in_(node_ids))
+        }
+    else:
+        described = {
+            group.id: (group.name, None)
+            for group in db.query(Group.id, Group.name).filter(Group.id.in_(node_ids))
+        }
+
+    nodes = []
+    for node_id, (total_in, total_out) in totals.items():
+        name, node_group_id = described.get(node_id, ("Sin grupo", None))
+        nodes.append(FlowMatrixNode(
+            id=node_id, name=name, group_id=node_group_id,
+            total_in=total_in, total_out=total_out
+        ))
+    nodes.sort(key=lambda node: node.name)
+
+    return FlowMatrix(level=level, nodes=nodes, gross_edges=gross_edges, net_edges=net_edges)
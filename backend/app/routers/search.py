@@ -0,0 +1,243 @@
+import base64
+import json
+import time
+from typing import Optional
+from uuid import UUID
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy import Float, and_, cast, func, literal, or_, select, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+from app.auth import get_current_user, visible_account_ids
+from app.database import get_db
+from app.models import (
+    User, Account, Company, Transaction,
+    SEARCH_CONFIG, search_vector, normalized_iban
+)
+from app.schemas import SearchHit, SearchResults, TypeaheadResults
+from app.query_budget import query_budget
+
+router = APIRouter(prefix="/api/search", tags=["Búsqueda"], dependencies=[query_budget(4)])
+
+MAX_LIMIT = 100
+TYPEAHEAD_BUDGET_MS = 50
+QUERY_CANCELED = "57014"
+
+
+# ============ CONSULTAS POR TIPO ============
+# Cada función devuelve (select ya filtrado por permisos, condición de
+# coincidencia, expresión de rank, columna id). Las columnas del select siguen
+# los campos de SearchHit.
+
+
+def _exact_rank(rank):
+    """
+    ts_rank_cd y similarity devuelven real (float4): en double precision el
+    valor que viaja en el cursor es exactamente el que se compara después
+    (si no, las filas empatadas con la última de la página se saltan).
+    """
+    return cast(rank, Float(53))
+
+def _visible_accounts(user: User):
+    """Subconsulta de cuentas visibles, o None si el usuario ve todas."""
+    if user.role == "supervisor":
+        return None
+    return visible_account_ids(user)
+
+
+def _transactions_search(q: str, visible):
+    query = func.websearch_to_tsquery(SEARCH_CONFIG, q)
+    vector = search_vector(Transaction.description)
+    rank = _exact_rank(func.ts_rank_cd(vector, query) + func.similarity(Transaction.description, q))
+
+    stmt = select(
+        literal("transaction").label("type"),
+        Transaction.id,
+        Transaction.description.label("title"),
+        Transaction.transaction_type.label("detail"),
+        rank.label("rank"),
+        literal(None).label("company_id"),
+        Transaction.amount,
+        Transaction.transaction_date.label("date")
+    )
+    match = or_(vector.op("@@")(query), Transaction.description.op("%")(q))
+
+    if visible is not None:
+        stmt = stmt.where(or_(
+            Transaction.from_account_id.in_(visible),
+            Transaction.to_account_id.in_(visible)
+        ))
+    return stmt, match, rank, Transaction.id
+
+
+def _companies_search(q: str, visible):
+    rank = _exact_rank(func.similarity(Company.name, q))
+
+    stmt = select(
+        literal("company").label("type"),
+        Company.id,
+        Company.name.label("title"),
+        Company.description.label("detail"),
+        rank.label("rank"),
+        Company.id.label("company_id"),
+        literal(None).label("amount"),
+        literal(None).label("date")
+    ).where(Company.is_active == True)
+    match = or_(Company.name.op("%")(q), Company.name.icontains(q, autoescape=True))
+
+    if visible is not None:
+        stmt = stmt.where(Company.id.in_(
+            select(Account.company_id).where(Account.id.in_(visible))
+        ))
+    return stmt, match, rank, Company.id
+
+
+def _accounts_search(q: str, visible):
+    iban = normalized_iban(Account.iban)
+    q_iban = q.replace(" ", "").upper()
+    rank = _exact_rank(func.greatest(func.similarity(Account.name, q), func.similarity(iban, q_iban)))
+
+    stmt = select(
+        literal("account").label("type"),
+        Account.id,
+        Account.name.label("title"),
+        Account.iban.label("detail"),
+        rank.label("rank"),
+        Account.company_id,
+        literal(None).label("amount"),
+        literal(None).label("date")
+    ).where(Account.is_active == True)
+    match = or_(
+        Account.name.op("%")(q),
+        Account.name.icontains(q, autoescape=True),
+        iban.contains(q_iban, autoescape=True)
+    )
+
+    if visible is not None:
+        stmt = stmt.where(Account.id.in_(visible))
+    return stmt, match, rank, Account.id
+
+
+SEARCHES = {
+    "transactions": _transactions_search,
+    "companies": _companies_search,
+    "accounts": _accounts_search
+}
+
+
+# ============ CURSOR ============
+
+def _encode_cursor(rank: float, item_id: UUID) -> str:
+    raw = json.dumps([rank, str(item_id)]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        rank, item_id = json.loads(raw)
+        return float(rank), UUID(item_id)
+    except (ValueError, TypeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Cursor inválido"
+        )
+
+
+@router.get("/", response_model=SearchResults)
+def search(
+    q: str = Query(..., min_length=2, max_length=200),
+    search_type: str = Query("transactions", alias="type", pattern="^(transactions|companies|accounts)$"),
+    limit: int = Query(20, ge=1, le=MAX_LIMIT),
+    cursor: Optional[str] = None,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Búsqueda por texto completo y por similitud (errores tipográficos) en
+    descripciones de transacciones, nombres de empresas, y nombres o IBAN de
+    cuentas. Resultados ordenados por relevancia; la paginación es por cursor
+    (`next_cursor`), estable aunque se inserten filas nuevas.
+    """
+    stmt, match, rank, id_column = SEARCHES[search_type](q, _visible_accounts(current_user))
+    stmt = stmt.where(match)
+
+    if cursor:
+        last_rank, last_id = _decode_cursor(cursor)
+        stmt = stmt.where(or_(rank < last_rank, and_(rank == last_rank, id_column > last_id)))
+
+    rows = db.execute(stmt.order_by(rank.desc(), id_column).limit(limit + 1)).all()
+
+    items = [SearchHit(**row._mapping) for row in rows[:limit]]
+    next_cursor = None
+    if len(rows) > limit:
+        next_cursor = _encode_cursor(items[-1].rank, items[-1].id)
+
+    return SearchResults(items=items, next_cursor=next_cursor)
+
+
+# ============ AUTOCOMPLETADO ============
+
+def _typeahead_statement(search_type: str, q: str, visible, limit: int):
+    """
+    Mismas columnas que la búsqueda completa, pero filtradas por similitud de
+    palabra (sirve con palabras a medio escribir) y ordenadas por su distancia
+    (`<->>`), que el índice GiST de trigramas resuelve recorriendo solo los
+    primeros resultados, sin calcular el rank de todas las filas.
+    """
+    if search_type == "transactions":
+        column = Transaction.description
+    elif search_type == "companies":
+        column = Company.name
+    else:
+        column = Account.name
+
+    stmt, _, _, _ = SEARCHES[search_type](q, visible)
+    condition = column.op("%>")(q)
+    if search_type == "accounts":
+        # Un IBAN se teclea desde el principio: prefijo, no similitud
+        iban_prefix = q.replace(" ", "").upper()
+        condition = or_(condition, normalized_iban(Account.iban).startswith(iban_prefix, autoescape=True))
+    return stmt.where(condition).order_by(column.op("<->>")(q)).limit(limit)
+
+
+def _is_query_canceled(exc: OperationalError) -> bool:
+    orig = exc.orig
+    return getattr(orig, "sqlstate", None) == QUERY_CANCELED or getattr(orig, "pgcode", None) == QUERY_CANCELED
+
+
+@router.get("/typeahead", response_model=TypeaheadResults)
+def typeahead(
+    q: str = Query(..., min_length=2, max_length=100),
+    limit: int = Query(5, ge=1, le=20),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Sugerencias mientras se escribe, con un presupuesto total de ~50 ms.
+    Primero cuentas y empresas (tablas pequeñas), después transacciones; si
+    se agota el presupuesto se devuelve lo obtenido con `partial: true`.
+    """
+    visible = _visible_accounts(current_user)
+    results = TypeaheadResults()
+    deadline = time.monotonic() + TYPEAHEAD_BUDGET_MS / 1000
+
+    for search_type in ("accounts", "companies", "transactions"):
+        remaining_ms = int((deadline - time.monotonic()) * 1000)
+        if remaining_ms <= 0:
+            results.partial = True
+            break
+        try:
+            # SET LOCAL: el límite solo dura lo que la transacción de esta petición
+            db.execute(text(f"SET LOCAL statement_timeout = {remaining_ms}"))
+            rows = db.execute(_typeahead_statement(search_type, q, visible, limit)).all()
+        except OperationalError as exc:
+            if not _is_query_canceled(exc):
+                raise
+            db.rollback()
+            results.partial = True
+            break
+        setattr(results, search_type, [SearchHit(**row._mapping) for row in rows])
+
+    return results
@@ -1,25 +1,36 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session, joinedload
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status, Query
+from sqlalchemy.orm import Session, joinedload, selectinload, aliased
 from sqlalchemy import or_
-from typing import List
+from typing import List, Union
 from uuid import UUID
 from decimal import Decimal
 from datetime import datetime
 
 from app.database import get_db
-from app.models import User, Account, AccountPermission, Transaction
+from app.models import User, Account, Transaction, Company
 from app.schemas import (
     TransferCreate, DepositCreate, WithdrawalCreate, ConfirmingSettlementCreate,
-    TransactionResponse, TransactionWithAccounts, TransactionUpdate
+    TransactionResponse, TransactionWithAccounts, TransactionUpdate, TransactionListCompact
 )
-from app.auth import get_current_user, get_current_supervisor, check_account_permission
+from app.auth import get_current_user, get_current_supervisor, check_account_permission, visible_account_ids
+from app.http_cache import bump_balances, bump_versions
+from app.cashflow import apply_to_rollups
+from app.cache_bus import HISTORY_VERSION_KEY
+from app.cycles import check_new_transfer
+from app.events import publish_transaction, publish_balance
+from app.fast_json import select_columns, compile_row_serializer, rows_response
+from app.query_budget import query_budget
 
-router = APIRouter(prefix="/api/transactions", tags=["Transacciones"])
+router = APIRouter(prefix="/api/transactions", tags=["Transacciones"], dependencies=[query_budget(9)])
 
+serialize_transaction_row = compile_row_serializer(TransactionWithAccounts)
 
-@router.post("/transfer", response_model=TransactionResponse, status_code=status.HTTP_201_CREATED)
+
+@router.post("/transfer", response_model=TransactionResponse, status_code=status.HTTP_201_CREATED,
+             dependencies=[query_budget(11)])
 def create_transfer(
     transfer_data: TransferCreate,
+    background_tasks: BackgroundTasks,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -121,9 +132,17 @@ def create_transfer(
     )
     
     db.add(transaction)
+    apply_to_rollups(db, transaction)
+    bump_balances(db, from_account, to_account)
     db.commit()
     db.refresh(transaction)
     
+    publish_transaction(transaction)
+    # Ciclos que cierre esta transferencia (tras enviar la respuesta)
+    background_tasks.add_task(
+        check_new_transfer, transaction.from_account_id, transaction.to_account_id, transaction.transaction_date
+    )
+    
     return transaction
 
 
@@ -163,9 +182,13 @@ def create_deposit(
     )
     
     db.add(transaction)
+    apply_to_rollups(db, transaction)
+    bump_balances(db, account)
     db.commit()
     db.refresh(transaction)
     
+    publish_transaction(transaction)
+    
     return transaction
 
 
@@ -211,13 +234,18 @@ def create_withdrawal(
     )
     
     db.add(transaction)
+    apply_to_rollups(db, transaction)
+    bump_balances(db, account)
     db.commit()
     db.refresh(transaction)
     
+    publish_transaction(transaction)
+    
     return transaction
 
 
-@router.post("/confirming-settlement", response_model=TransactionResponse, status_code=status.HTTP_201_CREATED)
+@router.post("/confirming-settlement", response_model=TransactionResponse, status_code=status.HTTP_201_CREATED,
+             dependencies=[query_budget(10)])
 def create_confirming_settlement(
     settlement_data: ConfirmingSettlementCreate,
     current_user: User = Depends(get_current_user),
@@ -308,24 +336,32 @@ def create_confirming_settlement(
     )
     
     db.add(transaction)
+    apply_to_rollups(db, transaction)
+    bump_balances(db, charge_account, confirming_account)
     db.commit()
     db.refresh(transaction)
     
+    publish_transaction(transaction)
+    
     return transaction
 
 
-@router.get("/", response_model=List[TransactionWithAccounts])
+@router.get("/", response_model=Union[List[TransactionWithAccounts], TransactionListCompact])
 def list_transactions(
     account_id: UUID = None,
     limit: int = 50,
+    response_format: str = Query("full", alias="format", pattern="^(full|compact)$"),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Listar transacciones visibles para el usuario."""
-    query = db.query(Transaction).options(
-        joinedload(Transaction.from_account).joinedload(Account.company),
-        joinedload(Transaction.to_account).joinedload(Account.company)
-    ).order_by(Transaction.created_at.desc())
+    """
+    Listar transacciones visibles para el usuario.
+    
+    Con `format=compact` las cuentas y empresas no se anidan en cada fila,
+    sino que se devuelven una sola vez en los diccionarios `accounts` y
+    `companies`, indexados por ID.
+    """
+    conditions = []
     
     if account_id:
         # Verificar permiso para la cuenta específica
@@ -334,7 +370,7 @@ def list_transactions(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="No tienes permiso para ver esta cuenta"
             )
-        query = query.filter(
+        conditions.append(
             or_(
                 Transaction.from_account_id == account_id,
                 Transaction.to_account_id == account_id
@@ -342,19 +378,62 @@ def list_transactions(
         )
     elif current_user.role != "supervisor":
         # Filtrar por cuentas con permiso
-        permitted_account_ids = db.query(AccountPermission.account_id).filter(
-            AccountPermission.user_id == current_user.id,
-            AccountPermission.can_view == True
-        ).subquery()
+        permitted_account_ids = visible_account_ids(current_user)
         
-        query = query.filter(
+        conditions.append(
             or_(
                 Transaction.from_account_id.in_(permitted_account_ids),
                 Transaction.to_account_id.in_(permitted_account_ids)
             )
         )
     
-    return query.limit(limit).all()
+    if response_format == "full":
+        # Filas Core + orjson: sin mapa de identidad ni validación por fila
+        from_account = aliased(Account)
+        to_account = aliased(Account)
+        from_company = aliased(Company)
+        to_company = aliased(Company)
+        
+        rows = db.query(*select_columns(TransactionWithAccounts, {
+            "": Transaction,
+            "from_account": from_account,
+            "from_account__company": from_company,
+            "to_account": to_account,
+            "to_account__company": to_company
+        })).select_from(Transaction).outerjoin(
+            from_account, Transaction.from_account_id == from_account.id
+        ).outerjoin(
+            from_company, from_account.company_id == from_company.id
+        ).outerjoin(
+            to_account, Transaction.to_account_id == to_account.id
+        ).outerjoin(
+            to_company, to_account.company_id == to_company.id
+        ).filter(*conditions).order_by(Transaction.created_at.desc()).limit(limit).all()
+        
+        return rows_response(rows, serialize_transaction_row)
+    
+    query = db.query(Transaction).filter(*conditions).order_by(Transaction.created_at.desc())
+    
+    # selectinload: una consulta IN por relación en lugar de filas duplicadas por los JOIN
+    transactions = query.options(
+        selectinload(Transaction.from_account).selectinload(Account.company),
+        selectinload(Transaction.to_account).selectinload(Account.company)
+    ).limit(limit).all()
+    
+    accounts = {}
+    companies = {}
+    for tx in transactions:
+        for account in (tx.from_account, tx.to_account):
+            if account is not None and account.id not in accounts:
+                accounts[account.id] = account
+                if account.company is not None:  # company_id admite nulos
+                    companies[account.company_id] = account.company
+    
+    return TransactionListCompact(
+        transactions=transactions,
+        accounts=accounts,
+        companies=companies
+    )
 
 
 @router.get("/{transaction_id}/can-edit")
@@ -472,13 +551,14 @@ def assign_transaction_to_operation(
         # Desasignar de operación
         transaction.operation_id = None
     
+    bump_versions(db, "operations")
     db.commit()
     db.refresh(transaction)
     
     return transaction
 
 
-@router.patch("/{transaction_id}", response_model=TransactionResponse)
+@router.patch("/{transaction_id}", response_model=TransactionResponse, dependencies=[query_budget(16)])
 def update_transaction(
     transaction_id: UUID,
     update_data: TransactionUpdate,
@@ -535,6 +615,16 @@ def update_transaction(
     if transaction.to_account_id:
         to_account = db.query(Account).filter(Account.id == transaction.to_account_id).first()
     
+    balance_changes = []
+    
+    # Importe o fecha nuevos: se mueve el movimiento en los agregados
+    rollups_changed = (
+        (update_data.amount is not None and update_data.amount != transaction.amount)
+        or (update_data.transaction_date is not None and update_data.transaction_date != transaction.transaction_date)
+    )
+    if rollups_changed:
+        apply_to_rollups(db, transaction, sign=-1)
+    
     # Si cambia el importe, recalcular saldos
     if update_data.amount is not None and update_data.amount != transaction.amount:
         old_amount = transaction.amount
@@ -546,11 +636,13 @@ def update_transaction(
             if from_account:
                 from_account.balance -= difference
                 transaction.from_balance_after = from_account.balance
+                balance_changes.append((from_account, -difference))
         
         if transaction.transaction_type in ['transfer', 'deposit', 'confirming_settlement']:
             if to_account:
                 to_account.balance += difference
                 transaction.to_balance_after = to_account.balance
+                balance_changes.append((to_account, difference))
         
         transaction.amount = new_amount
     
@@ -561,13 +653,21 @@ def update_transaction(
     if update_data.transaction_date is not None:
         transaction.transaction_date = update_data.transaction_date
     
+    if rollups_changed:
+        apply_to_rollups(db, transaction)
+        # La cache analítica debe recargar el histórico
+        bump_balances(db, from_account, to_account, keys=[HISTORY_VERSION_KEY])
     db.commit()
     db.refresh(transaction)
     
+    publish_transaction(transaction, "transaction.updated")
+    for account, delta in balance_changes:
+        publish_balance(account, delta)
+    
     return transaction
 
 
-@router.delete("/{transaction_id}", status_code=status.HTTP_204_NO_CONTENT)
+@router.delete("/{transaction_id}", status_code=status.HTTP_204_NO_CONTENT, dependencies=[query_budget(15)])
 def delete_transaction(
     transaction_id: UUID,
     current_user: User = Depends(get_current_supervisor),
@@ -615,12 +715,15 @@ def delete_transaction(
         )
     
     # Revertir saldos de las cuentas
+    balance_changes = []
+    
     if transaction.from_account_id:
         from_account = db.query(Account).filter(Account.id == transaction.from_account_id).first()
         if from_account:
             # Devolver el dinero a la cuenta origen
             if transaction.transaction_type in ['transfer', 'withdrawal', 'confirming_settlement']:
                 from_account.balance += transaction.amount
+                balance_changes.append((from_account, transaction.amount))
     
     if transaction.to_account_id:
         to_account = db.query(Account).filter(Account.id == transaction.to_account_id).first()
@@ -628,7 +731,14 @@ def delete_transaction(
             # Quitar el dinero de la cuenta destino
             if transaction.transaction_type in ['transfer', 'deposit', 'confirming_settlement']:
                 to_account.balance -= transaction.amount
+                balance_changes.append((to_account, -transaction.amount))
     
     # Eliminar la transacción
+    apply_to_rollups(db, transaction, sign=-1)
     db.delete(transaction)
+    bump_balances(db, *(account for account, _ in balance_changes), keys=[HISTORY_VERSION_KEY])
     db.commit()
+    
+    publish_transaction(transaction, "transaction.deleted")
+    for account, delta in balance_changes:
+        publish_balance(account, delta)
@@ -1,25 +1,40 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 from uuid import UUID
 
 from app.database import get_db
 from app.models import User
 from app.schemas import UserResponse, UserUpdate
 from app.auth import get_current_user, get_current_supervisor, get_password_hash
+from app.http_cache import bump_versions, permissions_key
+from app.pagination import keyset_page, set_total_count, text_filter
+from app.query_budget import query_budget
 
-router = APIRouter(prefix="/api/users", tags=["Usuarios"])
+router = APIRouter(prefix="/api/users", tags=["Usuarios"], dependencies=[query_budget(7)])
 
 
 @router.get("/", response_model=List[UserResponse])
 def list_users(
-    skip: int = 0,
-    limit: int = 100,
+    response: Response,
+    q: Optional[str] = Query(None, min_length=1, max_length=100),
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    total: bool = False,
     current_user: User = Depends(get_current_supervisor),
     db: Session = Depends(get_db)
 ):
-    """Listar todos los usuarios (solo supervisores)."""
-    users = db.query(User).offset(skip).limit(limit).all()
+    """
+    Listar usuarios por email (solo supervisores). `q` busca en email y
+    nombre; la página siguiente se pide con el cursor de X-Next-Cursor.
+    """
+    query = db.query(User)
+    if q:
+        query = query.filter(text_filter(db, q, User.email, User.full_name))
+    if total:
+        set_total_count(db, query, response)
+    
+    users, _ = keyset_page(query, (User.email, User.id), cursor, limit, response=response)
     return users
 
 
@@ -80,6 +95,8 @@ def update_user(
     for field, value in update_data.items():
         setattr(user, field, value)
     
+    # El rol y el estado cambian lo que el usuario puede ver
+    bump_versions(db, permissions_key(user.id))
     db.commit()
     db.refresh(user)
     
@@ -107,4 +124,5 @@ def delete_user(
         )
     
     user.is_active = False
+    bump_versions(db, permissions_key(user.id))
     db.commit()
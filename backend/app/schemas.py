@@ -1,7 +1,7 @@
 from pydantic import BaseModel, EmailStr, Field
-from typing import Optional, List
+from typing import Optional, List, Dict
 from uuid import UUID
-from datetime import datetime
+from datetime import date, datetime
 from decimal import Decimal
 
 
@@ -137,7 +137,7 @@ class AccountUpdate(BaseModel):
 
 class AccountResponse(AccountBase):
     id: UUID
-    company_id: UUID
+    company_id: Optional[UUID]
     balance: Decimal
     credit_limit: Decimal
     available: Decimal
@@ -149,7 +149,7 @@ class AccountResponse(AccountBase):
 
 
 class AccountWithCompany(AccountResponse):
-    company: CompanyResponse
+    company: Optional[CompanyResponse] = None  # company_id admite nulos
 
 
 # ============ PERMISSION SCHEMAS ============
@@ -160,8 +160,11 @@ class PermissionBase(BaseModel):
 
 
 class PermissionCreate(PermissionBase):
+    """Indicar un único destino: cuenta, empresa o grupo entero."""
     user_id: UUID
-    account_id: UUID
+    account_id: Optional[UUID] = None
+    company_id: Optional[UUID] = None
+    group_id: Optional[UUID] = None
 
 
 class PermissionUpdate(BaseModel):
@@ -172,7 +175,10 @@ class PermissionUpdate(BaseModel):
 class PermissionResponse(PermissionBase):
     id: UUID
     user_id: UUID
-    account_id: UUID
+    account_id: Optional[UUID] = None
+    company_id: Optional[UUID] = None
+    group_id: Optional[UUID] = None
+    level: str  # account, company, group
     granted_by: Optional[UUID]
     created_at: datetime
     
@@ -182,7 +188,85 @@ class PermissionResponse(PermissionBase):
 
 class PermissionWithDetails(PermissionResponse):
     user: UserResponse
-    account: AccountWithCompany
+    account: Optional[AccountWithCompany] = None
+    company: Optional[CompanyResponse] = None
+    group: Optional[GroupResponse] = None
+
+
+class EffectivePermission(BaseModel):
+    account_id: UUID
+    can_view: bool
+    can_transfer: bool
+    level: str  # Nivel del permiso que se aplica
+
+
+class PermissionBulkTarget(BaseModel):
+    """Usuarios × destino: una lista de cuentas, una empresa o un grupo."""
+    user_ids: List[UUID] = Field(..., min_length=1)
+    account_ids: Optional[List[UUID]] = None
+    company_id: Optional[UUID] = None
+    group_id: Optional[UUID] = None
+
+
+class PermissionBulkGrant(PermissionBulkTarget, PermissionBase):
+    pass
+
+
+class PermissionBulkRevoke(PermissionBulkTarget):
+    pass
+
+
+class PermissionBulkResult(BaseModel):
+    users: int
+    accounts: int  # Cuentas cubiertas por el destino
+    affected: int  # Permisos creados o actualizados (alta) / eliminados (baja)
+
+
+class MatrixUser(BaseModel):
+    id: UUID
+    email: str
+    full_name: str
+
+
+class MatrixCompany(BaseModel):
+    id: UUID
+    name: str
+    group_id: Optional[UUID] = None
+
+
+class MatrixAccount(BaseModel):
+    id: UUID
+    name: str
+    company_idx: int  # Posición en `companies`
+
+
+class PermissionMatrix(BaseModel):
+    """
+    Matriz usuarios × cuentas. Cada celda es [user_idx, account_idx, flags]
+    con flags: 1 = ver, 2 = transferir, 4 = heredado de empresa o grupo.
+    Las celdas sin permiso no aparecen.
+    """
+    users: List[MatrixUser]
+    companies: List[MatrixCompany]
+    accounts: List[MatrixAccount]
+    cells: List[List[int]]
+    next_cursor: Optional[str] = None
+
+
+class MatrixCellChange(BaseModel):
+    user_id: UUID
+    account_id: UUID
+    flags: Optional[int] = Field(None, ge=0, le=3)  # 1 = ver, 2 = transferir; null = quitar el permiso propio
+
+
+class MatrixUpdate(BaseModel):
+    cells: List[MatrixCellChange] = Field(..., min_length=1, max_length=10000)
+
+
+class MatrixUpdateResult(BaseModel):
+    upserted: int
+    deleted: int
+    unchanged: int
 
 
 # ============ OPERATION SCHEMAS ============
@@ -323,6 +407,13 @@ class TransactionWithAccounts(TransactionResponse):
     to_account: Optional[AccountWithCompany] = None
 
 
+class TransactionListCompact(BaseModel):
+    """Listado normalizado: cuentas y empresas una sola vez, indexadas por ID."""
+    transactions: List[TransactionResponse]
+    accounts: Dict[UUID, AccountResponse]
+    companies: Dict[UUID, CompanyResponse]
+
+
 class OperationWithTransactions(OperationResponse):
     transactions: List[TransactionWithAccounts] = []
 
@@ -376,5 +467,141 @@ class GroupBalanceSummary(BaseModel):
     net: Decimal   # Saldo neto
 
 
+class NettingTransfer(BaseModel):
+    from_group_id: UUID
+    from_group_name: str
+    to_group_id: UUID
+    to_group_name: str
+    amount: Decimal
+
+
+class NettingProposal(BaseModel):
+    operation_id: Optional[UUID] = None
+    entry_count: int
+    total_amount: Decimal  # Suma de los apuntes (sin compensar)
+    positions: List[GroupBalanceSummary]
+    transfers: List[NettingTransfer]
+    fingerprint: str  # Enviar al ejecutar: garantiza que los apuntes no han cambiado
+
+
+class NettingExecute(BaseModel):
+    fingerprint: str
+    operation_id: Optional[UUID] = None  # Mismo ámbito que la propuesta
+    settled_in_operation_id: Optional[UUID] = None
+
+
+class NettingResult(BaseModel):
+    settled_count: int
+    transfers: List[NettingTransfer]
+
+
+# ============ REPORT SCHEMAS ============
+
+class CashflowRow(BaseModel):
+    period_start: date
+    id: Optional[UUID]  # Cuenta, empresa o grupo (None = sin empresa o sin grupo)
+    name: str
+    inflow: Decimal
+    outflow: Decimal
+    net: Decimal
+    transaction_count: int
+
+
+class FlowMatrixNode(BaseModel):
+    id: Optional[UUID]  # Empresa o grupo (None = empresas sin grupo)
+    name: str
+    group_id: Optional[UUID] = None
+    total_in: Decimal
+    total_out: Decimal
+
+
+class FlowMatrixEdge(BaseModel):
+    from_id: Optional[UUID]
+    to_id: Optional[UUID]
+    amount: Decimal
+    transaction_count: int
+
+
+class FlowMatrix(BaseModel):
+    """Matriz dispersa: solo los pares con movimientos."""
+    level: str
+    nodes: List[FlowMatrixNode]
+    gross_edges: List[FlowMatrixEdge]  # Un sentido por arista
+    net_edges: List[FlowMatrixEdge]    # Un arista por par, en el sentido del saldo neto
+
+
+class CounterpartyTotal(BaseModel):
+    id: Optional[UUID]
+    name: str
+    amount: Decimal
+    transaction_count: int
+
+
+class MonthlyTrendPoint(BaseModel):
+    month: date
+    inflow: Decimal
+    outflow: Decimal
+    net: Decimal
+    transaction_count: int
+
+
+# ============ SEARCH SCHEMAS ============
+
+class SearchHit(BaseModel):
+    type: str  # transaction, company, account
+    id: UUID
+    title: Optional[str]
+    detail: Optional[str] = None
+    rank: float
+    company_id: Optional[UUID] = None
+    amount: Optional[Decimal] = None
+    date: Optional[datetime] = None
+
+
+class SearchResults(BaseModel):
+    items: List[SearchHit]
+    next_cursor: Optional[str] = None  # Pasar como `cursor` para la página siguiente
+
+
+class TypeaheadResults(BaseModel):
+    transactions: List[SearchHit] = []
+    companies: List[SearchHit] = []
+    accounts: List[SearchHit] = []
+    partial: bool = False  # Se agotó el presupuesto de tiempo antes de completar
+
+
+# ============ COMPLIANCE SCHEMAS ============
+
+class CircularFlowEntity(BaseModel):
+    id: UUID
+    name: str
+
+
+class CircularFlowAlertResponse(BaseModel):
+    id: UUID
+    level: str
+    entities: List[CircularFlowEntity]  # En el orden del ciclo
+    length: int
+    amount: Decimal
+    window_start: datetime
+    window_end: datetime
+    status: str
+    detected_at: datetime
+    updated_at: Optional[datetime] = None
+
+
+class CircularFlowAlertUpdate(BaseModel):
+    status: str = Field(..., pattern="^(open|dismissed)$")
+
+
+class CircularFlowScanResult(BaseModel):
+    level: str
+    window_start: datetime
+    window_end: datetime
+    components: List[List[CircularFlowEntity]]  # Componentes fuertemente conexas (>1 nodo)
+    cycles: List[List[CircularFlowEntity]]
+    truncated: bool = False
+
+
 # Actualizar referencias circulares
 CompanyWithAccounts.model_rebuild()
@@ -0,0 +1,283 @@
+"""
+Almacenamiento de ficheros adjuntos direccionado por contenido.
+
+Los ficheros se guardan fuera de PostgreSQL, identificados por el SHA-256 de
+su contenido: dos adjuntos con el mismo contenido comparten un único blob.
+Por defecto se usa el sistema de ficheros local; para producción se puede
+usar cualquier servicio compatible con S3.
+"""
+import hashlib
+import os
+import re
+import tempfile
+import unicodedata
+from functools import lru_cache
+from typing import BinaryIO, Iterator, Optional, Tuple
+from urllib.parse import quote
+
+from app.config import get_settings
+
+CHUNK_SIZE = 64 * 1024  # 64KB
+
+
+class BlobTooLarge(Exception):
+    """El fichero supera el tamaño máximo permitido."""
+
+
+class BlobNotFound(Exception):
+    """No existe ningún blob con esa clave."""
+
+
+class BlobStore:
+    """Interfaz común de los almacenes de blobs."""
+
+    def __init__(self, spool_dir: Optional[str] = None):
+        self.spool_dir = spool_dir
+
+    def _spool(self, fileobj: BinaryIO, max_size: Optional[int] = None) -> Tuple[str, str, int]:
+        """Copiar el stream a un temporal calculando el hash por el camino."""
+        digest = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(prefix="upload-", dir=self.spool_dir)
+        try:
+            with os.fdopen(fd, "wb") as tmp:
+                while True:
+                    chunk = fileobj.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    size += len(chunk)
+                    if max_size is not None and size > max_size:
+                        raise BlobTooLarge()
+                    digest.update(chunk)
+                    tmp.write(chunk)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        return tmp_path, digest.hexdigest(), size
+
+    def put(self, fileobj: BinaryIO, max_size: Optional[int] = None) -> Tuple[str, int]:
+        """Guardar un stream y devolver (sha256, tamaño)."""
+        raise NotImplementedError
+
+    def open_range(self, key: str, start: int = 0, end: Optional[int] = None,
+                   chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+        """Leer el blob por trozos, desde `start` hasta `end` (inclusive)."""
+        raise NotImplementedError
+
+    def size(self, key: str) -> int:
+        raise NotImplementedError
+
+    def exists(self, key: str) -> bool:
+        raise NotImplementedError
+
+    def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+
+class LocalBlobStore(BlobStore):
+    """Blobs en disco bajo `root/ab/cd/<sha256>`."""
+
+    def __init__(self, root: str):
+        self.root = os.path.abspath(root)
+        spool_dir = os.path.join(self.root, "tmp")
+        os.makedirs(spool_dir, exist_ok=True)
+        super().__init__(spool_dir)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], key[2:4], key)
+
+    def put(self, fileobj: BinaryIO, max_size: Optional[int] = None) -> Tuple[str, int]:
+        tmp_path, key, size = self._spool(fileobj, max_size)
+        path = self._path(key)
+        if os.path.exists(path):
+            # Contenido ya almacenado: deduplicar
+            os.unlink(tmp_path)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(tmp_path, path)
+        return key, size
+
+    def open_range(self, key: str, start: int = 0, end: Optional[int] = None,
+                   chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+        try:
+            f = open(self._path(key), "rb")
+        except FileNotFoundError:
+            raise BlobNotFound(key)
+
+        def iterator():
+            with f:
+                f.seek(start)
+                remaining = None if end is None else end - start + 1
+                while remaining is None or remaining > 0:
+                    to_read = chunk_size if remaining is None else min(chunk_size, remaining)
+                    chunk = f.read(to_read)
+                    if not chunk:
+                        break
+                    if remaining is not None:
+                        remaining -= len(chunk)
+                    yield chunk
+
+        return iterator()
+
+    def size(self, key: str) -> int:
+        try:
+            return os.path.getsize(self._path(key))
+        except FileNotFoundError:
+            raise BlobNotFound(key)
+
+    def exists(self, key: str) -> bool:
+        return os.path.exists(self._path(key))
+
+    def delete(self, key: str) -> None:
+        try:
+            os.unlink(self._path(key))
+        except FileNotFoundError:
+            pass
+
+
+class S3BlobStore(BlobStore):
+    """
+    Blobs en un bucket compatible con S3.
+
+    `client` debe ofrecer el subconjunto de la API de boto3 que se usa aquí
+    (`upload_file`, `get_object`, `head_object`, `delete_object`), de modo que
+    MinIO o un sustituto local en memoria sirven igual.
+    """
+
+    def __init__(self, client, bucket: str, prefix: str = "attachments/"):
+        super().__init__()
+        self.client = client
+        self.bucket = bucket
+        self.prefix = prefix
+
+    def _key(self, key: str) -> str:
+        return f"{self.prefix}{key}"
+
+    def put(self, fileobj: BinaryIO, max_size: Optional[int] = None) -> Tuple[str, int]:
+        tmp_path, key, size = self._spool(fileobj, max_size)
+        try:
+            if not self.exists(key):
+                self.client.upload_file(tmp_path, self.bucket, self._key(key))
+        finally:
+            os.unlink(tmp_path)
+        return key, size
+
+    def open_range(self, key: str, start: int = 0, end: Optional[int] = None,
+                   chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+        byte_range = f"bytes={start}-{'' if end is None else end}"
+        try:
+            body = self.client.get_object(
+                Bucket=self.bucket, Key=self._key(key), Range=byte_range
+            )["Body"]
+        except Exception as e:
+            if _is_s3_not_found(e):
+                raise BlobNotFound(key)
+            raise
+
+        def iterator():
+            try:
+                while True:
+                    chunk = body.read(chunk_size)
+                    if not chunk:
+                        break
+                    yield chunk
+            finally:
+                body.close()
+
+        return iterator()
+
+    def size(self, key: str) -> int:
+        try:
+            head = self.client.head_object(Bucket=self.bucket, Key=self._key(key))
+        except Exception as e:
+            if _is_s3_not_found(e):
+                raise BlobNotFound(key)
+            raise
+        return int(head["ContentLength"])
+
+    def exists(self, key: str) -> bool:
+        try:
+            self.size(key)
+            return True
+        except BlobNotFound:
+            return False
+
+    def delete(self, key: str) -> None:
+        self.client.delete_object(Bucket=self.bucket, Key=self._key(key))
+
+
+def _is_s3_not_found(error: Exception) -> bool:
+    if isinstance(error, (FileNotFoundError, KeyError)):
+        return True
+    response = getattr(error, "response", None) or {}
+    code = str(response.get("Error", {}).get("Code", ""))
+    return code in ("404", "NoSuchKey", "NotFound")
+
+
+@lru_cache()
+def get_blob_store() -> BlobStore:
+    """Almacén configurado en `Settings.storage_backend`."""
+    settings = get_settings()
+
+    if settings.storage_backend == "s3":
+        try:
+            import boto3
+        except ImportError:
+            raise RuntimeError("storage_backend='s3' requiere instalar boto3")
+
+        client = boto3.client(
+            "s3",
+            endpoint_url=settings.s3_endpoint_url,
+            aws_access_key_id=settings.s3_access_key,
+            aws_secret_access_key=settings.s3_secret_key,
+            region_name=settings.s3_region,
+        )
+        return S3BlobStore(client, settings.s3_bucket)
+
+    return LocalBlobStore(settings.storage_path)
+
+
+def parse_range_header(range_header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    Interpretar una cabecera `Range: bytes=...` de un único rango.
+
+    Devuelve (inicio, fin) inclusive, None si no hay rango utilizable
+    (se sirve el fichero completo) o lanza ValueError si no es satisfacible.
+    """
+    if not range_header or not range_header.startswith("bytes="):
+        return None
+
+    spec = range_header[len("bytes="):].strip()
+    if "," in spec:
+        return None  # Múltiples rangos: servir completo
+
+    start_str, _, end_str = spec.partition("-")
+    try:
+        if start_str == "":
+            # Sufijo: los últimos N bytes
+            suffix = int(end_str)
+            if suffix <= 0:
+                raise ValueError(range_header)
+            return max(size - suffix, 0), size - 1
+
+        start = int(start_str)
+        end = int(end_str) if end_str else size - 1
+    except ValueError:
+        raise ValueError(range_header)
+
+    if start >= size or start > end:
+        raise ValueError(range_header)
+
+    return start, min(end, size - 1)
+
+
+def content_disposition(filename: str) -> str:
+    """
+    Cabecera Content-Disposition de descarga para cualquier nombre de fichero.
+
+    Las cabeceras se codifican en latin-1: se envía un `filename` ASCII de
+    respaldo y el nombre real en `filename*` (UTF-8, RFC 5987).
+    """
+    fallback = unicodedata.normalize("NFKD", filename).encode("ascii", "ignore").decode("ascii")
+    fallback = re.sub(r"[^A-Za-z0-9 ._()-]+", "_", " ".join(fallback.split())).strip(". ") or "descarga"
+    return f"attachment; filename=\"{fallback}\"; filename*=UTF-8''{quote(filename, safe='')}"
@@ -0,0 +1,77 @@
+"""
+Generación de ficheros ZIP en streaming.
+
+El ZIP se escribe sobre un destino no posicionable, de modo que zipfile usa
+descriptores de datos y nunca necesita retroceder: cada trozo comprimido se
+entrega al cliente en cuanto se produce y la memoria usada no depende del
+tamaño de los ficheros.
+"""
+import zipfile
+from datetime import datetime
+from typing import Iterable, Iterator, Optional, Tuple
+
+# Tipos que ya vienen comprimidos: se guardan sin volver a comprimir
+COMPRESSED_CONTENT_TYPES = {
+    "application/pdf",
+    "application/zip",
+    "application/gzip",
+    "application/x-7z-compressed",
+    "image/jpeg",
+    "image/png",
+    "image/gif",
+    "image/webp",
+}
+
+ZipEntry = Tuple[str, Iterable[bytes], Optional[str]]  # (nombre, contenido, content_type)
+
+
+class _ZipSink:
+    """Destino de escritura que acumula bytes hasta que se recogen."""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def stream_zip(entries: Iterable[ZipEntry]) -> Iterator[bytes]:
+    """Construir un ZIP a partir de `entries` entregándolo por trozos."""
+    sink = _ZipSink()
+    now = datetime.now().timetuple()[:6]
+
+    with zipfile.ZipFile(sink, mode="w") as zf:
+        for name, content, content_type in entries:
+            info = zipfile.ZipInfo(name, date_time=now)
+            info.compress_type = (
+                zipfile.ZIP_STORED if content_type in COMPRESSED_CONTENT_TYPES
+                else zipfile.ZIP_DEFLATED
+            )
+            with zf.open(info, mode="w", force_zip64=True) as dest:
+                for chunk in content:
+                    dest.write(chunk)
+                    data = sink.drain()
+                    if data:
+                        yield data
+            data = sink.drain()
+            if data:
+                yield data
+
+    # Directorio central
+    data = sink.drain()
+    if data:
+        yield data
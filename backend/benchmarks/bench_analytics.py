@@ -0,0 +1,149 @@
+"""
+Memoria y velocidad de la cache analítica en columnas (app.analytics).
+
+Genera un histórico sintético, lo carga en `AnalyticsCache` como lo haría el
+refresco desde la base de datos y compara consultas típicas (contrapartes
+principales y tendencia mensual) con el mismo cálculo en Python puro sobre
+las filas. Antes de medir comprueba que ambos dan el mismo resultado.
+
+No necesita base de datos. Uso (desde backend/):
+    python benchmarks/bench_analytics.py [--rows 100000 1000000]
+"""
+import argparse
+import random
+import sys
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta
+from decimal import Decimal
+from types import SimpleNamespace
+
+sys.path.insert(0, '.')
+
+from app.analytics import AnalyticsCache, LOAD_BATCH_SIZE
+
+
+def make_history(n_rows: int, rng: random.Random, n_groups: int = 20, n_companies: int = 200,
+                 n_accounts: int = 1000):
+    groups = [uuid.UUID(int=rng.getrandbits(128)) for _ in range(n_groups)]
+    company_group = {uuid.UUID(int=rng.getrandbits(128)): rng.choice(groups) for _ in range(n_companies)}
+    companies = list(company_group)
+    account_company = {uuid.UUID(int=rng.getrandbits(128)): rng.choice(companies) for _ in range(n_accounts)}
+    accounts = list(account_company)
+
+    base = datetime(2020, 1, 1)
+    rows = []
+    for i in range(n_rows):
+        kind = rng.choices(("transfer", "deposit", "withdrawal"), (8, 1, 1))[0]
+        rows.append(SimpleNamespace(
+            id=i,
+            created_at=base + timedelta(seconds=i * 60),
+            transaction_date=base + timedelta(seconds=rng.randrange(5 * 365 * 86400)),
+            amount=Decimal(rng.randrange(1, 10**8)) / 100,
+            from_account_id=rng.choice(accounts) if kind != "deposit" else None,
+            to_account_id=rng.choice(accounts) if kind != "withdrawal" else None,
+            transaction_type=kind
+        ))
+    return rows, account_company, company_group
+
+
+def load_cache(rows, account_company, company_group) -> AnalyticsCache:
+    cache = AnalyticsCache()
+    for start in range(0, len(rows), LOAD_BATCH_SIZE):
+        cache._append(rows[start:start + LOAD_BATCH_SIZE])
+        cache.recent_ids.clear()  # En la carga real se poda por la marca de agua
+
+    companies = {company: cache.companies.encode(company) for company in company_group}
+    cache.company_group = cache._translation(
+        {companies[company]: cache.groups.encode(group) for company, group in company_group.items()},
+        len(cache.companies)
+    )
+    cache.account_company = cache._translation(
+        {cache.accounts.encode(account): cache.companies.encode(company)
+         for account, company in account_company.items()},
+        len(cache.accounts)
+    )
+    return cache
+
+
+def python_top_counterparties(rows, account_company, company_id, limit=10):
+    totals = defaultdict(lambda: [Decimal("0"), 0])
+    for row in rows:
+        if row.from_account_id is None or row.to_account_id is None:
+            continue
+        if account_company[row.from_account_id] == company_id:
+            total = totals[account_company[row.to_account_id]]
+            total[0] += row.amount
+            total[1] += 1
+    ranked = sorted(totals.items(), key=lambda item: -item[1][0])[:limit]
+    return [(company, int(amount * 100), count) for company, (amount, count) in ranked]
+
+
+def python_monthly_trend(rows, account_company, company_id):
+    months = defaultdict(lambda: [Decimal("0"), Decimal("0"), 0])
+    for row in rows:
+        incoming = row.to_account_id is not None and account_company[row.to_account_id] == company_id
+        outgoing = row.from_account_id is not None and account_company[row.from_account_id] == company_id
+        if incoming or outgoing:
+            month = months[row.transaction_date.date().replace(day=1)]
+            month[0] += row.amount if incoming else 0
+            month[1] += row.amount if outgoing else 0
+            month[2] += 1
+    return [(month, int(i * 100), int(o * 100), n) for month, (i, o, n) in sorted(months.items())]
+
+
+def timed(fn, repeat: int):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def bench(n_rows: int, rng: random.Random, repeat: int):
+    rows, account_company, company_group = make_history(n_rows, rng)
+    company_id = next(iter(company_group))
+
+    start = time.perf_counter()
+    cache = load_cache(rows, account_company, company_group)
+    load_seconds = time.perf_counter() - start
+
+    used = sum(getattr(cache.columns, name).nbytes for name in cache.columns.DTYPES)
+    reserved = cache.columns.nbytes
+
+    # Mismo resultado en ambos caminos
+    top = [(cache.describe("company", code)[0], cents, count)
+           for code, cents, count in cache.top_counterparties("company", company_id)]
+    assert top == python_top_counterparties(rows, account_company, company_id)
+    assert cache.monthly_trend("company", company_id) == python_monthly_trend(rows, account_company, company_id)
+
+    t_top_py = timed(lambda: python_top_counterparties(rows, account_company, company_id), repeat)
+    t_top_np = timed(lambda: cache.top_counterparties("company", company_id), repeat)
+    t_trend_py = timed(lambda: python_monthly_trend(rows, account_company, company_id), repeat)
+    t_trend_np = timed(lambda: cache.monthly_trend("company", company_id), repeat)
+
+    print(f"{n_rows:>10}{used / n_rows:>10.1f}{used / 2**20 * 10**6 / n_rows:>12.1f}"
+          f"{reserved / 2**20:>12.1f}{load_seconds:>10.2f}"
+          f"{t_top_py * 1000:>12.1f}{t_top_np * 1000:>10.1f}"
+          f"{t_trend_py * 1000:>12.1f}{t_trend_np * 1000:>10.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[100_000, 1_000_000])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    print(f"{'filas':>10}{'B/fila':>10}{'MB/millón':>12}{'MB reserv.':>12}{'carga s':>10}"
+          f"{'top py ms':>12}{'top np':>10}{'mes py ms':>12}{'mes np':>10}")
+    for n_rows in args.rows:
+        bench(n_rows, rng, args.repeat)
+    print("\n✅ Mismos resultados con NumPy y con Python puro")
+
+
+if __name__ == "__main__":
+    main()
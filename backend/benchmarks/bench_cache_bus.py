@@ -0,0 +1,118 @@
+"""
+Latencia de invalidación entre workers (LISTEN/NOTIFY).
+
+Arranca dos procesos uvicorn independientes contra la misma base de datos
+PostgreSQL, concede y revoca un permiso a través del worker A y mide cuánto
+tarda el worker B (que tiene los permisos del usuario en su cache local) en
+reflejar el cambio.
+
+Es una comprobación manual (el repositorio no tiene tests): necesita
+PostgreSQL y dos usuarios reales. Sale con código 1 si algún cambio no llega
+al worker B o tarda más de --max-latency-ms.
+
+Uso (desde backend/, con DATABASE_URL apuntando a PostgreSQL):
+    python benchmarks/bench_cache_bus.py --supervisor admin@x.com:clave \\
+        --user usuario@x.com:clave --account <account_id> [--rounds 20] [--max-latency-ms 500]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+
+def start_worker(port: int) -> subprocess.Popen:
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        env=os.environ.copy()
+    )
+
+
+def wait_ready(base_url: str, timeout: float = 20.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"{base_url}/health").status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"El worker {base_url} no arrancó")
+
+
+def login(base_url: str, credentials: str) -> dict:
+    email, password = credentials.split(":", 1)
+    response = httpx.post(f"{base_url}/api/auth/login", data={"username": email, "password": password})
+    response.raise_for_status()
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+def wait_status(url: str, headers: dict, expected: int, timeout: float = 10.0) -> float:
+    """Sondear `url` hasta obtener `expected`; devuelve los segundos transcurridos."""
+    start = time.perf_counter()
+    while time.perf_counter() - start < timeout:
+        if httpx.get(url, headers=headers).status_code == expected:
+            return time.perf_counter() - start
+        time.sleep(0.005)
+    raise RuntimeError(f"Sin invalidación tras {timeout}s ({url} != {expected})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--supervisor", required=True, help="email:contraseña")
+    parser.add_argument("--user", required=True, help="email:contraseña (rol usuario)")
+    parser.add_argument("--account", required=True, help="cuenta sin permiso previo para el usuario")
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--ports", type=int, nargs=2, default=[8101, 8102])
+    parser.add_argument("--max-latency-ms", type=float, default=500, help="Latencia máxima admitida")
+    args = parser.parse_args()
+
+    worker_a, worker_b = (f"http://127.0.0.1:{port}" for port in args.ports)
+    processes = [start_worker(port) for port in args.ports]
+    try:
+        wait_ready(worker_a)
+        wait_ready(worker_b)
+        supervisor = login(worker_a, args.supervisor)
+        user = login(worker_b, args.user)
+        user_id = httpx.get(f"{worker_b}/api/auth/me", headers=user).json()["id"]
+        account_url = f"{worker_b}/api/accounts/{args.account}"
+
+        grant_latencies, revoke_latencies = [], []
+        for _ in range(args.rounds):
+            # Calentar la cache de B con "sin permiso"
+            wait_status(account_url, user, 403)
+
+            response = httpx.post(f"{worker_a}/api/permissions/", headers=supervisor, json={
+                "user_id": user_id, "account_id": args.account
+            })
+            response.raise_for_status()
+            grant_latencies.append(wait_status(account_url, user, 200))
+
+            httpx.delete(f"{worker_a}/api/permissions/{response.json()['id']}", headers=supervisor).raise_for_status()
+            revoke_latencies.append(wait_status(account_url, user, 403))
+
+        for name, values in (("concesión", grant_latencies), ("revocación", revoke_latencies)):
+            values = sorted(values)
+            print(f"{name:<11} mediana {statistics.median(values) * 1000:7.1f} ms   "
+                  f"máx {values[-1] * 1000:7.1f} ms")
+    except RuntimeError as exc:
+        print(f"❌ {exc}")
+        sys.exit(1)
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait()
+
+    worst = max(grant_latencies + revoke_latencies) * 1000
+    if worst > args.max_latency_ms:
+        print(f"❌ La invalidación tardó {worst:.1f} ms (máximo {args.max_latency_ms:g} ms)")
+        sys.exit(1)
+    print(f"✅ Invalidación entre workers en menos de {args.max_latency_ms:g} ms")
+
+
+if __name__ == "__main__":
+    main()
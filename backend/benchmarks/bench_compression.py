@@ -0,0 +1,106 @@
+"""
+Coste de CPU frente a bytes ahorrados al comprimir respuestas reales.
+
+Genera cargas típicas (listado de transacciones, listado de permisos y un
+mapa de flujo de operación) con los mismos esquemas que la API y mide gzip y
+brotli (si está instalado) a varios niveles.
+
+Uso (desde backend/):
+    python benchmarks/bench_compression.py [--rows 100 1000 10000]
+"""
+import argparse
+import gzip
+import random
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+sys.path.insert(0, '.')
+
+from bench_serialization import make_fixtures, make_permissions, make_transactions, _flatten
+
+from app.fast_json import compile_row_serializer, dumps
+from app.schemas import (
+    OperationFlowEdge, OperationFlowMap, OperationFlowNode, OperationResponse,
+    PermissionWithDetails, TransactionWithAccounts
+)
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+def listing_payload(schema, objects) -> bytes:
+    serializer = compile_row_serializer(schema)
+    return dumps([serializer(_flatten(obj, schema)) for obj in objects])
+
+
+def flow_payload(n_edges: int, rng: random.Random, companies) -> bytes:
+    now = datetime(2024, 1, 1)
+    edges = []
+    for i in range(n_edges):
+        src, dst = rng.sample(companies, 2)
+        edges.append(OperationFlowEdge(
+            from_company_id=src.id, from_company_name=src.name,
+            to_company_id=dst.id, to_company_name=dst.name,
+            amount=Decimal(rng.randrange(1, 10**8)) / 100,
+            transaction_id=uuid.UUID(int=rng.getrandbits(128)),
+            created_at=now + timedelta(minutes=i)
+        ))
+    nodes = [
+        OperationFlowNode(company_id=c.id, company_name=c.name, total_in=Decimal("0"), total_out=Decimal("0"))
+        for c in companies
+    ]
+    operation = OperationResponse(
+        id=uuid.uuid4(), name="Operación", status="open", created_by=None,
+        created_at=now, updated_at=now
+    )
+    return OperationFlowMap(operation=operation, nodes=nodes, edges=edges).model_dump_json().encode()
+
+
+def codecs():
+    yield "gzip-1", lambda data: gzip.compress(data, compresslevel=1)
+    yield "gzip-6", lambda data: gzip.compress(data, compresslevel=6)
+    yield "gzip-9", lambda data: gzip.compress(data, compresslevel=9)
+    if brotli is not None:
+        for quality in (1, 4, 6, 11):
+            yield f"br-{quality}", lambda data, q=quality: brotli.compress(data, quality=q)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[100, 1_000, 10_000])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    companies, accounts = make_fixtures(rng, 200)
+
+    if brotli is None:
+        print("(brotli no instalado: solo gzip)\n")
+
+    print(f"{'carga':<26}{'KB':>9}{'códec':>9}{'KB comp.':>10}{'ratio':>8}{'ms':>9}{'MB/s':>9}")
+    for n in args.rows:
+        payloads = [
+            (f"transacciones x{n}", listing_payload(TransactionWithAccounts, make_transactions(n, rng, accounts))),
+            (f"permisos x{n}", listing_payload(PermissionWithDetails, make_permissions(n, rng, accounts))),
+            (f"flujo x{n}", flow_payload(n, rng, companies)),
+        ]
+        for label, data in payloads:
+            for codec, compress in codecs():
+                best = float("inf")
+                for _ in range(args.repeat):
+                    start = time.perf_counter()
+                    compressed = compress(data)
+                    best = min(best, time.perf_counter() - start)
+                print(f"{label:<26}{len(data) / 1024:>9.0f}{codec:>9}{len(compressed) / 1024:>10.1f}"
+                      f"{len(data) / len(compressed):>7.1f}x{best * 1000:>9.2f}{len(data) / best / 1e6:>9.0f}")
+        print()
+
+
+if __name__ == "__main__":
+    main()
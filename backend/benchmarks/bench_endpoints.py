@@ -0,0 +1,312 @@
+"""
+Latencia, throughput y número de sentencias SQL de los endpoints más usados.
+
+Ejecuta la app real en el mismo proceso (transporte ASGI de httpx, sin red)
+contra la base de datos de DATABASE_URL, que debe tener datos (por ejemplo
+generados con generate_data.py). Para cada endpoint:
+
+- Fase de latencia: peticiones secuenciales; p50/p95/p99 y sentencias SQL
+  por petición (count_queries).
+- Fase de throughput: peticiones concurrentes (--concurrency), peticiones/s.
+
+Los resultados se guardan en JSON (--output) y se pueden comparar con una
+ejecución anterior (--baseline): sale con código 1 si el p95 empeora más de
+--latency-tolerance o si aumentan las sentencias SQL más de
+--query-tolerance. Los presupuestos de consultas de las rutas se comprueban
+en modo "raise": si una petición excede el suyo, sale con código 1.
+
+El endpoint de transferencias escribe en la base de datos: usa dos cuentas
+propias del benchmark en una misma empresa (sin flujos entre empresas ni
+grupos que detectar) y, al terminar, borra esas cuentas con sus movimientos
+y agregados. Se mide el último, así que los listados no ven sus movimientos
+y los datos sembrados quedan como estaban entre ejecuciones.
+
+Uso (desde backend/):
+    python generate_data.py --truncate --transactions 1000000
+    python benchmarks/bench_endpoints.py --output baseline.json
+    python benchmarks/bench_endpoints.py --baseline baseline.json [--latency-tolerance 0.2]
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+from decimal import Decimal
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+import httpx
+
+sys.path.insert(0, '.')
+# Antes de importar la app, que lee la configuración al crearse
+os.environ["QUERY_BUDGET_MODE"] = "raise"
+
+from sqlalchemy import func, or_
+
+from app.auth import create_access_token
+from app.cache_bus import HIERARCHY_KEY, HISTORY_VERSION_KEY
+from app.database import SessionLocal, get_engine
+from app.http_cache import bump_balances, bump_versions
+from app.main import app, lifespan
+from app.models import Account, AccountPermission, CashflowRollup, Company, Operation, Transaction, User
+from app.query_budget import QueryBudgetExceeded, count_queries
+
+
+class Endpoint(NamedTuple):
+    name: str
+    method: str
+    path: Callable[[Dict], str]
+    role: str = "supervisor"
+    body: Optional[Callable[[Dict, int], dict]] = None
+
+
+def transfer_body(fixtures: Dict, i: int) -> dict:
+    # Ida y vuelta entre las cuentas del benchmark (con saldo de sobra también en la fase concurrente)
+    source, target = fixtures["transfer_accounts"]
+    if i % 2:
+        source, target = target, source
+    return {"from_account_id": source, "to_account_id": target, "amount": "0.01", "description": "Benchmark"}
+
+
+ENDPOINTS = [
+    Endpoint("transactions", "GET", lambda f: "/api/transactions/?limit=50"),
+    Endpoint("transactions_compact", "GET", lambda f: "/api/transactions/?limit=50&format=compact"),
+    Endpoint("transactions_account", "GET", lambda f: f"/api/transactions/?account_id={f['account_id']}&limit=50"),
+    Endpoint("transactions_user", "GET", lambda f: "/api/transactions/?limit=50", role="user"),
+    Endpoint("accounts", "GET", lambda f: "/api/accounts/"),
+    Endpoint("companies", "GET", lambda f: "/api/companies/"),
+    Endpoint("companies_user", "GET", lambda f: "/api/companies/", role="user"),
+    Endpoint("companies_page", "GET", lambda f: "/api/companies/?limit=100"),
+    Endpoint("groups", "GET", lambda f: "/api/groups/"),
+    Endpoint("users", "GET", lambda f: "/api/users/?limit=100"),
+    Endpoint("operations", "GET", lambda f: "/api/operations/?limit=100"),
+    Endpoint("groups_balance", "GET", lambda f: "/api/operations/summary/groups-balance"),
+    Endpoint("flow_map", "GET", lambda f: f"/api/operations/{f['operation_id']}/flow"),
+    Endpoint("dashboard", "GET", lambda f: "/api/operations/summary/dashboard"),
+    Endpoint("dashboard_user", "GET", lambda f: "/api/operations/summary/dashboard", role="user"),
+    Endpoint("pending_groups", "GET", lambda f: "/api/pending-entries/summary/groups"),
+    # Escribe: el último, para que los listados anteriores solo vean los datos sembrados
+    Endpoint("transfer", "POST", lambda f: "/api/transactions/transfer", body=transfer_body),
+]
+
+TRANSFER_ACCOUNT_NAMES = ("Benchmark transferencias A", "Benchmark transferencias B")
+TRANSFER_ACCOUNT_BALANCE = Decimal("1000000.00")
+
+
+def load_fixtures() -> Dict:
+    """Usuarios, cuentas y operación de referencia (los de más datos)."""
+    db = SessionLocal()
+    try:
+        supervisor = db.query(User).filter(User.role == "supervisor", User.is_active == True).order_by(User.email).first()
+        user = db.query(User).join(AccountPermission, AccountPermission.user_id == User.id).filter(
+            User.role == "user", User.is_active == True
+        ).group_by(User.id).order_by(func.count(AccountPermission.id).desc(), User.id).first()
+        busiest_account = db.query(Transaction.from_account_id).filter(
+            Transaction.from_account_id != None
+        ).group_by(Transaction.from_account_id).order_by(func.count().desc()).limit(1).scalar()
+        operation_id = db.query(Transaction.operation_id).filter(
+            Transaction.operation_id != None
+        ).group_by(Transaction.operation_id).order_by(func.count().desc()).limit(1).scalar()
+        if operation_id is None:
+            operation_id = db.query(Operation.id).limit(1).scalar()
+
+        if not supervisor or not user or not busiest_account or operation_id is None:
+            raise SystemExit("La base de datos no tiene datos suficientes: ejecuta generate_data.py")
+
+        return {
+            "tokens": {
+                "supervisor": create_access_token({"sub": str(supervisor.id)}),
+                "user": create_access_token({"sub": str(user.id)}),
+            },
+            "transfer_accounts": create_transfer_accounts(db),
+            "account_id": str(busiest_account),
+            "operation_id": str(operation_id),
+        }
+    finally:
+        db.close()
+
+
+def create_transfer_accounts(db) -> List[str]:
+    """Dos cuentas corrientes nuevas en la misma empresa, solo para el benchmark."""
+    company_id = db.query(Company.id).filter(Company.is_active == True).order_by(Company.id).limit(1).scalar()
+    if company_id is None:
+        raise SystemExit("La base de datos no tiene empresas: ejecuta generate_data.py")
+
+    accounts = [
+        Account(company_id=company_id, name=name, account_type="corriente", currency="EUR", balance=TRANSFER_ACCOUNT_BALANCE)
+        for name in TRANSFER_ACCOUNT_NAMES
+    ]
+    db.add_all(accounts)
+    bump_versions(db, "accounts", HIERARCHY_KEY)
+    db.commit()
+    return [str(account.id) for account in accounts]
+
+
+def remove_transfer_accounts() -> None:
+    """
+    Borrar las cuentas del benchmark con sus movimientos y agregados (también
+    las que dejara una ejecución interrumpida).
+    """
+    db = SessionLocal()
+    try:
+        accounts = db.query(Account).filter(Account.name.in_(TRANSFER_ACCOUNT_NAMES)).all()
+        if not accounts:
+            return
+        ids = [account.id for account in accounts]
+        db.query(CashflowRollup).filter(CashflowRollup.account_id.in_(ids)).delete(synchronize_session=False)
+        removed = db.query(Transaction).filter(
+            or_(Transaction.from_account_id.in_(ids), Transaction.to_account_id.in_(ids))
+        ).delete(synchronize_session=False)
+        bump_balances(db, *accounts, keys=["accounts", HIERARCHY_KEY, HISTORY_VERSION_KEY])
+        for account in accounts:
+            db.delete(account)
+        db.commit()
+        print(f"Cuentas del benchmark eliminadas ({removed} movimientos)")
+    finally:
+        db.close()
+
+
+def percentile(samples: List[float], p: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(p / 100 * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+
+async def request(client: httpx.AsyncClient, endpoint: Endpoint, fixtures: Dict, i: int) -> httpx.Response:
+    headers = {"Authorization": f"Bearer {fixtures['tokens'][endpoint.role]}"}
+    body = endpoint.body(fixtures, i) if endpoint.body else None
+    response = await client.request(endpoint.method, endpoint.path(fixtures), json=body, headers=headers)
+    if response.status_code >= 400:
+        raise SystemExit(f"{endpoint.name}: HTTP {response.status_code} {response.text[:300]}")
+    return response
+
+
+async def measure(client, endpoint: Endpoint, fixtures: Dict, args) -> Dict:
+    for i in range(args.warmup):
+        await request(client, endpoint, fixtures, i)
+
+    latencies = []
+    statements = []
+    for i in range(args.iterations):
+        # Peticiones secuenciales: todo lo que cuenta el bloque es de esta
+        with count_queries() as counter:
+            started = time.perf_counter()
+            await request(client, endpoint, fixtures, i)
+            latencies.append((time.perf_counter() - started) * 1000)
+        statements.append(counter.count)
+
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def limited(i):
+        async with semaphore:
+            await request(client, endpoint, fixtures, i)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(limited(i) for i in range(args.throughput_requests)))
+    elapsed = time.perf_counter() - started
+
+    return {
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p95_ms": round(percentile(latencies, 95), 2),
+        "p99_ms": round(percentile(latencies, 99), 2),
+        "mean_ms": round(statistics.fmean(latencies), 2),
+        "throughput_rps": round(args.throughput_requests / elapsed, 1),
+        "statements": int(statistics.median(statements)),
+        "statements_max": max(statements),
+    }
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: Dict, baseline: Dict, latency_tolerance: float, query_tolerance: int) -> List[str]:
+    """Regresiones respecto a la ejecución de referencia."""
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get("results", {}).get(name)
+        if previous is None:
+            continue
+        if current["p95_ms"] > previous["p95_ms"] * (1 + latency_tolerance):
+            regressions.append(f"{name}: p95 {previous['p95_ms']} -> {current['p95_ms']} ms")
+        if current["statements"] > previous["statements"] + query_tolerance:
+            regressions.append(f"{name}: sentencias SQL {previous['statements']} -> {current['statements']}")
+    return regressions
+
+
+async def run(args) -> Dict:
+    endpoints = [e for e in ENDPOINTS if not args.only or e.name in args.only]
+    async with lifespan(app):
+        remove_transfer_accounts()
+        fixtures = load_fixtures()
+        try:
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+                results = {}
+                print(f"{'endpoint':<22} {'p50':>8} {'p95':>8} {'p99':>8} {'req/s':>8} {'SQL':>5}")
+                for endpoint in endpoints:
+                    result = results[endpoint.name] = await measure(client, endpoint, fixtures, args)
+                    print(
+                        f"{endpoint.name:<22} {result['p50_ms']:>8} {result['p95_ms']:>8} {result['p99_ms']:>8} "
+                        f"{result['throughput_rps']:>8} {result['statements']:>5}"
+                    )
+        finally:
+            remove_transfer_accounts()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=50, help="Peticiones secuenciales por endpoint")
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--throughput-requests", type=int, default=100)
+    parser.add_argument("--only", nargs="+", help="Solo estos endpoints")
+    parser.add_argument("--output", help="Guardar los resultados en este JSON")
+    parser.add_argument("--baseline", help="JSON de una ejecución anterior con el que comparar")
+    parser.add_argument("--latency-tolerance", type=float, default=0.2, help="Empeoramiento de p95 admitido (0.2 = 20%%)")
+    parser.add_argument("--query-tolerance", type=int, default=0, help="Sentencias SQL de más admitidas")
+    args = parser.parse_args()
+
+    try:
+        results = asyncio.run(run(args))
+    except QueryBudgetExceeded as e:
+        print(f"\n❌ {e}")
+        sys.exit(1)
+    report = {
+        "commit": git_commit(),
+        "created_at": datetime.utcnow().isoformat(timespec="seconds"),
+        "database": get_engine().dialect.name,
+        "settings": {
+            "iterations": args.iterations, "warmup": args.warmup,
+            "concurrency": args.concurrency, "throughput_requests": args.throughput_requests,
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResultados guardados en {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.latency_tolerance, args.query_tolerance)
+        if regressions:
+            print(f"\n❌ Regresiones respecto a {baseline.get('commit') or args.baseline}:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print(f"\n✅ Sin regresiones respecto a {baseline.get('commit') or args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Tiempo de importación de la app (arranque de cada worker).
+
+Importa `app.main` en procesos nuevos con `python -X importtime`, contra una
+base de datos inalcanzable: importar no debe conectar ni cargar el driver.
+Muestra la mediana, los módulos más caros y falla (código 1) si el mejor
+tiempo supera el presupuesto o si se importan módulos que deben cargarse
+más tarde (NumPy con la primera consulta analítica, el driver al crear el
+motor en el lifespan).
+
+Uso (desde backend/):
+    python benchmarks/bench_import.py [--runs 5] [--budget-ms 1500] [--top 15]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+# Se cargan en el primer uso, no al importar la app
+DEFERRED_MODULES = ("numpy", "psycopg2", "psycopg", "asyncpg")
+
+UNREACHABLE_DATABASE_URL = "postgresql://nobody@127.0.0.1:1/none"
+
+PROBE = (
+    "import sys, app.main; "
+    f"print(','.join(name for name in {DEFERRED_MODULES!r} if name in sys.modules))"
+)
+
+
+def import_once():
+    """(tiempos por módulo en µs: {módulo: (propio, acumulado)}, módulos diferidos importados)"""
+    env = dict(os.environ, DATABASE_URL=UNREACHABLE_DATABASE_URL, PYTHONDONTWRITEBYTECODE="1")
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", PROBE],
+        capture_output=True, text=True, env=env
+    )
+    if result.returncode != 0:
+        print(result.stderr[-2000:])
+        raise SystemExit("❌ La app no se puede importar sin base de datos")
+
+    timings = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        own, cumulative, name = line[len("import time:"):].split("|")
+        timings[name.strip()] = (int(own), int(cumulative))
+    loaded = [name for name in result.stdout.strip().split(",") if name]
+    return timings, loaded
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=1500.0, help="Máximo para el mejor tiempo de importación")
+    parser.add_argument("--top", type=int, default=15, help="Módulos más caros a mostrar")
+    args = parser.parse_args()
+
+    totals = []
+    last = {}
+    loaded = []
+    for _ in range(args.runs):
+        last, loaded = import_once()
+        totals.append(last["app.main"][1] / 1000)
+
+    best = min(totals)
+    print(f"import app.main ({args.runs} procesos)")
+    print(f"  mejor {best:.0f} ms   mediana {statistics.median(totals):.0f} ms   peor {max(totals):.0f} ms")
+
+    print("\nMódulos de la app (acumulado, última ejecución):")
+    app_modules = sorted(
+        ((cumulative, name) for name, (_, cumulative) in last.items() if name.startswith("app.")), reverse=True
+    )
+    for cumulative, name in app_modules[:args.top]:
+        print(f"  {cumulative / 1000:8.1f} ms  {name}")
+
+    print("\nMódulos con más tiempo propio:")
+    for own, name in sorted(((own, name) for name, (own, _) in last.items()), reverse=True)[:args.top]:
+        print(f"  {own / 1000:8.1f} ms  {name}")
+
+    ok = True
+    if loaded:
+        ok = False
+        print(f"\n❌ Se importan al arrancar: {', '.join(loaded)}")
+    if best > args.budget_ms:
+        ok = False
+        print(f"\n❌ {best:.0f} ms supera el presupuesto de {args.budget_ms:.0f} ms")
+    if ok:
+        print(f"\n✅ Dentro del presupuesto ({best:.0f} / {args.budget_ms:.0f} ms)")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+Velocidad del algoritmo de compensación de apuntes pendientes (app.netting).
+
+Genera apuntes aleatorios entre grupos, agrega los saldos netos (en la API
+lo hace SQL) y mide `min_cash_flow`. Comprueba que las transferencias
+propuestas dejan todos los saldos a cero y que no pasan de grupos - 1.
+
+No necesita base de datos. Uso (desde backend/):
+    python benchmarks/bench_netting.py [--groups 1000 5000] [--entries 500000]
+"""
+import argparse
+import random
+import sys
+import time
+from collections import defaultdict
+
+sys.path.insert(0, '.')
+
+from app.netting import min_cash_flow
+
+
+def make_positions(n_groups: int, n_entries: int, rng: random.Random):
+    positions = defaultdict(int)
+    for _ in range(n_entries):
+        debtor, creditor = rng.sample(range(n_groups), 2)
+        cents = rng.randrange(1, 10**7)
+        positions[debtor] -= cents
+        positions[creditor] += cents
+    return dict(positions)
+
+
+def bench(n_groups: int, n_entries: int, rng: random.Random):
+    positions = make_positions(n_groups, n_entries, rng)
+
+    start = time.perf_counter()
+    transfers = min_cash_flow(positions)
+    elapsed = time.perf_counter() - start
+
+    remaining = dict(positions)
+    for debtor, creditor, cents in transfers:
+        assert cents > 0
+        remaining[debtor] += cents
+        remaining[creditor] -= cents
+    assert not any(remaining.values())
+    assert len(transfers) <= len(positions) - 1
+
+    print(f"{n_groups:>8}{n_entries:>10}{len(transfers):>16}{elapsed * 1000:>10.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--groups", type=int, nargs="+", default=[100, 1000, 5000])
+    parser.add_argument("--entries", type=int, default=200_000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    print(f"{'grupos':>8}{'apuntes':>10}{'transferencias':>16}{'ms':>10}")
+    for n_groups in args.groups:
+        bench(n_groups, args.entries, rng)
+    print("\n✅ Todas las propuestas saldan los apuntes")
+
+
+if __name__ == "__main__":
+    main()
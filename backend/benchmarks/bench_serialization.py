@@ -0,0 +1,148 @@
+"""
+Micro-benchmark de serialización de listados grandes.
+
+Compara el camino estándar de FastAPI (objetos ORM validados con
+`from_attributes` y volcados con el TypeAdapter del `response_model`) con el
+camino rápido de app.fast_json (filas planas + plan precompilado + orjson).
+Antes de medir comprueba que ambos producen exactamente los mismos bytes.
+
+No necesita base de datos. Uso (desde backend/):
+    python benchmarks/bench_serialization.py [--sizes 1000 10000 100000]
+"""
+import argparse
+import random
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import List
+
+sys.path.insert(0, '.')
+
+from pydantic import TypeAdapter
+
+from app.fast_json import compile_row_serializer, dumps
+from app.models import Account, AccountPermission, Company, Transaction, User
+from app.schemas import AccountWithCompany, PermissionWithDetails, TransactionWithAccounts
+
+
+def _flatten(obj, schema, path=""):
+    """Fila plana equivalente a lo que devuelve la consulta Core."""
+    from app.fast_json import _key, _nested_model
+    row = {}
+    for name, field in schema.model_fields.items():
+        nested, _ = _nested_model(field.annotation)
+        value = getattr(obj, name) if obj is not None else None
+        if nested is not None:
+            row.update(_flatten(value, nested, _key(path, name)))
+        else:
+            row[_key(path, name)] = value
+    return row
+
+
+def make_fixtures(rng: random.Random, n_accounts: int = 50):
+    base = datetime(2024, 1, 1, 9, 30)
+    companies = [
+        Company(id=uuid.UUID(int=rng.getrandbits(128)), name=f"Compañía {i}", description=None if i % 3 else "Descripción ñ",
+                group_id=None, created_by=None, is_active=True, created_at=base)
+        for i in range(max(1, n_accounts // 5))
+    ]
+    accounts = []
+    for i in range(n_accounts):
+        company = companies[i % len(companies)]
+        account_type = ("corriente", "credito", "confirming")[i % 3]
+        accounts.append(Account(
+            id=uuid.UUID(int=rng.getrandbits(128)), company_id=company.id, company=company,
+            name=f"Cuenta {i}", iban=None if i % 4 == 0 else f"ES{rng.randrange(10**20):022d}",
+            account_type=account_type, currency="EUR",
+            balance=Decimal(rng.randrange(-10**7, 10**7)) / 100,
+            credit_limit=Decimal(rng.randrange(0, 10**7)) / 100,
+            is_active=True, created_at=base + timedelta(seconds=i, microseconds=i * 7)
+        ))
+    return companies, accounts
+
+
+def make_transactions(n: int, rng: random.Random, accounts) -> list:
+    base = datetime(2024, 1, 1, 9, 30)
+    rows = []
+    for i in range(n):
+        kind = ("transfer", "transfer", "deposit", "withdrawal")[i % 4]
+        from_account = rng.choice(accounts) if kind in ("transfer", "withdrawal") else None
+        to_account = rng.choice(accounts) if kind in ("transfer", "deposit") else None
+        created = base + timedelta(minutes=i, microseconds=rng.randrange(0, 2) * 123456)
+        rows.append(Transaction(
+            id=uuid.UUID(int=rng.getrandbits(128)),
+            from_account_id=from_account.id if from_account else None, from_account=from_account,
+            to_account_id=to_account.id if to_account else None, to_account=to_account,
+            amount=Decimal(rng.randrange(1, 10**8)) / 100, description=f"Pago «{i}»" if i % 5 else None,
+            transaction_type=kind, status="completed", operation_id=None,
+            from_balance_after=Decimal("10.00") if from_account else None,
+            to_balance_after=Decimal("-5.50") if to_account else None,
+            transaction_date=created, created_by=None, created_at=created
+        ))
+    return rows
+
+
+def make_permissions(n: int, rng: random.Random, accounts) -> list:
+    base = datetime(2024, 1, 1, 9, 30)
+    users = [
+        User(id=uuid.UUID(int=rng.getrandbits(128)), email=f"user{i}@example.com", full_name=f"Usuario {i}",
+             role="user", is_active=True, created_at=base)
+        for i in range(max(1, n // 20))
+    ]
+    rows = []
+    for i in range(n):
+        user = users[i % len(users)]
+        account = accounts[i % len(accounts)]
+        rows.append(AccountPermission(
+            id=uuid.UUID(int=rng.getrandbits(128)), user_id=user.id, user=user, account_id=account.id, account=account,
+            can_view=True, can_transfer=bool(i % 2), granted_by=None, created_at=base
+        ))
+    return rows
+
+
+def bench(label, schema, objects, repeat):
+    adapter = TypeAdapter(List[schema])
+    serializer = compile_row_serializer(schema)
+    flat_rows = [_flatten(obj, schema) for obj in objects]
+
+    standard = adapter.dump_json(adapter.validate_python(objects))
+    fast = dumps([serializer(row) for row in flat_rows])
+    if standard != fast:
+        raise SystemExit(f"❌ {label}: la salida no es idéntica")
+
+    def timed(fn):
+        best = float("inf")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            fn()
+            best = min(best, time.perf_counter() - start)
+        return best
+
+    t_standard = timed(lambda: adapter.dump_json(adapter.validate_python(objects)))
+    t_fast = timed(lambda: dumps([serializer(row) for row in flat_rows]))
+    print(f"{label:<24}{len(objects):>8}{t_standard * 1000:>14.1f}{t_fast * 1000:>12.1f}"
+          f"{t_standard / t_fast:>9.1f}x{len(fast) / 1024:>11.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    _, accounts = make_fixtures(rng)
+
+    print(f"{'listado':<24}{'filas':>8}{'estándar ms':>14}{'rápido ms':>12}{'mejora':>10}{'KB':>11}")
+    for n in args.sizes:
+        bench("TransactionWithAccounts", TransactionWithAccounts, make_transactions(n, rng, accounts), args.repeat)
+        bench("PermissionWithDetails", PermissionWithDetails, make_permissions(n, rng, accounts), args.repeat)
+        bench("AccountWithCompany", AccountWithCompany, make_fixtures(rng, n)[1], args.repeat)
+    print("\n✅ Salida idéntica byte a byte en todos los casos")
+
+
+if __name__ == "__main__":
+    main()
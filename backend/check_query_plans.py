@@ -0,0 +1,160 @@
+"""
+Comprueba con EXPLAIN que las consultas frecuentes usan sus índices.
+
+Cada consulta se construye igual que en los routers y se planifica con
+enable_seqscan desactivado: en una base de datos pequeña el planificador
+prefiere recorrer la tabla aunque el índice exista, así que lo que se
+comprueba es que el índice existe y sirve para la consulta. No modifica
+datos (todo ocurre en una transacción que se deshace).
+
+Sale con código 1 si alguna consulta no usa el índice esperado, para poder
+usarlo en CI después de `alembic upgrade head`.
+
+Uso: python check_query_plans.py [--verbose]
+"""
+import argparse
+import json
+import sys
+import uuid
+sys.path.insert(0, '.')
+
+from sqlalchemy import or_, select, text, tuple_
+
+from app.database import engine
+from app.models import Account, Attachment, Company, Group, Operation, PendingEntry, Transaction
+
+SAMPLE_ID = uuid.UUID(int=1)
+
+# (descripción, consulta, índices que deben aparecer en el plan)
+CHECKS = [
+    (
+        "Movimientos de una cuenta",
+        select(Transaction.id).where(or_(
+            Transaction.from_account_id == SAMPLE_ID, Transaction.to_account_id == SAMPLE_ID
+        )),
+        {"ix_transactions_from_account_created", "ix_transactions_to_account_created"},
+    ),
+    (
+        "Movimientos de una operación",
+        select(Transaction.id).where(Transaction.operation_id == SAMPLE_ID),
+        {"ix_transactions_operation_id"},
+    ),
+    (
+        "Movimientos por fecha (informes)",
+        select(Transaction.id).where(Transaction.transaction_date >= text("now() - interval '30 days'")),
+        {"ix_transactions_transaction_date"},
+    ),
+    (
+        "Listado de movimientos (más recientes primero)",
+        select(Transaction.id).order_by(Transaction.created_at.desc()).limit(50),
+        {"ix_transactions_created_at"},
+    ),
+    (
+        "Adjuntos de un movimiento",
+        select(Attachment.id).where(Attachment.transaction_id == SAMPLE_ID),
+        {"ix_attachments_transaction_id"},
+    ),
+    (
+        "Apuntes pendientes (más recientes primero)",
+        select(PendingEntry.id).where(PendingEntry.status == "pending").order_by(PendingEntry.created_at.desc()),
+        {"ix_pending_entries_status_created"},
+    ),
+    (
+        "Apuntes de un grupo",
+        select(PendingEntry.id).where(
+            or_(PendingEntry.from_group_id == SAMPLE_ID, PendingEntry.to_group_id == SAMPLE_ID)
+        ),
+        {"ix_pending_entries_from_group_status", "ix_pending_entries_to_group_status"},
+    ),
+    (
+        "Apuntes de una operación",
+        select(PendingEntry.id).where(or_(
+            PendingEntry.operation_id == SAMPLE_ID, PendingEntry.settled_in_operation_id == SAMPLE_ID
+        )),
+        {"ix_pending_entries_operation_id", "ix_pending_entries_settled_in_operation_id"},
+    ),
+    (
+        "Cuentas activas de una empresa",
+        select(Account.id).where(Account.company_id == SAMPLE_ID, Account.is_active == True),
+        {"ix_accounts_company_active"},
+    ),
+    (
+        "Empresas activas de un grupo",
+        select(Company.id).where(Company.group_id == SAMPLE_ID, Company.is_active == True),
+        {"ix_companies_group_active"},
+    ),
+    (
+        "Listado de grupos (página siguiente)",
+        select(Group.id).where(
+            Group.is_active == True, tuple_(Group.name, Group.id) > tuple_("M", SAMPLE_ID)
+        ).order_by(Group.name, Group.id).limit(101),
+        {"ix_groups_name_keyset"},
+    ),
+    (
+        "Listado de empresas (página siguiente)",
+        select(Company.id).where(
+            Company.is_active == True, tuple_(Company.name, Company.id) > tuple_("M", SAMPLE_ID)
+        ).order_by(Company.name, Company.id).limit(101),
+        {"ix_companies_name_keyset"},
+    ),
+    (
+        "Listado de operaciones (página siguiente)",
+        select(Operation.id).where(
+            tuple_(Operation.created_at, Operation.id) < tuple_(text("now()"), SAMPLE_ID)
+        ).order_by(Operation.created_at.desc(), Operation.id.desc()).limit(101),
+        {"ix_operations_created_keyset"},
+    ),
+]
+
+
+def plan_indexes(node) -> set:
+    """Índices usados en cualquier nodo del plan."""
+    found = {node["Index Name"]} if "Index Name" in node else set()
+    for child in node.get("Plans", []):
+        found |= plan_indexes(child)
+    return found
+
+
+def explain(conn, statement) -> dict:
+    compiled = statement.compile(dialect=conn.dialect)
+    plan = conn.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {compiled}", compiled.params).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return plan[0]["Plan"]
+
+
+def check_query_plans(verbose: bool = False) -> bool:
+    if engine.dialect.name != "postgresql":
+        print("Las comprobaciones de planes requieren PostgreSQL")
+        return False
+
+    failures = 0
+    with engine.connect() as conn:
+        with conn.begin() as transaction:
+            conn.execute(text("SET LOCAL enable_seqscan = off"))
+            for description, statement, expected in CHECKS:
+                plan = explain(conn, statement)
+                missing = expected - plan_indexes(plan)
+                if missing:
+                    failures += 1
+                    print(f"  ❌ {description}: no usa {', '.join(sorted(missing))}")
+                    print(json.dumps(plan, indent=2))
+                else:
+                    print(f"  ✅ {description}")
+                    if verbose:
+                        print(json.dumps(plan, indent=2))
+            transaction.rollback()
+
+    if failures:
+        print(f"\n❌ {failures} de {len(CHECKS)} consultas sin su índice")
+        return False
+    print(f"\n✅ Las {len(CHECKS)} consultas usan sus índices")
+    return True
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--verbose", action="store_true", help="Mostrar también los planes correctos")
+    args = parser.parse_args()
+
+    sys.exit(0 if check_query_plans(args.verbose) else 1)
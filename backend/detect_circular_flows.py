@@ -0,0 +1,39 @@
+"""
+Script para buscar flujos circulares (A→B→C→A) entre empresas y grupos en
+una ventana de días y registrarlos en `circular_flow_alerts`. Pensado para
+ejecutarse periódicamente (cron); las transferencias nuevas ya se comprueban
+al crearse, este análisis completo cubre ediciones y borrados.
+
+Uso: python detect_circular_flows.py [--days 30] [--max-length 5] [--level company]
+"""
+import argparse
+import sys
+sys.path.insert(0, '.')
+
+from app.cycles import scan_circular_flows
+from app.database import SessionLocal
+
+
+def detect(levels, days=None, max_length=None):
+    db = SessionLocal()
+    try:
+        for level in levels:
+            components, cycles = scan_circular_flows(db, level, days, max_length)
+            db.commit()
+            print(f"✅ {level}: {len(components)} componentes con ciclos, {len(cycles)} ciclos")
+    except Exception as e:
+        db.rollback()
+        print(f"Error: {e}")
+        raise
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--days", type=int)
+    parser.add_argument("--max-length", type=int)
+    parser.add_argument("--level", choices=["company", "group", "all"], default="all")
+    args = parser.parse_args()
+
+    detect(["company", "group"] if args.level == "all" else [args.level], args.days, args.max_length)
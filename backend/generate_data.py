@@ -0,0 +1,521 @@
+"""
+Generador de datos sintéticos a escala de producción para pruebas de carga
+y benchmarks (solo PostgreSQL).
+
+Crea grupos, empresas, cuentas (mezcla de corriente, crédito y confirming),
+usuarios con permisos de cuenta, empresa y grupo, operaciones, apuntes
+pendientes y el histórico de transacciones:
+
+- Todo se escribe con COPY en una sola transacción (o se carga todo o nada).
+- Es determinista: la misma semilla y los mismos volúmenes generan los
+  mismos datos (IDs, importes, fechas), así los benchmarks son comparables.
+- Las transacciones se generan en orden cronológico llevando el saldo de cada
+  cuenta, así que `from_balance_after` / `to_balance_after` forman cadenas
+  coherentes y el saldo final de cada cuenta es el de su último movimiento.
+  Se respetan las reglas de la API: las corrientes no quedan en negativo, el
+  crédito y el confirming no superan su límite, el confirming no recibe
+  transferencias y sus liquidaciones se cargan en una corriente.
+- Al terminar recalcula los agregados de flujo de caja, invalida las caches
+  de los workers (cache_versions) y ejecuta ANALYZE.
+
+Todos los usuarios tienen la contraseña "bench123"; los supervisores son
+supervisor0@example.test, supervisor1@example.test...
+
+Uso (volúmenes por defecto, ~1 millón de transacciones):
+    python generate_data.py --truncate
+    python generate_data.py --truncate --seed 7 --transactions 20000000 --accounts 50000
+"""
+import argparse
+import io
+import math
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from itertools import islice
+sys.path.insert(0, '.')
+
+from sqlalchemy import text
+
+from app.auth import pwd_context
+from app.cashflow import rebuild_rollups
+from app.database import SessionLocal, engine
+from app.models import Base
+
+PASSWORD = "bench123"
+PASSWORD_SALT = "syntheticdatageneratoO"  # Sal fija: el hash también es reproducible
+COPY_CHUNK_ROWS = 50_000
+
+ACCOUNT_TYPES = [("corriente", 0.75), ("credito", 0.15), ("confirming", 0.10)]
+ACCOUNT_LABELS = {"corriente": "Cuenta corriente", "credito": "Póliza de crédito", "confirming": "Confirming"}
+BANKS = ["BBVA", "Santander", "CaixaBank", "Sabadell", "Bankinter", "Unicaja", "Kutxabank", "Abanca", "Ibercaja"]
+SECTORS = [
+    "Hostelería", "Tecnología", "Construcción", "Logística", "Alimentación", "Textil",
+    "Inmobiliaria", "Energía", "Salud", "Educación", "Automoción", "Turismo"
+]
+COMPANY_PREFIXES = [
+    "Restaurante", "Café", "Talleres", "Distribuciones", "Construcciones", "Inversiones",
+    "Servicios", "Comercial", "Transportes", "Consultoría", "Clínica", "Hotel"
+]
+COMPANY_SUFFIXES = ["SL", "SA", "SLU", "Cooperativa"]
+FIRST_NAMES = [
+    "Juan", "María", "José", "Carmen", "Antonio", "Ana", "Manuel", "Laura", "Francisco", "Isabel",
+    "David", "Lucía", "Javier", "Marta", "Daniel", "Elena", "Pablo", "Sara", "Carlos", "Paula"
+]
+SURNAMES = [
+    "García", "Rodríguez", "González", "Fernández", "López", "Martínez", "Sánchez", "Pérez",
+    "Gómez", "Martín", "Jiménez", "Ruiz", "Hernández", "Díaz", "Moreno", "Álvarez", "Romero", "Navarro"
+]
+DESCRIPTIONS = [
+    "Pago factura F-{n}", "Transferencia interna {n}", "Traspaso de tesorería", "Pago a proveedor {n}",
+    "Cobro cliente {n}", "Nómina", "Alquiler local", "Préstamo entre empresas", "Devolución {n}"
+]
+
+
+# ============ FORMATO COPY ============
+
+def new_id(rng: random.Random) -> str:
+    """UUID como 32 dígitos hexadecimales (PostgreSQL los acepta sin guiones)."""
+    return "%032x" % rng.getrandbits(128)
+
+
+def money(cents: int) -> str:
+    sign = "-" if cents < 0 else ""
+    cents = abs(cents)
+    return f"{sign}{cents // 100}.{cents % 100:02d}"
+
+
+EPOCH = datetime(1970, 1, 1)
+
+
+def timestamp(seconds: int) -> str:
+    return (EPOCH + timedelta(seconds=seconds)).isoformat(" ")
+
+
+def copy_value(value) -> str:
+    if value is None:
+        return "\\N"
+    if value is True:
+        return "t"
+    if value is False:
+        return "f"
+    return str(value).replace("\\", "\\\\").replace("\t", " ").replace("\n", " ")
+
+
+def copy_line(row) -> str:
+    return "\t".join(map(copy_value, row)) + "\n"
+
+
+def copy_lines(connection, table: str, columns, lines) -> int:
+    """COPY de líneas ya formateadas, en bloques de COPY_CHUNK_ROWS filas."""
+    sql = f"COPY {table} ({', '.join(columns)}) FROM STDIN"
+    cursor = connection.cursor()
+    count = 0
+    lines = iter(lines)
+    while True:
+        chunk = list(islice(lines, COPY_CHUNK_ROWS))
+        if not chunk:
+            break
+        data = "".join(chunk)
+        if hasattr(cursor, "copy_expert"):  # psycopg2
+            cursor.copy_expert(sql, io.StringIO(data))
+        else:  # psycopg 3
+            with cursor.copy(sql) as copy:
+                copy.write(data)
+        count += len(chunk)
+    cursor.close()
+    return count
+
+
+def spanish_iban(rng: random.Random) -> str:
+    """IBAN español con dígitos de control válidos (ES = 14 28)."""
+    bban = "".join(str(rng.randrange(10)) for _ in range(20))
+    check = 98 - int(bban + "142800") % 97
+    return f"ES{check:02d}{bban}"
+
+
+# ============ GENERADOR ============
+
+class SyntheticDataset:
+    """Filas de cada tabla, generadas en orden y de forma determinista."""
+
+    def __init__(self, args):
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.start = int((datetime.fromisoformat(args.start) - EPOCH).total_seconds())
+        self.span = args.days * 86400
+
+        self.users = []        # (id, role)
+        self.supervisors = []
+        self.groups = []
+        self.companies = []    # (id, group_id)
+        self.accounts = []     # índices paralelos: id, tipo, límite, empresa, grupo
+        self.account_types = []
+        self.account_limits = []
+        self.account_company = []
+        self.account_group = []
+        self.active_accounts = []
+        self.operations = []   # (id, created_at)
+        self.balances = []
+
+    def _when(self, fraction: float) -> int:
+        return self.start + int(fraction * self.span)
+
+    def _amount(self) -> int:
+        """Importe en céntimos: log-normal centrado en ~500 €, entre 1 € y 500.000 €."""
+        return max(100, min(50_000_000, int(self.rng.lognormvariate(math.log(50_000), 1.3))))
+
+    def users_rows(self):
+        password_hash = pwd_context.handler("bcrypt").using(salt=PASSWORD_SALT).hash(PASSWORD)
+        n_supervisors = max(1, self.args.users // 50)
+        for i in range(self.args.users):
+            user_id = new_id(self.rng)
+            role = "supervisor" if i < n_supervisors else "user"
+            self.users.append((user_id, role))
+            if role == "supervisor":
+                self.supervisors.append(user_id)
+            email = f"{role}{i}@example.test"
+            full_name = f"{self.rng.choice(FIRST_NAMES)} {self.rng.choice(SURNAMES)} {self.rng.choice(SURNAMES)}"
+            created = timestamp(self._when(self.rng.random() * 0.1))
+            yield copy_line((user_id, email, password_hash, full_name, role, True, created, created))
+
+    def groups_rows(self):
+        for i in range(self.args.groups):
+            group_id = new_id(self.rng)
+            self.groups.append(group_id)
+            created = timestamp(self._when(self.rng.random() * 0.05))
+            yield copy_line((
+                group_id, f"Grupo {self.rng.choice(SECTORS)} {i + 1}", None,
+                self.rng.choice(self.supervisors), self.rng.random() > 0.02, created, created
+            ))
+
+    def companies_rows(self):
+        for i in range(self.args.companies):
+            company_id = new_id(self.rng)
+            # Algunas empresas no pertenecen a ningún grupo
+            group_id = self.rng.choice(self.groups) if self.groups and self.rng.random() > 0.03 else None
+            self.companies.append((company_id, group_id))
+            name = f"{self.rng.choice(COMPANY_PREFIXES)} {self.rng.choice(SURNAMES)} {self.rng.choice(COMPANY_SUFFIXES)} {i + 1}"
+            created = timestamp(self._when(self.rng.random() * 0.1))
+            yield copy_line((
+                company_id, name, None, group_id, self.rng.choice(self.supervisors),
+                self.rng.random() > 0.02, created, created
+            ))
+
+    def accounts_rows(self):
+        """Cuentas con saldo 0: el saldo final se fija al terminar las transacciones."""
+        types, weights = zip(*ACCOUNT_TYPES)
+        for i in range(self.args.accounts):
+            account_id = new_id(self.rng)
+            # Cada empresa tiene al menos una cuenta corriente
+            if i < len(self.companies):
+                company_index, account_type = i, "corriente"
+            else:
+                company_index = self.rng.randrange(len(self.companies))
+                account_type = self.rng.choices(types, weights)[0]
+            company_id, group_id = self.companies[company_index]
+            limit = 0 if account_type == "corriente" else self.rng.randrange(10_000, 500_000) * 100
+            is_active = self.rng.random() > 0.02
+
+            index = len(self.accounts)
+            self.accounts.append(account_id)
+            self.account_types.append(account_type)
+            self.account_limits.append(limit)
+            self.account_company.append(company_index)
+            self.account_group.append(group_id)
+            if is_active:
+                self.active_accounts.append(index)
+
+            bank = self.rng.choice(BANKS)
+            iban = spanish_iban(self.rng) if account_type != "confirming" or self.rng.random() < 0.5 else None
+            created = timestamp(self.start)
+            yield copy_line((
+                account_id, company_id, f"{ACCOUNT_LABELS[account_type]} {bank}", iban, account_type,
+                money(0), money(limit), "EUR", is_active, created, created
+            ))
+
+    def operations_rows(self):
+        for i in range(self.args.operations):
+            operation_id = new_id(self.rng)
+            fraction = (i + self.rng.random()) / self.args.operations
+            created_at = self._when(fraction)
+            self.operations.append(operation_id)
+            status = self.rng.choices(["open", "completed", "cancelled"], [0.2, 0.75, 0.05])[0]
+            closed_at = timestamp(created_at + self.rng.randrange(3600, 30 * 86400)) if status != "open" else None
+            yield copy_line((
+                operation_id, f"Operación {self.rng.choice(SECTORS).lower()} {i + 1}", None, None, status,
+                self.rng.choice(self.supervisors), timestamp(created_at), timestamp(created_at), closed_at
+            ))
+
+    def transactions_rows(self):
+        """
+        Histórico en orden cronológico. Cada cuenta corriente activa empieza con
+        un ingreso inicial (como al crearla con saldo inicial en la API).
+        """
+        rng = self.rng
+        balances = self.balances = [0] * len(self.accounts)
+        types = self.account_types
+        limits = self.account_limits
+        supervisors = self.supervisors
+
+        current = [i for i in self.active_accounts if types[i] == "corriente"]
+        confirming = [i for i in self.active_accounts if types[i] == "confirming"]
+        payers = self.active_accounts
+        receivers = [i for i in self.active_accounts if types[i] != "confirming"]
+        receivers_by_group = {}
+        current_by_company = {}
+        for i in receivers:
+            receivers_by_group.setdefault(self.account_group[i], []).append(i)
+        for i in current:
+            current_by_company.setdefault(self.account_company[i], []).append(i)
+        if not current:
+            return
+
+        ids = self.accounts
+        operations = self.operations
+        n_operations = len(operations)
+
+        def line(from_index, to_index, cents, kind, moved_at, operation_id=None, description=None):
+            created_at = timestamp(moved_at)
+            # Algunos movimientos se registran con fecha de días anteriores
+            transaction_date = created_at if rng.random() > 0.05 else timestamp(moved_at - rng.randrange(3600, 3 * 86400))
+            if description is None and rng.random() > 0.2:
+                description = rng.choice(DESCRIPTIONS).format(n=rng.randrange(1, 100_000))
+            return "\t".join((
+                new_id(rng),
+                ids[from_index] if from_index is not None else "\\N",
+                ids[to_index] if to_index is not None else "\\N",
+                money(cents),
+                description if description is not None else "\\N",
+                kind,
+                "completed",
+                operation_id or "\\N",
+                money(balances[from_index]) if from_index is not None else "\\N",
+                money(balances[to_index]) if to_index is not None else "\\N",
+                transaction_date,
+                rng.choice(supervisors),
+                created_at,
+            )) + "\n"
+
+        def deposit(moved_at):
+            to_index = rng.choice(current)
+            cents = self._amount()
+            balances[to_index] += cents
+            return line(None, to_index, cents, "deposit", moved_at)
+
+        # Saldos iniciales
+        opening = current[:self.args.transactions]
+        for to_index in opening:
+            cents = rng.randrange(1_000, 200_000) * 100
+            balances[to_index] += cents
+            yield line(None, to_index, cents, "deposit", self.start, description="Saldo inicial")
+
+        remaining = self.args.transactions - len(opening)
+        for n in range(remaining):
+            fraction = (n + 1) / remaining
+            moved_at = self.start + 60 + int(fraction * (self.span - 60))
+            kind = rng.random()
+
+            if kind < 0.70:
+                from_index = rng.choice(payers)
+                available = balances[from_index] + limits[from_index]
+                group_receivers = receivers_by_group.get(self.account_group[from_index])
+                if group_receivers and rng.random() < 0.6:
+                    to_index = rng.choice(group_receivers)
+                else:
+                    to_index = rng.choice(receivers)
+                if available < 100 or to_index == from_index:
+                    yield deposit(moved_at)
+                    continue
+                cents = min(available, self._amount())
+                balances[from_index] -= cents
+                balances[to_index] += cents
+                operation_id = None
+                if n_operations and rng.random() < 0.25:
+                    operation_id = operations[min(n_operations - 1, int(fraction * n_operations))]
+                yield line(from_index, to_index, cents, "transfer", moved_at, operation_id)
+
+            elif kind < 0.82:
+                yield deposit(moved_at)
+
+            elif kind < 0.94:
+                from_index = rng.choice(current)
+                cents = min(balances[from_index], self._amount())
+                if cents < 100:
+                    yield deposit(moved_at)
+                    continue
+                balances[from_index] -= cents
+                yield line(from_index, None, cents, "withdrawal", moved_at)
+
+            else:
+                # Vencimiento de confirming: se carga en una corriente de la misma empresa
+                if not confirming:
+                    yield deposit(moved_at)
+                    continue
+                to_index = rng.choice(confirming)
+                charge_accounts = current_by_company.get(self.account_company[to_index]) or current
+                from_index = rng.choice(charge_accounts)
+                cents = min(-balances[to_index], balances[from_index], self._amount())
+                if cents < 100:
+                    yield deposit(moved_at)
+                    continue
+                balances[from_index] -= cents
+                balances[to_index] += cents
+                yield line(from_index, to_index, cents, "confirming_settlement", moved_at, description="Vencimiento confirming")
+
+    def balances_rows(self):
+        for account_id, cents in zip(self.accounts, self.balances):
+            yield f"{account_id}\t{money(cents)}\n"
+
+    def pending_entries_rows(self):
+        if len(self.groups) < 2:
+            return
+        for i in range(self.args.pending_entries):
+            from_group, to_group = self.rng.sample(self.groups, 2)
+            created_at = self._when(self.rng.random())
+            operation_id = self.rng.choice(self.operations) if self.operations and self.rng.random() < 0.5 else None
+            settled = self.rng.random() < 0.6
+            settled_in = self.rng.choice(self.operations) if settled and self.operations else None
+            settled_at = timestamp(created_at + self.rng.randrange(86400, 90 * 86400)) if settled else None
+            yield copy_line((
+                new_id(self.rng), from_group, to_group, money(self._amount()), f"Apunte pendiente {i + 1}",
+                operation_id, settled_in, "settled" if settled else "pending",
+                self.rng.choice(self.supervisors), timestamp(created_at), settled_at
+            ))
+
+    def permissions_rows(self):
+        """Permisos de los usuarios normales: 70% de cuenta, 20% de empresa y 10% de grupo."""
+        targets = {
+            "account": self.accounts,
+            "company": [company_id for company_id, _ in self.companies],
+            "group": self.groups,
+        }
+        for user_id, role in self.users:
+            if role == "supervisor":
+                continue
+            granted = set()
+            for _ in range(self.args.permissions_per_user):
+                level = self.rng.choices(["account", "company", "group"], [0.7, 0.2, 0.1])[0]
+                if not targets[level]:
+                    continue
+                target = self.rng.choice(targets[level])
+                if (level, target) in granted:
+                    continue
+                granted.add((level, target))
+                yield copy_line((
+                    new_id(self.rng), user_id,
+                    target if level == "account" else None,
+                    target if level == "company" else None,
+                    target if level == "group" else None,
+                    True, self.rng.random() < 0.4, self.rng.choice(self.supervisors),
+                    timestamp(self._when(self.rng.random() * 0.2))
+                ))
+
+
+# ============ CARGA ============
+
+TABLES = [
+    ("users", ["id", "email", "password_hash", "full_name", "role", "is_active", "created_at", "updated_at"], "users_rows"),
+    ("groups", ["id", "name", "description", "created_by", "is_active", "created_at", "updated_at"], "groups_rows"),
+    ("companies", ["id", "name", "description", "group_id", "created_by", "is_active", "created_at", "updated_at"], "companies_rows"),
+    ("accounts", [
+        "id", "company_id", "name", "iban", "account_type", "balance", "credit_limit", "currency",
+        "is_active", "created_at", "updated_at"
+    ], "accounts_rows"),
+    ("operations", [
+        "id", "name", "description", "notes", "status", "created_by", "created_at", "updated_at", "closed_at"
+    ], "operations_rows"),
+    ("transactions", [
+        "id", "from_account_id", "to_account_id", "amount", "description", "transaction_type", "status",
+        "operation_id", "from_balance_after", "to_balance_after", "transaction_date", "created_by", "created_at"
+    ], "transactions_rows"),
+    ("pending_entries", [
+        "id", "from_group_id", "to_group_id", "amount", "description", "operation_id",
+        "settled_in_operation_id", "status", "created_by", "created_at", "settled_at"
+    ], "pending_entries_rows"),
+    ("account_permissions", [
+        "id", "user_id", "account_id", "company_id", "group_id", "can_view", "can_transfer", "granted_by", "created_at"
+    ], "permissions_rows"),
+]
+
+
+def load(connection, dataset: SyntheticDataset) -> None:
+    for table, columns, rows in TABLES:
+        started = time.perf_counter()
+        count = copy_lines(connection, table, columns, getattr(dataset, rows)())
+        elapsed = time.perf_counter() - started
+        print(f"  {table:<20} {count:>12,} filas  {elapsed:7.1f} s  ({count / max(elapsed, 1e-9):,.0f} filas/s)")
+
+        if table == "transactions":
+            # Saldo final de cada cuenta = saldo tras su último movimiento
+            cursor = connection.cursor()
+            cursor.execute(
+                "CREATE TEMP TABLE synthetic_balances (id uuid PRIMARY KEY, balance numeric(15, 2)) ON COMMIT DROP"
+            )
+            copy_lines(connection, "synthetic_balances", ["id", "balance"], dataset.balances_rows())
+            cursor.execute("UPDATE accounts a SET balance = b.balance FROM synthetic_balances b WHERE a.id = b.id")
+            cursor.close()
+
+
+def generate(args) -> None:
+    if engine.dialect.name != "postgresql":
+        raise SystemExit("El generador usa COPY: requiere PostgreSQL")
+
+    tables = [table.name for table in Base.metadata.sorted_tables if table.name != "cache_versions"]
+    connection = engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        if args.truncate:
+            cursor.execute(f"TRUNCATE {', '.join(tables)} CASCADE")
+        else:
+            cursor.execute("SELECT 1 FROM users LIMIT 1")
+            if cursor.fetchone():
+                raise SystemExit("La base de datos ya tiene datos: usa --truncate para vaciarla antes")
+        cursor.close()
+
+        print(f"Generando datos (semilla {args.seed})...")
+        started = time.perf_counter()
+        load(connection, SyntheticDataset(args))
+        connection.commit()
+        print(f"  Cargado en {time.perf_counter() - started:.1f} s")
+    except BaseException:
+        connection.rollback()
+        raise
+    finally:
+        connection.close()
+
+    db = SessionLocal()
+    try:
+        print(f"  Agregados de flujo de caja: {rebuild_rollups(db):,} filas")
+        # Las caches de los workers en marcha se recargan
+        db.execute(text("UPDATE cache_versions SET version = version + 1, updated_at = now()"))
+        db.commit()
+    finally:
+        db.close()
+
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text("ANALYZE"))
+
+    print("\n✅ Datos sintéticos generados")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--users", type=int, default=2_000)
+    parser.add_argument("--groups", type=int, default=1_000)
+    parser.add_argument("--companies", type=int, default=5_000)
+    parser.add_argument("--accounts", type=int, default=20_000)
+    parser.add_argument("--operations", type=int, default=10_000)
+    parser.add_argument("--transactions", type=int, default=1_000_000)
+    parser.add_argument("--pending-entries", type=int, default=50_000)
+    parser.add_argument("--permissions-per-user", type=int, default=5)
+    parser.add_argument("--start", default="2023-01-01", help="Fecha del primer movimiento")
+    parser.add_argument("--days", type=int, default=730, help="Días que abarca el histórico")
+    parser.add_argument("--truncate", action="store_true", help="Vaciar las tablas antes de cargar")
+    args = parser.parse_args()
+
+    if args.companies < 1 or args.accounts < args.companies or args.users < 1:
+        parser.error("Se necesita al menos un usuario, una empresa y una cuenta por empresa")
+
+    generate(args)
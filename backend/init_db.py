@@ -1,18 +1,53 @@
 """
-Script para inicializar la base de datos con datos de prueba.
-Ejecutar después de levantar el servidor al menos una vez.
+Script para inicializar la base de datos: aplica las migraciones (alembic
+upgrade head) y, si está vacía, la carga con datos de prueba.
 """
 import sys
 sys.path.insert(0, '.')
 
+from alembic import command
+from alembic.config import Config
+from alembic.script import ScriptDirectory
+from sqlalchemy import inspect
+
 from app.database import SessionLocal, engine
-from app.models import Base, User, Company, Account, AccountPermission, Transaction
+from app.models import User, Company, Account, AccountPermission, Transaction
 from app.auth import get_password_hash
 from decimal import Decimal
+from typing import List
+
+
+def missing_baseline_columns(config: Config, inspector) -> List[str]:
+    """Tablas o columnas del esquema de 0001 que no existen en la base de datos."""
+    baseline = ScriptDirectory.from_config(config).get_revision("0001").module.BASELINE_COLUMNS
+    missing = []
+    for table, columns in baseline.items():
+        if not inspector.has_table(table):
+            missing.append(table)
+            continue
+        existing = {column["name"] for column in inspector.get_columns(table)}
+        missing += [f"{table}.{column}" for column in columns if column not in existing]
+    return missing
+
+
+def upgrade_schema():
+    config = Config("alembic.ini")
+    inspector = inspect(engine)
+    if inspector.has_table("users") and not inspector.has_table("alembic_version"):
+        # Creada con create_all antes de las migraciones: se marca como 0001
+        # solo si tiene todo su esquema; las revisiones siguientes son idempotentes
+        missing = missing_baseline_columns(config, inspector)
+        if missing:
+            raise SystemExit(
+                "❌ La base de datos no tiene el esquema de la revisión 0001, no se puede marcar: "
+                + ", ".join(missing)
+            )
+        command.stamp(config, "0001")
+    command.upgrade(config, "head")
+
 
 def init_db():
-    # Crear tablas
-    Base.metadata.create_all(bind=engine)
+    upgrade_schema()
     
     db = SessionLocal()
     
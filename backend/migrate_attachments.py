@@ -0,0 +1,80 @@
+"""
+Script para mover el contenido de los adjuntos de PostgreSQL al almacén de blobs.
+Es idempotente: se puede interrumpir y volver a ejecutar. Necesita la
+columna content_hash (migración 0002, alembic upgrade head).
+
+Uso: python migrate_attachments.py [--batch-size 100] [--vacuum]
+"""
+import argparse
+import io
+import sys
+sys.path.insert(0, '.')
+
+from sqlalchemy import inspect, text
+
+from app.database import SessionLocal, engine
+from app.storage import get_blob_store
+
+
+def check_schema():
+    columns = {column["name"] for column in inspect(engine).get_columns("attachments")}
+    if "content_hash" not in columns:
+        raise SystemExit("❌ Falta attachments.content_hash: ejecuta antes alembic upgrade head")
+
+
+def migrate_attachments(batch_size: int = 100):
+    store = get_blob_store()
+    db = SessionLocal()
+    migrated = 0
+
+    try:
+        while True:
+            # Leer solo un lote de blobs cada vez para acotar la memoria
+            rows = db.execute(text(
+                "SELECT id, file_data FROM attachments "
+                "WHERE content_hash IS NULL AND file_data IS NOT NULL "
+                "LIMIT :limit"
+            ), {"limit": batch_size}).fetchall()
+
+            if not rows:
+                break
+
+            for attachment_id, file_data in rows:
+                content_hash, size = store.put(io.BytesIO(file_data))
+                db.execute(text(
+                    "UPDATE attachments "
+                    "SET content_hash = :hash, file_size = :size, file_data = NULL "
+                    "WHERE id = :id"
+                ), {"hash": content_hash, "size": size, "id": attachment_id})
+
+            db.commit()
+            migrated += len(rows)
+            print(f"  {migrated} adjuntos migrados...")
+
+        print(f"\n✅ Migración completada: {migrated} adjuntos movidos al almacén de blobs")
+
+    except Exception as e:
+        db.rollback()
+        print(f"Error: {e}")
+        raise
+    finally:
+        db.close()
+
+
+def vacuum_attachments():
+    """Recuperar el espacio que ocupaban los blobs en la tabla."""
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text("VACUUM FULL attachments"))
+    print("🧹 Tabla attachments compactada")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--vacuum", action="store_true", help="Ejecutar VACUUM FULL al terminar")
+    args = parser.parse_args()
+
+    check_schema()
+    migrate_attachments(args.batch_size)
+    if args.vacuum:
+        vacuum_attachments()
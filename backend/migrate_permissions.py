@@ -0,0 +1,77 @@
+"""
+Script para compactar los permisos de cuenta: sustituye los que cubren TODAS
+las cuentas de una empresa con los mismos valores por un solo permiso de
+empresa, en una transacción. Es idempotente.
+
+Las columnas, la restricción y los índices únicos de `account_permissions`
+los crea la migración 0003 (alembic upgrade head).
+
+Uso: python migrate_permissions.py
+"""
+import argparse
+import sys
+sys.path.insert(0, '.')
+
+from sqlalchemy import inspect, text
+
+from app.cache_bus import notify_versions
+from app.database import engine
+
+COMPACT_SQL = """
+WITH per_company AS (
+    SELECT p.user_id, a.company_id, p.can_view, p.can_transfer, count(*) AS n
+    FROM account_permissions p JOIN accounts a ON a.id = p.account_id
+    GROUP BY p.user_id, a.company_id, p.can_view, p.can_transfer
+), company_size AS (
+    SELECT company_id, count(*) AS n FROM accounts GROUP BY company_id
+)
+SELECT pc.user_id, pc.company_id, pc.can_view, pc.can_transfer
+FROM per_company pc JOIN company_size cs ON cs.company_id = pc.company_id AND cs.n = pc.n
+WHERE NOT EXISTS (
+    SELECT 1 FROM account_permissions existing
+    WHERE existing.user_id = pc.user_id AND existing.company_id = pc.company_id
+)
+"""
+
+
+def check_schema(conn):
+    columns = {column["name"] for column in inspect(conn).get_columns("account_permissions")}
+    if "company_id" not in columns:
+        raise SystemExit("❌ Falta account_permissions.company_id: ejecuta antes alembic upgrade head")
+
+
+def compact(conn):
+    """Permisos de cuenta -> permiso de empresa, en una transacción."""
+    with conn.begin():
+        rows = conn.execute(text(COMPACT_SQL)).all()
+        removed = 0
+        for row in rows:
+            conn.execute(text(
+                "INSERT INTO account_permissions (id, user_id, company_id, can_view, can_transfer) "
+                "VALUES (gen_random_uuid(), :user_id, :company_id, :can_view, :can_transfer)"
+            ), row._asdict())
+            removed += conn.execute(text(
+                "DELETE FROM account_permissions p USING accounts a "
+                "WHERE p.account_id = a.id AND p.user_id = :user_id AND a.company_id = :company_id"
+            ), {"user_id": row.user_id, "company_id": row.company_id}).rowcount
+        # Los workers desalojan sus caches de permisos al recibir el NOTIFY (con el commit)
+        bumped = conn.execute(text(
+            "UPDATE cache_versions SET version = version + 1, updated_at = now() AT TIME ZONE 'utc' "
+            "WHERE key LIKE 'permissions:%' RETURNING key, version"
+        )).all()
+        notify_versions(conn, {row.key: row.version for row in bumped})
+    print(f"  {removed} permisos de cuenta sustituidos por {len(rows)} permisos de empresa")
+
+
+def migrate_permissions():
+    with engine.connect() as conn:
+        check_schema(conn)
+        compact(conn)
+
+    print("\n✅ Permisos compactados")
+
+
+if __name__ == "__main__":
+    argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter).parse_args()
+
+    migrate_permissions()
@@ -0,0 +1,36 @@
+"""
+Script para recalcular los agregados de flujo de caja (`cashflow_rollups`)
+a partir de las transacciones. Sin fechas recalcula todo el histórico.
+
+Uso: python rebuild_cashflow.py [--from 2024-01-01] [--to 2024-12-31]
+"""
+import argparse
+import sys
+from datetime import date
+sys.path.insert(0, '.')
+
+from app.cashflow import rebuild_rollups
+from app.database import SessionLocal
+
+
+def rebuild(date_from=None, date_to=None):
+    db = SessionLocal()
+    try:
+        inserted = rebuild_rollups(db, date_from, date_to)
+        db.commit()
+        print(f"✅ Agregados recalculados: {inserted} filas")
+    except Exception as e:
+        db.rollback()
+        print(f"Error: {e}")
+        raise
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--from", dest="date_from", type=date.fromisoformat)
+    parser.add_argument("--to", dest="date_to", type=date.fromisoformat)
+    args = parser.parse_args()
+
+    rebuild(args.date_from, args.date_to)
@@ -1,95 +1,342 @@
 -- Esquema de base de datos para sistema de gestión financiera
+-- Generado desde las migraciones: alembic upgrade head --sql > schema.sql
+-- (no editar a mano; para cambiar el esquema, añadir una migración en alembic/versions)
+BEGIN;
 
--- Extensión para UUIDs
-CREATE EXTENSION IF NOT EXISTS "uuid-ossp";
+CREATE TABLE alembic_version (
+    version_num VARCHAR(32) NOT NULL, 
+    CONSTRAINT alembic_version_pkc PRIMARY KEY (version_num)
+);
+
+-- Running upgrade  -> 0001
 
--- Tabla de usuarios
 CREATE TABLE users (
-    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
-    email VARCHAR(255) UNIQUE NOT NULL,
-    password_hash VARCHAR(255) NOT NULL,
-    full_name VARCHAR(255) NOT NULL,
-    role VARCHAR(20) DEFAULT 'user' CHECK (role IN ('supervisor', 'user')),
-    is_active BOOLEAN DEFAULT TRUE,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    id UUID NOT NULL, 
+    email VARCHAR(255) NOT NULL, 
+    password_hash VARCHAR(255) NOT NULL, 
+    full_name VARCHAR(255) NOT NULL, 
+    role VARCHAR(20), 
+    is_active BOOLEAN, 
+    created_at TIMESTAMP WITHOUT TIME ZONE DEFAULT now(), 
+    updated_at TIMESTAMP WITHOUT TIME ZONE DEFAULT now(), 
+    PRIMARY KEY (id), 
+    CONSTRAINT valid_role CHECK (role IN ('supervisor', 'user', 'demo'))
+);
+
+CREATE UNIQUE INDEX ix_users_email ON users (email);
+
+CREATE TABLE groups (
+    id UUID NOT NULL, 
+    name VARCHAR(255) NOT NULL, 
+    description VARCHAR, 
+    created_by UUID, 
+    is_active BOOLEAN, 
+    created_at TIMESTAMP WITHOUT TIME ZONE DEFAULT now(), 
+    updated_at TIMESTAMP WITHOUT TIME ZONE DEFAULT now(), 
+    PRIMARY KEY (id), 
+    FOREIGN KEY(created_by) REFERENCES users (id)
 );
 
--- Tabla de empresas
 CREATE TABLE companies (
-    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
-    name VARCHAR(255) NOT NULL,
-    description TEXT,
-    created_by UUID REFERENCES users(id),
-    is_active BOOLEAN DEFAULT TRUE,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    id UUID NOT NULL, 
+    name VARCHAR(255) NOT NULL, 
+    description VARCHAR, 
+    group_id UUID, 
+    created_by UUID, 
+    is_active BOOLEAN, 
+    created_at TIMESTAMP WITHOUT TIME ZONE DEFAULT now(), 
+    updated_at TIMESTAMP WITHOUT TIME ZONE DEFAULT now(), 
+    PRIMARY KEY (id), 
+    FOREIGN KEY(created_by) REFERENCES users (id), 
+    FOREIGN KEY(group_id) REFERENCES groups (id)
 );
 
--- Tabla de cuentas
 CREATE TABLE accounts (
-    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
-    company_id UUID REFERENCES companies(id) ON DELETE CASCADE,
-    name VARCHAR(255) NOT NULL,
-    balance DECIMAL(15, 2) DEFAULT 0.00,
-    currency VARCHAR(3) DEFAULT 'EUR',
-    is_active BOOLEAN DEFAULT TRUE,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    CONSTRAINT positive_balance CHECK (balance >= 0)
+    id UUID NOT NULL, 
+    company_id UUID, 
+    name VARCHAR(255) NOT NULL, 
+    iban VARCHAR(34), 
+    account_type VARCHAR(20), 
+    balance NUMERIC(15, 2), 
+    credit_limit NUMERIC(15, 2), 
+    currency VARCHAR(3), 
+    is_active BOOLEAN, 
+    created_at TIMESTAMP WITHOUT TIME ZONE DEFAULT now(), 
+    updated_at TIMESTAMP WITHOUT TIME ZONE DEFAULT now(), 
+    PRIMARY KEY (id), 
+    CONSTRAINT valid_account_type CHECK (account_type IN ('corriente', 'credito', 'confirming')), 
+    FOREIGN KEY(company_id) REFERENCES companies (id) ON DELETE CASCADE
 );
 
--- Tabla de permisos (qué usuarios pueden ver qué cuentas)
 CREATE TABLE account_permissions (
-    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
-    user_id UUID REFERENCES users(id) ON DELETE CASCADE,
-    account_id UUID REFERENCES accounts(id) ON DELETE CASCADE,
-    can_view BOOLEAN DEFAULT TRUE,
-    can_transfer BOOLEAN DEFAULT FALSE,
-    granted_by UUID REFERENCES users(id),
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    UNIQUE(user_id, account_id)
+    id UUID NOT NULL, 
+    user_id UUID, 
+    account_id UUID, 
+    can_view BOOLEAN, 
+    can_transfer BOOLEAN, 
+    granted_by UUID, 
+    created_at TIMESTAMP WITHOUT TIME ZONE DEFAULT now(), 
+    PRIMARY KEY (id), 
+    FOREIGN KEY(account_id) REFERENCES accounts (id) ON DELETE CASCADE, 
+    FOREIGN KEY(granted_by) REFERENCES users (id), 
+    FOREIGN KEY(user_id) REFERENCES users (id) ON DELETE CASCADE
+);
+
+CREATE TABLE operations (
+    id UUID NOT NULL, 
+    name VARCHAR(255) NOT NULL, 
+    description VARCHAR, 
+    notes VARCHAR, 
+    status VARCHAR(20), 
+    created_by UUID, 
+    created_at TIMESTAMP WITHOUT TIME ZONE DEFAULT now(), 
+    updated_at TIMESTAMP WITHOUT TIME ZONE DEFAULT now(), 
+    closed_at TIMESTAMP WITHOUT TIME ZONE, 
+    PRIMARY KEY (id), 
+    CONSTRAINT valid_operation_status CHECK (status IN ('open', 'completed', 'cancelled')), 
+    FOREIGN KEY(created_by) REFERENCES users (id)
 );
 
--- Tabla de operaciones/transferencias
 CREATE TABLE transactions (
-    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
-    from_account_id UUID REFERENCES accounts(id),
-    to_account_id UUID REFERENCES accounts(id),
-    amount DECIMAL(15, 2) NOT NULL CHECK (amount > 0),
-    description TEXT,
-    transaction_type VARCHAR(20) CHECK (transaction_type IN ('transfer', 'deposit', 'withdrawal')),
-    status VARCHAR(20) DEFAULT 'completed' CHECK (status IN ('pending', 'completed', 'failed', 'cancelled')),
-    created_by UUID REFERENCES users(id),
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    id UUID NOT NULL, 
+    from_account_id UUID, 
+    to_account_id UUID, 
+    amount NUMERIC(15, 2) NOT NULL, 
+    description VARCHAR, 
+    transaction_type VARCHAR(30), 
+    status VARCHAR(20), 
+    operation_id UUID, 
+    from_balance_after NUMERIC(15, 2), 
+    to_balance_after NUMERIC(15, 2), 
+    transaction_date TIMESTAMP WITHOUT TIME ZONE DEFAULT now(), 
+    created_by UUID, 
+    created_at TIMESTAMP WITHOUT TIME ZONE DEFAULT now(), 
+    PRIMARY KEY (id), 
+    CONSTRAINT positive_amount CHECK (amount > 0), 
+    CONSTRAINT valid_transaction_type CHECK (transaction_type IN ('transfer', 'deposit', 'withdrawal', 'confirming_settlement')), 
+    CONSTRAINT valid_status CHECK (status IN ('pending', 'completed', 'failed', 'cancelled')), 
+    FOREIGN KEY(created_by) REFERENCES users (id), 
+    FOREIGN KEY(from_account_id) REFERENCES accounts (id), 
+    FOREIGN KEY(operation_id) REFERENCES operations (id), 
+    FOREIGN KEY(to_account_id) REFERENCES accounts (id)
+);
+
+CREATE TABLE attachments (
+    id UUID NOT NULL, 
+    transaction_id UUID NOT NULL, 
+    filename VARCHAR(255) NOT NULL, 
+    content_type VARCHAR(100) NOT NULL, 
+    file_data BYTEA NOT NULL, 
+    file_size INTEGER NOT NULL, 
+    uploaded_by UUID, 
+    created_at TIMESTAMP WITHOUT TIME ZONE DEFAULT now(), 
+    PRIMARY KEY (id), 
+    FOREIGN KEY(transaction_id) REFERENCES transactions (id) ON DELETE CASCADE, 
+    FOREIGN KEY(uploaded_by) REFERENCES users (id)
+);
+
+CREATE TABLE pending_entries (
+    id UUID NOT NULL, 
+    from_group_id UUID NOT NULL, 
+    to_group_id UUID NOT NULL, 
+    amount NUMERIC(15, 2) NOT NULL, 
+    description VARCHAR(500), 
+    operation_id UUID, 
+    settled_in_operation_id UUID, 
+    status VARCHAR(20), 
+    created_by UUID, 
+    created_at TIMESTAMP WITHOUT TIME ZONE DEFAULT now(), 
+    settled_at TIMESTAMP WITHOUT TIME ZONE, 
+    PRIMARY KEY (id), 
+    CONSTRAINT positive_pending_amount CHECK (amount > 0), 
+    CONSTRAINT valid_pending_status CHECK (status IN ('pending', 'settled')), 
+    FOREIGN KEY(created_by) REFERENCES users (id), 
+    FOREIGN KEY(from_group_id) REFERENCES groups (id), 
+    FOREIGN KEY(operation_id) REFERENCES operations (id), 
+    FOREIGN KEY(settled_in_operation_id) REFERENCES operations (id), 
+    FOREIGN KEY(to_group_id) REFERENCES groups (id)
+);
+
+INSERT INTO alembic_version (version_num) VALUES ('0001') RETURNING alembic_version.version_num;
+
+-- Running upgrade 0001 -> 0002
+
+ALTER TABLE attachments ADD COLUMN IF NOT EXISTS content_hash VARCHAR(64);
+
+ALTER TABLE attachments ALTER COLUMN file_data DROP NOT NULL;
+
+CREATE INDEX IF NOT EXISTS ix_attachments_content_hash ON attachments (content_hash);
+
+UPDATE alembic_version SET version_num='0002' WHERE alembic_version.version_num = '0001';
+
+-- Running upgrade 0002 -> 0003
+
+ALTER TABLE account_permissions ADD COLUMN IF NOT EXISTS company_id UUID REFERENCES companies(id) ON DELETE CASCADE, ADD COLUMN IF NOT EXISTS group_id UUID REFERENCES groups(id) ON DELETE CASCADE;
+
+ALTER TABLE account_permissions DROP CONSTRAINT IF EXISTS single_permission_target;
+
+ALTER TABLE account_permissions ADD CONSTRAINT single_permission_target CHECK ((CASE WHEN account_id IS NULL THEN 0 ELSE 1 END + CASE WHEN company_id IS NULL THEN 0 ELSE 1 END + CASE WHEN group_id IS NULL THEN 0 ELSE 1 END) = 1);
+
+DELETE FROM account_permissions p USING account_permissions newer WHERE p.user_id = newer.user_id AND p.account_id = newer.account_id AND (p.created_at, p.id) < (newer.created_at, newer.id);
+
+DELETE FROM account_permissions p USING account_permissions newer WHERE p.user_id = newer.user_id AND p.company_id = newer.company_id AND (p.created_at, p.id) < (newer.created_at, newer.id);
+
+DELETE FROM account_permissions p USING account_permissions newer WHERE p.user_id = newer.user_id AND p.group_id = newer.group_id AND (p.created_at, p.id) < (newer.created_at, newer.id);
+
+COMMIT;
+
+DO $$ BEGIN IF EXISTS (SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid WHERE c.relname = 'ux_account_permissions_user_account' AND NOT i.indisvalid) THEN DROP INDEX ux_account_permissions_user_account; END IF; END $$;
+
+CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS ux_account_permissions_user_account ON account_permissions (user_id, account_id);
+
+DO $$ BEGIN IF EXISTS (SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid WHERE c.relname = 'ux_account_permissions_user_company' AND NOT i.indisvalid) THEN DROP INDEX ux_account_permissions_user_company; END IF; END $$;
+
+CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS ux_account_permissions_user_company ON account_permissions (user_id, company_id);
+
+DO $$ BEGIN IF EXISTS (SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid WHERE c.relname = 'ux_account_permissions_user_group' AND NOT i.indisvalid) THEN DROP INDEX ux_account_permissions_user_group; END IF; END $$;
+
+CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS ux_account_permissions_user_group ON account_permissions (user_id, group_id);
+
+BEGIN;
+
+UPDATE alembic_version SET version_num='0003' WHERE alembic_version.version_num = '0002';
+
+-- Running upgrade 0003 -> 0004
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+COMMIT;
+
+DO $$ BEGIN IF EXISTS (SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid WHERE c.relname = 'ix_groups_name_keyset' AND NOT i.indisvalid) THEN DROP INDEX ix_groups_name_keyset; END IF; END $$;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_groups_name_keyset ON groups (name, id);
+
+DO $$ BEGIN IF EXISTS (SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid WHERE c.relname = 'ix_companies_name_keyset' AND NOT i.indisvalid) THEN DROP INDEX ix_companies_name_keyset; END IF; END $$;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_companies_name_keyset ON companies (name, id);
+
+DO $$ BEGIN IF EXISTS (SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid WHERE c.relname = 'ix_operations_created_keyset' AND NOT i.indisvalid) THEN DROP INDEX ix_operations_created_keyset; END IF; END $$;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_operations_created_keyset ON operations (created_at, id);
+
+DO $$ BEGIN IF EXISTS (SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid WHERE c.relname = 'ix_users_email_trgm' AND NOT i.indisvalid) THEN DROP INDEX ix_users_email_trgm; END IF; END $$;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_users_email_trgm ON users USING gist ((email) gist_trgm_ops);
+
+DO $$ BEGIN IF EXISTS (SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid WHERE c.relname = 'ix_users_full_name_trgm' AND NOT i.indisvalid) THEN DROP INDEX ix_users_full_name_trgm; END IF; END $$;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_users_full_name_trgm ON users USING gist ((full_name) gist_trgm_ops);
+
+DO $$ BEGIN IF EXISTS (SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid WHERE c.relname = 'ix_companies_name_trgm' AND NOT i.indisvalid) THEN DROP INDEX ix_companies_name_trgm; END IF; END $$;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_companies_name_trgm ON companies USING gist ((name) gist_trgm_ops);
+
+DO $$ BEGIN IF EXISTS (SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid WHERE c.relname = 'ix_accounts_name_trgm' AND NOT i.indisvalid) THEN DROP INDEX ix_accounts_name_trgm; END IF; END $$;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_accounts_name_trgm ON accounts USING gist ((name) gist_trgm_ops);
+
+DO $$ BEGIN IF EXISTS (SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid WHERE c.relname = 'ix_accounts_iban_trgm' AND NOT i.indisvalid) THEN DROP INDEX ix_accounts_iban_trgm; END IF; END $$;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_accounts_iban_trgm ON accounts USING gist ((upper(replace(iban, ' ', ''))) gist_trgm_ops);
+
+DO $$ BEGIN IF EXISTS (SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid WHERE c.relname = 'ix_operations_name_trgm' AND NOT i.indisvalid) THEN DROP INDEX ix_operations_name_trgm; END IF; END $$;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_operations_name_trgm ON operations USING gist ((name) gist_trgm_ops);
+
+DO $$ BEGIN IF EXISTS (SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid WHERE c.relname = 'ix_transactions_description_trgm' AND NOT i.indisvalid) THEN DROP INDEX ix_transactions_description_trgm; END IF; END $$;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_transactions_description_trgm ON transactions USING gist ((description) gist_trgm_ops);
+
+DO $$ BEGIN IF EXISTS (SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid WHERE c.relname = 'ix_transactions_description_tsv' AND NOT i.indisvalid) THEN DROP INDEX ix_transactions_description_tsv; END IF; END $$;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_transactions_description_tsv ON transactions USING gin (to_tsvector('spanish'::regconfig, coalesce(description, '')));
+
+BEGIN;
+
+UPDATE alembic_version SET version_num='0004' WHERE alembic_version.version_num = '0003';
+
+-- Running upgrade 0004 -> 0005
+
+CREATE TABLE IF NOT EXISTS cache_versions (
+    key VARCHAR(100) NOT NULL, 
+    version BIGINT NOT NULL, 
+    updated_at TIMESTAMP WITHOUT TIME ZONE DEFAULT now() NOT NULL, 
+    PRIMARY KEY (key)
 );
 
--- Índices para mejorar rendimiento
-CREATE INDEX idx_accounts_company ON accounts(company_id);
-CREATE INDEX idx_transactions_from ON transactions(from_account_id);
-CREATE INDEX idx_transactions_to ON transactions(to_account_id);
-CREATE INDEX idx_transactions_date ON transactions(created_at DESC);
-CREATE INDEX idx_permissions_user ON account_permissions(user_id);
-CREATE INDEX idx_permissions_account ON account_permissions(account_id);
-
--- Función para actualizar timestamp
-CREATE OR REPLACE FUNCTION update_updated_at()
-RETURNS TRIGGER AS $$
-BEGIN
-    NEW.updated_at = CURRENT_TIMESTAMP;
-    RETURN NEW;
-END;
-$$ LANGUAGE plpgsql;
-
--- Triggers para actualizar updated_at
-CREATE TRIGGER update_users_timestamp
-    BEFORE UPDATE ON users
-    FOR EACH ROW EXECUTE FUNCTION update_updated_at();
-
-CREATE TRIGGER update_companies_timestamp
-    BEFORE UPDATE ON companies
-    FOR EACH ROW EXECUTE FUNCTION update_updated_at();
-
-CREATE TRIGGER update_accounts_timestamp
-    BEFORE UPDATE ON accounts
-    FOR EACH ROW EXECUTE FUNCTION update_updated_at();
+CREATE TABLE IF NOT EXISTS cashflow_rollups (
+    period VARCHAR(10) NOT NULL, 
+    period_start DATE NOT NULL, 
+    account_id UUID NOT NULL, 
+    inflow NUMERIC(18, 2) NOT NULL, 
+    outflow NUMERIC(18, 2) NOT NULL, 
+    transaction_count INTEGER NOT NULL, 
+    PRIMARY KEY (period, period_start, account_id), 
+    CONSTRAINT valid_rollup_period CHECK (period IN ('day', 'week', 'month')), 
+    FOREIGN KEY(account_id) REFERENCES accounts (id) ON DELETE CASCADE
+);
+
+CREATE TABLE IF NOT EXISTS circular_flow_alerts (
+    id UUID NOT NULL, 
+    level VARCHAR(10) NOT NULL, 
+    cycle_key VARCHAR(1000) NOT NULL, 
+    entity_ids JSON NOT NULL, 
+    length INTEGER NOT NULL, 
+    amount NUMERIC(15, 2) NOT NULL, 
+    window_start TIMESTAMP WITHOUT TIME ZONE NOT NULL, 
+    window_end TIMESTAMP WITHOUT TIME ZONE NOT NULL, 
+    status VARCHAR(20), 
+    detected_at TIMESTAMP WITHOUT TIME ZONE DEFAULT now(), 
+    updated_at TIMESTAMP WITHOUT TIME ZONE DEFAULT now(), 
+    PRIMARY KEY (id), 
+    CONSTRAINT valid_alert_level CHECK (level IN ('company', 'group')), 
+    CONSTRAINT valid_alert_status CHECK (status IN ('open', 'dismissed')), 
+    CONSTRAINT uq_circular_flow_cycle UNIQUE (level, cycle_key)
+);
+
+UPDATE alembic_version SET version_num='0005' WHERE alembic_version.version_num = '0004';
+
+-- Running upgrade 0005 -> 0006
+
+COMMIT;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_transactions_operation_id ON transactions (operation_id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_transactions_transaction_date ON transactions (transaction_date);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_transactions_created_at ON transactions (created_at);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_transactions_from_account_created ON transactions (from_account_id, created_at);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_transactions_to_account_created ON transactions (to_account_id, created_at);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_attachments_transaction_id ON attachments (transaction_id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_pending_entries_status_created ON pending_entries (status, created_at);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_pending_entries_from_group_status ON pending_entries (from_group_id, status);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_pending_entries_to_group_status ON pending_entries (to_group_id, status);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_pending_entries_operation_id ON pending_entries (operation_id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_pending_entries_settled_in_operation_id ON pending_entries (settled_in_operation_id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_accounts_company_active ON accounts (company_id) WHERE is_active = true;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_companies_group_active ON companies (group_id) WHERE is_active = true;
+
+DROP INDEX CONCURRENTLY IF EXISTS ix_groups_name_keyset;
+
+DROP INDEX CONCURRENTLY IF EXISTS ix_companies_name_keyset;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_groups_name_keyset ON groups (name, id) WHERE is_active = true;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_companies_name_keyset ON companies (name, id) WHERE is_active = true;
+
+BEGIN;
+
+UPDATE alembic_version SET version_num='0006' WHERE alembic_version.version_num = '0005';
+
+COMMIT;
+
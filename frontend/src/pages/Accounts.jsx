@@ -1,5 +1,6 @@
 import { useState, useEffect } from 'react';
 import api from '../services/api';
+import { useLiveEvents } from '../services/events';
 import { useAuth } from '../context/AuthContext';
 import { Wallet, Plus, X, Edit, Trash2, ChevronDown, ChevronRight, RefreshCw, Eye, ArrowUpRight, ArrowDownLeft, ArrowLeftRight, RotateCcw, GitBranch } from 'lucide-react';
 
@@ -56,6 +57,32 @@ const Accounts = () => {
     fetchData();
   }, []);
 
+  // Saldos en vivo: se actualiza la cuenta afectada sin recargar los listados
+  const applyBalance = ({ account_id, balance }) => {
+    setAccounts((current) => current.map((account) => {
+      if (account.id !== account_id) return account;
+      const available = account.account_type === 'corriente'
+        ? balance
+        : String(parseFloat(account.credit_limit) + parseFloat(balance));
+      return { ...account, balance, available };
+    }));
+  };
+
+  useLiveEvents(
+    (type, data) => {
+      if (type === 'balance') {
+        applyBalance(data);
+        return;
+      }
+      // Editar o borrar un movimiento cambia saldos sin evento `balance`
+      if (type !== 'transaction.created') fetchData();
+      if (selectedAccount && [data.from_account_id, data.to_account_id].includes(selectedAccount.id)) {
+        viewAccountTransactions(selectedAccount);
+      }
+    },
+    () => fetchData()
+  );
+
   const fetchData = async () => {
     try {
       const [accountsRes, companiesRes, groupsRes] = await Promise.all([
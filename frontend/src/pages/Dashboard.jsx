@@ -1,6 +1,7 @@
-import { useState, useEffect } from 'react';
+import { useState, useEffect, useRef } from 'react';
 import { Link, useNavigate } from 'react-router-dom';
 import api from '../services/api';
+import { useLiveEvents } from '../services/events';
 import { useAuth } from '../context/AuthContext';
 import {
   GitBranch,
@@ -22,12 +23,28 @@ const Dashboard = () => {
   const [operationsSummary, setOperationsSummary] = useState(null);
   const [groupsBalance, setGroupsBalance] = useState([]);
 
+  const refreshTimer = useRef(null);
+
   useEffect(() => {
     fetchData();
+    return () => clearTimeout(refreshTimer.current);
   }, []);
 
-  const fetchData = async () => {
-    setLoading(true);
+  // Recargar al llegar movimientos (agrupando ráfagas) en lugar de sondear
+  const scheduleRefresh = () => {
+    clearTimeout(refreshTimer.current);
+    refreshTimer.current = setTimeout(() => fetchData(true), 1000);
+  };
+
+  useLiveEvents(
+    (type) => {
+      if (type.startsWith('transaction.')) scheduleRefresh();
+    },
+    scheduleRefresh
+  );
+
+  const fetchData = async (silent = false) => {
+    if (!silent) setLoading(true);
     try {
       // Todos los usuarios ven el dashboard (filtrado por backend)
       const [summaryRes, balanceRes] = await Promise.all([
@@ -114,7 +131,7 @@ const Dashboard = () => {
           <h1>Bienvenido, {user?.full_name}</h1>
           <p>Resumen de operaciones</p>
         </div>
-        <button className="btn btn-secondary" onClick={fetchData}>
+        <button className="btn btn-secondary" onClick={() => fetchData()}>
           <RefreshCw size={18} />
           Actualizar
         </button>
@@ -0,0 +1,33 @@
+import { useEffect, useRef } from 'react';
+
+const API_URL = import.meta.env.VITE_API_URL || 'http://localhost:8000/api';
+
+const EVENT_TYPES = ['balance', 'transaction.created', 'transaction.updated', 'transaction.deleted'];
+
+// Suscribirse a los eventos en vivo (/api/events/stream) mientras el componente
+// está montado. `onEvent(type, data)` recibe solo lo que el usuario puede ver.
+// EventSource reconecta solo; `onReconnect` permite recargar lo que se perdió.
+export const useLiveEvents = (onEvent, onReconnect) => {
+  const handlers = useRef({ onEvent, onReconnect });
+  handlers.current = { onEvent, onReconnect };
+
+  useEffect(() => {
+    const token = localStorage.getItem('token');
+    if (!token || typeof EventSource === 'undefined') return undefined;
+
+    const source = new EventSource(`${API_URL}/events/stream?token=${encodeURIComponent(token)}`);
+    let opened = false;
+
+    source.onopen = () => {
+      if (opened) handlers.current.onReconnect?.();
+      opened = true;
+    };
+    EVENT_TYPES.forEach((type) => {
+      source.addEventListener(type, (message) => {
+        handlers.current.onEvent(type, JSON.parse(message.data));
+      });
+    });
+
+    return () => source.close();
+  }, []);
+};